@@ -1,10 +1,15 @@
 from agents.base_agent import BaseAgent
+from utils.telemetry import traced, agent_name
 
 class AnalysisAgent(BaseAgent):
-    def __init__(self, client):
-        super().__init__("Analysis", "Senior Code Reviewer", client)
+    def __init__(self, client, aclient=None):
+        super().__init__("Analysis", "Senior Code Reviewer", client, aclient)
 
+    @traced("agent.run", agent_name)
     def run(self, files_content):
+        return self.client.get_completion(self.build_messages(files_content))
+
+    def build_messages(self, files_content):
         system_prompt = """
 You are the Code Analysis Agent. Analyze the provided code for:
 - Structure and architecture.
@@ -16,4 +21,4 @@ You are the Code Analysis Agent. Analyze the provided code for:
 Provide a detailed technical report on the findings.
 """
         user_prompt = f"Code for analysis:\n\n{files_content}"
-        return self.client.get_completion(self.format_prompt(system_prompt, user_prompt))
+        return self.format_prompt(system_prompt, user_prompt)
@@ -1,8 +1,20 @@
+import asyncio
+
+from utils.telemetry import traced, traced_stream, agent_name
+
+
 class BaseAgent:
-    def __init__(self, name, role, client):
+    """Immutable agent definition shared by every request.
+
+    Nothing request-specific is stored on the instance: prompts are built per
+    call by build_messages(), so one agent can serve concurrent requests.
+    """
+
+    def __init__(self, name, role, client, aclient=None):
         self.name = name
         self.role = role
         self.client = client
+        self.aclient = aclient
 
     def format_prompt(self, system_prompt, user_prompt, history=None):
         messages = [{"role": "system", "content": system_prompt}]
@@ -11,14 +23,34 @@ class BaseAgent:
         messages.append({"role": "user", "content": user_prompt})
         return messages
 
+    def build_messages(self, *args, **kwargs):
+        """Build the chat messages for a run; subclasses share it between sync and async paths."""
+        raise NotImplementedError("Subclasses must implement build_messages()")
+
     def run(self, user_prompt, context=None, history=None):
         raise NotImplementedError("Subclasses must implement run()")
 
-    def run_stream(self, user_prompt, context=None, history=None):
-        # Default implementation for streaming if supported by client
+    @traced_stream("agent.run_stream", agent_name)
+    def run_stream(self, *args, **kwargs):
+        """Stream a run; takes the same arguments as run()/build_messages()."""
         if hasattr(self.client, 'get_streaming_completion'):
-            system_prompt = getattr(self, "system_prompt", f"You are the {self.name} Agent.")
-            return self.client.get_streaming_completion(self.format_prompt(system_prompt, user_prompt, history=history))
+            return self.client.get_streaming_completion(self.build_messages(*args, **kwargs))
         else:
             # Fallback to non-streaming
-            return [self.run(user_prompt, context, history=history)]
+            return [self.run(*args, **kwargs)]
+
+    @traced("agent.arun", agent_name)
+    async def arun(self, *args, **kwargs):
+        """Async counterpart of run() using the agent's async client."""
+        if self.aclient is None:
+            return await asyncio.to_thread(self.run, *args, **kwargs)
+        return await self.aclient.get_completion(self.build_messages(*args, **kwargs))
+
+    @traced("agent.arun_stream", agent_name)
+    async def arun_stream(self, *args, **kwargs):
+        """Async counterpart of run_stream(); yields chunks as they arrive."""
+        if self.aclient is None:
+            yield await asyncio.to_thread(self.run, *args, **kwargs)
+            return
+        async for chunk in self.aclient.get_streaming_completion(self.build_messages(*args, **kwargs)):
+            yield chunk
@@ -1,23 +1,16 @@
 from agents.base_agent import BaseAgent
+from utils.telemetry import traced, agent_name
 
 class ChatAgent(BaseAgent):
-    def __init__(self, client):
-        super().__init__("Chat", "Friendly AI Assistant", client)
+    def __init__(self, client, aclient=None):
+        super().__init__("Chat", "Friendly AI Assistant", client, aclient)
 
+    @traced("agent.run", agent_name)
     def run(self, instruction, context="", history=None):
-        system_prompt = """
-You are the AI Code Editor. You intelligently breakdown and review code, but you are also a versatile conversational assistant.
-Your goal is to be helpful, smart, and adaptive. 
-- If the user asks technical questions, provide detailed and accurate answers.
-- If the user just wants to chat (greetings, general questions, personal opinions, etc.), respond naturally and warmly, like a friendly expert colleague.
-- Always maintain your identity as the AI Code Editor, but don't be stiff—be conversational and engaging.
-- Whatever the user asks, communicate accordingly to meet their needs.
-"""
-        user_prompt = f"User Message: {instruction}\n\nContext (if any): {context}"
-        return self.client.get_completion(self.format_prompt(system_prompt, user_prompt, history=history))
+        return self.client.get_completion(self.build_messages(instruction, context, history=history))
 
-    def run_stream(self, instruction, context="", history=None):
-        self.system_prompt = """
+    def build_messages(self, instruction, context="", history=None):
+        system_prompt = """
 You are the AI Code Editor. You intelligently breakdown and review code, but you are also a versatile conversational assistant.
 Your goal is to be helpful, smart, and adaptive. 
 - If the user asks technical questions, provide detailed and accurate answers.
@@ -26,4 +19,4 @@ Your goal is to be helpful, smart, and adaptive.
 - Whatever the user asks, communicate accordingly to meet their needs.
 """
         user_prompt = f"User Message: {instruction}\n\nContext (if any): {context}"
-        return super().run_stream(user_prompt, history=history)
+        return self.format_prompt(system_prompt, user_prompt, history=history)
@@ -1,55 +1,105 @@
 from crewai import Agent, Task, Crew, Process
-from langchain_openai import ChatOpenAI
-from tools.crew_tools import read_file_tool, write_file_tool, list_files_tool
+from tools.crew_tools import read_file_tool, write_file_tool, list_files_tool, find_symbol_tool, file_outline_tool
+from tools.context_packer import pack_files, pack_history, get_budget
+from tools.file_ops import list_files
+from utils.telemetry import StepTimer, span
 import os
+import queue
+from collections import namedtuple
+from contextlib import contextmanager
+
+# One request's crew. Sets are pooled: a request checks one out for exclusive use and returns it afterwards
+CrewAgents = namedtuple("CrewAgents", ["analyzer", "refactorer", "qa_specialist", "writer"])
 
 class CrewManager:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, client=None):
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
-        # Use gpt-4o-mini for maximum speed as requested by user
-        self.llm = ChatOpenAI(model="gpt-4o-mini", api_key=self.api_key)
+        provider = os.environ.get("LLM_PROVIDER", "openai").lower()
+        # The crew talks to the same cached, traced (and, with LLM_ROUTES, routed) client stack as the
+        # native agents, through a crewai.BaseLLM subclass, so its calls are cached and counted per request
+        if client is None:
+            from utils.llm import LLMFactory
+            options = {}
+            if provider == "openai":
+                # gpt-4o-mini by default for speed; CREW_MODEL overrides it, and with LLM_ROUTES the crew route decides
+                options = {"model": os.environ.get("CREW_MODEL", "gpt-4o-mini"), "api_key": self.api_key}
+            client = LLMFactory.create_llm(provider, route="crew", **options)
+        from utils.crew_llm import create_crew_llm
+        self.llm = create_crew_llm(client)
         
         # Tools
         self.read_tool = read_file_tool
         self.write_tool = write_file_tool
         self.list_tool = list_files_tool
+        self.symbol_tool = find_symbol_tool
+        self.outline_tool = file_outline_tool
+
+        # Idle agent sets; more are built on demand when every pooled set is busy
+        self.pool_size = int(os.environ.get("CREW_POOL_SIZE", "4"))
+        self._idle = queue.LifoQueue()
+
+    def warm_up(self, count=None):
+        """Pre-build agent sets so the first requests skip Agent construction."""
+        count = self.pool_size if count is None else min(count, self.pool_size)
+        while self._idle.qsize() < count:
+            self._idle.put(self.create_agents())
+
+    @contextmanager
+    def checkout(self):
+        try:
+            agents = self._idle.get_nowait()
+        except queue.Empty:
+            agents = self.create_agents()
+        try:
+            yield agents
+        finally:
+            self._reset(agents)
+            if self._idle.qsize() < self.pool_size:
+                self._idle.put(agents)
+
+    def _reset(self, agents):
+        # Crew.kickoff binds its crew and step callback onto the agents; clear them so the
+        # next request's callback is installed instead of this one's
+        for agent in agents:
+            agent.step_callback = None
+            agent.crew = None
 
     def create_agents(self):
         # 1. Code Analyzer
-        self.analyzer = Agent(
+        analyzer = Agent(
             role='Senior Code Analyst',
             goal='Execute rapid code analysis and provide immediate technical insights. No fluff.',
             backstory='You are a high-speed technical auditor. You provide direct, actionable analysis without preamble or asking for permission.',
-            tools=[self.read_tool, self.list_tool],
+            tools=[self.read_tool, self.list_tool, self.symbol_tool, self.outline_tool],
             llm=self.llm,
             verbose=False,
             allow_delegation=False
         )
 
         # 2. Refactorer
-        self.refactorer = Agent(
+        refactorer = Agent(
             role='Senior Software Engineer',
             goal='Immediately implement optimized and clean code changes. Always provide the full solution.',
             backstory='You are a pragmatist. You do not ask if the user wants to see the code; you simply write the best version of it immediately.',
-            tools=[self.read_tool, self.write_tool],
+            tools=[self.read_tool, self.write_tool, self.symbol_tool, self.outline_tool],
             llm=self.llm,
             verbose=False,
             allow_delegation=False
         )
 
         # 3. QA Expert
-        self.qa_specialist = Agent(
+        qa_specialist = Agent(
             role='Quality Assurance Engineer',
             goal='Verify logic and performance instantly. Ensure zero errors.',
             backstory='You are a precise validator. You confirm the quality of the work and suggest final optimizations without delay.',
-            tools=[self.read_tool],
+            tools=[self.read_tool, self.symbol_tool],
             llm=self.llm,
             verbose=False,
             allow_delegation=False
         )
 
         # 4. Technical Writer
-        self.writer = Agent(
+        writer = Agent(
             role='Direct Technical Communicator',
             goal='Summarize findings and output final code/solutions directly to the user.',
             backstory='You are the bridge between the technical agents and the user. You never ask "would you like to see..."; you just show the complete result immediately.',
@@ -58,8 +108,20 @@ class CrewManager:
             allow_delegation=False
         )
 
+        return CrewAgents(analyzer, refactorer, qa_specialist, writer)
+
     def run_coding_task(self, instruction, context_path, callback=None, history=None):
-        self.create_agents()
+        with self.checkout() as agents:
+            return self._run_with_agents(agents, instruction, context_path, callback, history)
+
+    def _run_with_agents(self, agents, instruction, context_path, callback, history):
+        # Time every step/task callback, then forward it to the caller's callback
+        step_timer = StepTimer("crew.step")
+
+        def timed_callback(output):
+            step_timer.tick("task" if hasattr(output, 'raw') else "step", agent=str(getattr(output, 'agent', '')))
+            if callback:
+                callback(output)
         
         # Adjust descriptions for speed and directness
         path_desc = f"at {context_path}" if context_path else "provided"
@@ -67,32 +129,40 @@ class CrewManager:
         # Formatting history for CrewAI context
         history_context = ""
         if history:
-            history_context = "\nCONVERSATION HISTORY:\n" + "\n".join([f"- {m['role'].upper()}: {m['content'][:200]}..." for m in history])
+            packed_history = pack_history(history, get_budget("crew_history"))
+            history_context = "\nCONVERSATION HISTORY:\n" + "\n".join([f"- {m['role'].upper()}: {m['content']}" for m in packed_history])
+
+        # Ranked, budgeted view of the target so agents start from the relevant code
+        project_context = ""
+        if context_path and os.path.exists(context_path):
+            paths = list_files(context_path) if os.path.isdir(context_path) else [context_path]
+            project_context = "\nPROJECT CONTEXT:\n" + pack_files(paths, instruction, get_budget("crew"))
 
         # Define Task 1: Analysis & Refactor
         task1 = Task(
-            description=f"{history_context}\n\nAnalyze and immediately refactor the code for: {instruction}. Use context {path_desc}. Provide the full optimized code and a summary of what you did.",
+            description=f"{history_context}{project_context}\n\nAnalyze and immediately refactor the code for: {instruction}. Use context {path_desc}. Provide the full optimized code and a summary of what you did.",
             expected_output="A technical summary followed by the full modified code in markdown.",
-            agent=self.refactorer,
-            callback=callback # Task callback
+            agent=agents.refactorer,
+            callback=timed_callback # Task callback
         )
 
         # Define Task 2: Review & Report
         task2 = Task(
             description="Verify the logic of the previous refactoring and generate the final comprehensive output for the user. Show all code and analysis directly.",
             expected_output="The final production-ready report including analysis and full code snippets.",
-            agent=self.writer,
+            agent=agents.writer,
             context=[task1],
-            callback=callback # Task callback
+            callback=timed_callback # Task callback
         )
 
         # Form a leaner Crew for faster execution
         crew = Crew(
-            agents=[self.analyzer, self.refactorer, self.writer],
+            agents=[agents.analyzer, agents.refactorer, agents.writer],
             tasks=[task1, task2],
             process=Process.sequential,
             verbose=False,
-            step_callback=callback # Step callback for real-time thought streaming
+            step_callback=timed_callback # Step callback for real-time thought streaming
         )
 
-        return crew.kickoff()
+        with span("crew.kickoff"):
+            return crew.kickoff()
@@ -1,10 +1,15 @@
 from agents.base_agent import BaseAgent
+from utils.telemetry import traced, agent_name
 
 class DocAgent(BaseAgent):
-    def __init__(self, client):
-        super().__init__("Doc", "Technical Writer", client)
+    def __init__(self, client, aclient=None):
+        super().__init__("Doc", "Technical Writer", client, aclient)
 
+    @traced("agent.run", agent_name)
     def run(self, code_context, request_type="docstring", language="python"):
+        return self.client.get_completion(self.build_messages(code_context, request_type, language))
+
+    def build_messages(self, code_context, request_type="docstring", language="python"):
         system_prompt = f"""
 You are the Doc Agent. Generate high-quality technical documentation.
 
@@ -29,4 +34,4 @@ Guidelines:
 Output the documentation in the appropriate format for the request type.
 """
         user_prompt = f"Generate {request_type} documentation for:\n\n{code_context}"
-        return self.client.get_completion(self.format_prompt(system_prompt, user_prompt))
+        return self.format_prompt(system_prompt, user_prompt)
@@ -1,10 +1,17 @@
 from agents.base_agent import BaseAgent
+from utils.telemetry import traced, agent_name
+from tools.context_packer import pack_text, get_budget
 
 class PlannerAgent(BaseAgent):
-    def __init__(self, client):
-        super().__init__("Planner", "Technical Architect", client)
+    def __init__(self, client, aclient=None):
+        super().__init__("Planner", "Technical Architect", client, aclient)
 
+    @traced("agent.run", agent_name)
     def run(self, instruction, codebase_context=""):
+        return self.client.get_completion(self.build_messages(instruction, codebase_context))
+
+    def build_messages(self, instruction, codebase_context=""):
+        packed_context = pack_text(codebase_context, get_budget("planner"), instruction)
         system_prompt = f"""
 You are the Planner Agent. Your role is to decompose user coding requests into a structured sequence of tasks for other specialized agents.
 
@@ -18,7 +25,7 @@ Agents available:
 7. Reporting Agent: Summarizes changes and impacts.
 
 Current Codebase Context:
-{codebase_context[:2000]}{"..." if len(codebase_context) > 2000 else ""}
+{packed_context}
 
 Instructions for planning:
 - Break down complex requests into logical steps
@@ -41,4 +48,4 @@ Example output:
 ]
 """
         user_prompt = f"User Request: {instruction}"
-        return self.client.get_completion(self.format_prompt(system_prompt, user_prompt))
+        return self.format_prompt(system_prompt, user_prompt)
@@ -1,10 +1,15 @@
 from agents.base_agent import BaseAgent
+from utils.telemetry import traced, agent_name
 
 class QAAgent(BaseAgent):
-    def __init__(self, client):
-        super().__init__("QA", "Quality Assurance Lead", client)
+    def __init__(self, client, aclient=None):
+        super().__init__("QA", "Quality Assurance Lead", client, aclient)
 
-    def run(self, original_code, refactored_code, language="python"):
+    @traced("agent.run", agent_name)
+    def run(self, original_code, refactored_code, language="python", facts=None, checks=None):
+        return self.client.get_completion(self.build_messages(original_code, refactored_code, language, facts, checks))
+
+    def build_messages(self, original_code, refactored_code, language="python", facts=None, checks=None):
         system_prompt = f"""
 You are the QA Agent. Compare the original code with the refactored code.
 
@@ -27,6 +32,17 @@ Provide a structured report with:
 5. Recommendations: Any additional suggestions
 
 Be thorough and critical. If functionality is not preserved, FAIL the review.
+"""
+        if facts and checks:
+            # Only claim the checks that ran; a bracket balance scan says nothing about syntax
+            parsed = any(check.endswith("parsing") for check in checks)
+            focus = "do not re-check syntax, focus on behaviour" if parsed else "still review syntax and behaviour"
+            system_prompt += f"""
+The refactored code already passed these local checks: {", ".join(checks)}.
+The LOCAL CHECKS section lists their results as verified facts: {focus},
+and address every warning listed there.
 """
         user_prompt = f"Original:\n{original_code}\n\nRefactored:\n{refactored_code}"
-        return self.client.get_completion(self.format_prompt(system_prompt, user_prompt))
+        if facts and checks:
+            user_prompt += f"\n\nLOCAL CHECKS:\n{facts}"
+        return self.format_prompt(system_prompt, user_prompt)
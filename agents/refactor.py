@@ -1,13 +1,38 @@
 from agents.base_agent import BaseAgent
+from utils.telemetry import traced, agent_name
 
 class RefactorAgent(BaseAgent):
-    def __init__(self, client):
-        super().__init__("Refactor", "Expert Software Engineer", client)
+    def __init__(self, client, aclient=None):
+        super().__init__("Refactor", "Expert Software Engineer", client, aclient)
 
-    def run(self, file_content, instruction, language="python", history=None):
+    @traced("agent.run", agent_name)
+    def run(self, file_content, instruction, language="python", history=None, mode="full"):
+        return self.client.get_completion(self.build_messages(file_content, instruction, language, history=history, mode=mode))
+
+    def build_messages(self, file_content, instruction, language="python", history=None, mode="full"):
         user_prompt = f"Original Code:\n\n{file_content}\n\nInstruction: {instruction}"
-        system_prompt = self.get_system_prompt(language)
-        return self.client.get_completion(self.format_prompt(system_prompt, user_prompt, history=history))
+        system_prompt = self.get_patch_prompt(language) if mode == "patch" else self.get_system_prompt(language)
+        return self.format_prompt(system_prompt, user_prompt, history=history)
+
+    def get_patch_prompt(self, language="python"):
+        # Edit mode: only the changed lines come back, so output tokens scale with the change, not the file
+        return f"""
+You are the Refactor Agent. Your goal is to improve code according to the instruction while strictly preserving existing functionality.
+Language: {language}
+
+Guidelines:
+- ALWAYS preserve the original functionality.
+- Change only what the instruction requires. NEVER repeat unchanged code.
+- Output every change as a SEARCH/REPLACE block:
+<<<<<<< SEARCH
+lines copied exactly from the original code
+=======
+the new lines
+>>>>>>> REPLACE
+- Copy SEARCH lines character for character, including indentation, with just enough lines to be unique.
+- Prefer several small blocks over one large block, in file order.
+- Before each block, write one short sentence describing the change. Output nothing else.
+"""
 
     def get_system_prompt(self, language="python"):
         return f"""
@@ -20,8 +45,3 @@ Guidelines:
 - Output ONLY the refactored code within a markdown code block.
 - Be extremely direct and fast.
 """
-
-    def run_stream(self, file_content, instruction, language="python", history=None):
-        user_prompt = f"Original Code:\n\n{file_content}\n\nInstruction: {instruction}"
-        self.system_prompt = self.get_system_prompt(language)
-        return super().run_stream(user_prompt, history=history)
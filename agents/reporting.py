@@ -1,22 +1,15 @@
 from agents.base_agent import BaseAgent
+from utils.telemetry import traced, agent_name
 
 class ReportingAgent(BaseAgent):
-    def __init__(self, client):
-        super().__init__("Reporting", "Technical Project Manager", client)
+    def __init__(self, client, aclient=None):
+        super().__init__("Reporting", "Technical Project Manager", client, aclient)
 
+    @traced("agent.run", agent_name)
     def run(self, raw_changes):
-        system_prompt = """
-You are the Reporting Agent. Summarize the changes made by the AI Assistant.
-Include:
-- High-level list of improvements.
-- Risks and tradeoffs.
-- Before vs. After comparison summary.
-- Next steps suggestions.
-"""
-        user_prompt = f"Changes made:\n\n{raw_changes}"
-        return self.client.get_completion(self.format_prompt(system_prompt, user_prompt))
+        return self.client.get_completion(self.build_messages(raw_changes))
 
-    def run_stream(self, raw_changes):
+    def build_messages(self, raw_changes):
         system_prompt = """
 You are the Reporting Agent. Summarize the changes made by the AI Assistant.
 Include:
@@ -26,4 +19,4 @@ Include:
 - Next steps suggestions.
 """
         user_prompt = f"Changes made:\n\n{raw_changes}"
-        return self.client.get_streaming_completion(self.format_prompt(system_prompt, user_prompt))
+        return self.format_prompt(system_prompt, user_prompt)
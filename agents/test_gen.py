@@ -1,10 +1,15 @@
 from agents.base_agent import BaseAgent
+from utils.telemetry import traced, agent_name
 
 class TestGenAgent(BaseAgent):
-    def __init__(self, client):
-        super().__init__("TestGen", "Test Engineer", client)
+    def __init__(self, client, aclient=None):
+        super().__init__("TestGen", "Test Engineer", client, aclient)
 
-    def run(self, code_content, language="python", test_type="unit"):
+    @traced("agent.run", agent_name)
+    def run(self, code_content, language="python", test_type="unit", module_name=None):
+        return self.client.get_completion(self.build_messages(code_content, language, test_type, module_name))
+
+    def build_messages(self, code_content, language="python", test_type="unit", module_name=None):
         system_prompt = f"""
 You are the Test Generation Agent. Generate comprehensive tests for the provided code.
 
@@ -25,10 +30,18 @@ For Java: Use JUnit
 For Go: Use testing package
 
 Output ONLY the test code within a markdown code block.
+"""
+        if module_name:
+            # The suite is executed against both versions of the code, so it must be self-contained
+            system_prompt += f"""
+The tests will be run with pytest. The code under test is importable as the module `{module_name}`
+(e.g. `from {module_name} import ...`). Use only the standard library and pytest, no network or files
+outside the test's tmp_path, and keep every test under a few seconds.
 """
         user_prompt = f"Generate {test_type} tests for this code:\n\n{code_content}"
-        return self.client.get_completion(self.format_prompt(system_prompt, user_prompt))
+        return self.format_prompt(system_prompt, user_prompt)
 
+    @traced("agent.generate_test_suite", agent_name)
     def generate_test_suite(self, code_content, language="python"):
         """Generate a complete test suite with multiple test cases."""
         system_prompt = f"""
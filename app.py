@@ -3,6 +3,15 @@ from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 from coordinator import Coordinator
 from tools.file_ops import write_file
+from tools.symbol_index import drop_indexes
+from utils.aio import iterate_sync
+from utils.telemetry import trace_request, render_metrics
+from utils.singleflight import SingleFlight, StreamFlight, request_fingerprint
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.jobs import JobStore, JobManager, TERMINAL, DEFAULT_JOB_DB, DEFAULT_JOB_DIR
+import hashlib
+import threading
+import uuid
 import tempfile
 import shutil
 import json
@@ -19,6 +28,44 @@ if not os.path.exists('static'):
 # Initialize Coordinator
 # Enabling backup by default for better safety, but can be controlled via request data
 coordinator = Coordinator(backup_enabled=True)
+# Warm up in the background so the server starts accepting requests immediately
+threading.Thread(target=coordinator.warm_up, name="warm-up", daemon=True).start()
+
+# Identical concurrent requests (same instruction, file content and history) share one run
+process_flight = SingleFlight("process")
+stream_flight = StreamFlight("stream")
+
+# Bounded number of concurrent runs; chat gets a priority lane (see utils/admission.py)
+admission = AdmissionController()
+
+def client_id():
+    forwarded = request.headers.get('X-Forwarded-For', '').split(',')[0].strip()
+    return request.headers.get('X-Client-Id') or forwarded or request.remote_addr or "anonymous"
+
+def admission_lane(target_path):
+    return "heavy" if target_path else "fast"
+
+def busy_response(error):
+    response = jsonify({"error": str(error), "success": False, "retry_after": error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def run_job_stream(target_path, instruction, history, cancel=None):
+    with trace_request("job", instruction=instruction[:200]):
+        stream = coordinator.aexecute_request_stream(target_path, instruction, history=history)
+        yield from iterate_sync(stream, cancel=cancel)
+
+# Durable background jobs: runs survive dropped connections and can be resumed from any event offset
+job_dir = os.environ.get("JOB_DIR", DEFAULT_JOB_DIR)
+jobs = JobManager(JobStore(os.environ.get("JOB_DB_PATH", DEFAULT_JOB_DB)), run_job_stream, admission=admission)
+
+def request_key(instruction, target_path, history):
+    content_hash = ""
+    if target_path and os.path.isfile(target_path):
+        with open(target_path, 'rb') as f:
+            content_hash = hashlib.sha256(f.read()).hexdigest()
+    return request_fingerprint(instruction, os.path.basename(target_path), content_hash, history)
 
 @app.route('/')
 def index():
@@ -28,6 +75,11 @@ def index():
 def static_proxy(path):
     return send_from_directory(app.static_folder, path)
 
+def remove_temp_dir(path):
+    """Delete a request's upload directory along with any symbol index built over it."""
+    shutil.rmtree(path, ignore_errors=True)
+    drop_indexes(path)
+
 @app.route('/api/process', methods=['POST'])
 def process_request():
     data = request.form
@@ -59,26 +111,43 @@ def process_request():
         # Execute the request via Coordinator
         dry_run = data.get('dry_run', 'false').lower() == 'true'
         
-        report = coordinator.execute_request(target_path, instruction, history=history)
-        
-        # Read the modified file if refactoring happened
-        final_code = ""
-        if os.path.exists(target_path):
-            with open(target_path, 'r') as f:
-                final_code = f.read()
+        client, lane = client_id(), admission_lane(target_path)
+
+        def run():
+            # Followers of an in-flight identical request wait on it without taking a slot
+            with admission.acquire(client, lane):
+                report = coordinator.execute_request(target_path, instruction, history=history)
+
+            # Read the modified file if refactoring happened
+            final_code = ""
+            if os.path.exists(target_path):
+                with open(target_path, 'r') as f:
+                    final_code = f.read()
+            return report, final_code
+
+        with trace_request("process", instruction=instruction[:200]) as trace:
+            (report, final_code), shared = process_flight.do(request_key(instruction, target_path, history), run)
                 
-        return jsonify({
+        payload = {
             "report": report,
             "final_code": final_code,
             "success": True,
-            "dry_run": dry_run
-        })
+            "dry_run": dry_run,
+            "shared": shared
+        }
+        if data.get('trace', 'false').lower() == 'true':
+            payload["trace"] = trace.to_dict()
+        response = jsonify(payload)
+        response.headers['X-Trace-Id'] = trace.trace_id
+        return response
         
+    except AdmissionRejected as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({"error": str(e), "success": False}), 500
     finally:
         # Clean up temp directory
-        shutil.rmtree(temp_dir)
+        remove_temp_dir(temp_dir)
 
 @app.route('/api/stream', methods=['POST'])
 def stream_request():
@@ -104,17 +173,152 @@ def stream_request():
         target_path = os.path.join(temp_dir, "pasted_code.py")
         write_file(target_path, code_content)
 
+    key = request_key(instruction, target_path, history)
+    ticket = None
+    # Followers of an identical in-flight stream don't need a slot of their own
+    joined = stream_flight.join(key)
+    if joined is None:
+        try:
+            ticket = admission.acquire(client_id(), admission_lane(target_path))
+        except AdmissionRejected as e:
+            remove_temp_dir(temp_dir)
+            return busy_response(e)
+
+    def produce():
+        # Runs once per burst on the flight's thread, which owns the leader's temp dir and slot
+        try:
+            with trace_request("stream", instruction=instruction[:200]):
+                yield from iterate_sync(coordinator.aexecute_request_stream(target_path, instruction, history=history))
+        finally:
+            ticket.release()
+            if os.path.exists(temp_dir):
+                remove_temp_dir(temp_dir)
+
+    started = threading.Event()
+
     def generate():
+        started.set()
+        leader = False
         try:
-            for part in coordinator.execute_request_stream(target_path, instruction, history=history):
+            parts = joined
+            if parts is None:
+                parts, leader = stream_flight.subscribe(key, produce)
+                if not leader:
+                    # An identical request started first; its run serves this one too
+                    ticket.release()
+            for part in parts:
                 yield f"data: {json.dumps({'content': part})}\n\n"
         except Exception as e:
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
         finally:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
+            if not leader and os.path.exists(temp_dir):
+                remove_temp_dir(temp_dir)
+
+    def on_close():
+        # The client went away before streaming began: give the slot back
+        if not started.is_set():
+            if ticket is not None:
+                ticket.release()
+            remove_temp_dir(temp_dir)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.call_on_close(on_close)
+    return response
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    data = request.form
+    instruction = data.get('instruction', 'analyze this code')
+    code_content = data.get('code_content', '')
+    try:
+        history = json.loads(data.get('history', '[]'))
+    except:
+        history = []
+
+    if jobs.pending() >= jobs.max_pending:
+        response = jsonify({"error": "Too many pending jobs", "success": False})
+        response.status_code = 429
+        response.headers['Retry-After'] = '30'
+        return response
+
+    # Inputs live in a per-job workspace that outlives this request; the job removes it when done
+    workspace = os.path.join(job_dir, uuid.uuid4().hex)
+    os.makedirs(workspace, exist_ok=True)
+    target_path = ""
+    if 'file' in request.files and request.files['file'].filename != '':
+        file = request.files['file']
+        target_path = os.path.join(workspace, os.path.basename(file.filename))
+        file.save(target_path)
+    elif code_content:
+        target_path = os.path.join(workspace, "pasted_code.py")
+        write_file(target_path, code_content)
+
+    job_id, created = jobs.submit(instruction, target_path, history,
+                                  key=request_key(instruction, target_path, history), workspace=workspace)
+    if not created:
+        shutil.rmtree(workspace, ignore_errors=True)
+    return jsonify({"job_id": job_id, "created": created, "status": jobs.store.get(job_id)["status"]}), 202
+
+def job_status_payload(job):
+    return {key: job[key] for key in ("id", "status", "instruction", "created", "started", "finished", "events", "error")}
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_status_payload(job))
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if jobs.store.get(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+    # EventSource reconnects send Last-Event-ID; explicit ?offset= wins
+    last_id = request.headers.get('Last-Event-ID')
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        offset = int(last_id) + 1 if last_id and last_id.isdigit() else 0
+
+    def generate():
+        for seq, content in jobs.follow(job_id, offset):
+            yield f"id: {seq}\ndata: {json.dumps({'content': content})}\n\n"
+        job = jobs.store.get(job_id)
+        yield f"event: end\ndata: {json.dumps({'status': job['status'], 'error': job['error']})}\n\n"
 
     return Response(generate(), mimetype='text/event-stream')
 
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = jobs.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] not in TERMINAL:
+        return jsonify(job_status_payload(job)), 202
+    return jsonify({**job_status_payload(job), "report": job["report"], "final_code": job["final_code"],
+                    "success": job["status"] == "succeeded"})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    status = jobs.cancel(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({"id": job_id, "status": status})
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    get_stats = getattr(coordinator.client, 'get_stats', None)
+    if get_stats is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **get_stats()})
+
+@app.route('/api/admission/stats', methods=['GET'])
+def admission_stats():
+    return jsonify(admission.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
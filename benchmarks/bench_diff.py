@@ -0,0 +1,82 @@
+"""Diff engine scaling benchmark.
+
+Generates code-like files dominated by repeated lines (blank lines, braces),
+applies scattered edits and times tools.diff_engine against difflib.
+Run from the repository root:
+
+    python benchmarks/bench_diff.py
+"""
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.diff_engine import DiffResult  # noqa: E402
+
+
+def generate(lines, seed=0):
+    rng = random.Random(seed)
+    out = []
+    while len(out) < lines:
+        name = f"fn_{len(out)}"
+        out.append(f"function {name}(a, b) {{")
+        for _ in range(rng.randint(2, 6)):
+            out.append(f"    total += a * {rng.randint(0, 9)};")
+        out.append("    if (total > b) {")
+        out.append("        return b;")
+        out.append("    }")
+        out.append("}")
+        out.append("")
+    return out[:lines]
+
+
+def mutate(lines, edits, seed=1):
+    rng = random.Random(seed)
+    result = list(lines)
+    for _ in range(edits):
+        k = rng.randrange(len(result))
+        choice = rng.random()
+        if choice < 0.4:
+            result.insert(k, "    // inserted")
+        elif choice < 0.7:
+            del result[k]
+        else:
+            result[k] = result[k] + " // changed"
+    return result
+
+
+def bench(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    print(f"{'lines':>9} {'MB':>6} {'engine s':>9} {'us/line':>8} {'difflib s':>10}")
+    per_line = []
+    for lines in (10_000, 50_000, 100_000, 200_000, 400_000):
+        original = generate(lines)
+        modified = mutate(original, edits=lines // 500)
+        a, b = "\n".join(original), "\n".join(modified)
+        engine = bench(lambda: DiffResult(a, b).unified_diff("bench.js"))
+        per_line.append(engine / lines * 1e6)
+        if lines <= 50_000:
+            reference = bench(lambda: "".join(difflib.unified_diff(original, modified, lineterm="")), repeat=1)
+            reference_text = f"{reference:10.3f}"
+        else:
+            reference_text = f"{'skipped':>10}"
+        print(f"{lines:>9} {len(a) / 1e6:6.1f} {engine:9.3f} {per_line[-1]:8.2f} {reference_text}")
+
+    growth = per_line[-1] / per_line[0]
+    print(f"per-line cost growth from smallest to largest input: {growth:.2f}x (1.0x = linear)")
+    return 0 if growth < 3 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
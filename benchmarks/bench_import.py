@@ -0,0 +1,85 @@
+"""Import-time budget check for CLI and server cold starts.
+
+Runs each scenario in a fresh interpreter under ``python -X importtime``,
+sums the self time of every module it imports, and takes the median over
+several runs. Also checks that heavy subsystems (CrewAI and the
+OpenAI SDK) stay unloaded in scenarios that never use them. Uses the fake
+LLM provider, so no API key is needed. Run from the repository root:
+
+    python benchmarks/bench_import.py [--runs 5] [--budget-ms 250] [--top 10]
+
+Exits 1 if a scenario goes over budget or loads a forbidden module.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ("crewai", "openai")
+
+# name -> (code run in the fresh interpreter, modules it must not load)
+SCENARIOS = {
+    "cli": ("import main", HEAVY),
+    "coordinator": ("import coordinator; coordinator.Coordinator(backup_enabled=False)", HEAVY),
+    "fast_path": ("import coordinator; c = coordinator.Coordinator(backup_enabled=False); "
+                  "''.join(c.execute_request_stream('', 'hello'))", HEAVY),
+}
+
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)")
+
+
+def run(code, forbidden):
+    """Return (total self time in ms, {module: self ms}, forbidden modules that got loaded)."""
+    check = f"; import sys; print('LOADED:' + ','.join(m for m in {forbidden!r} if m in sys.modules))"
+    env = dict(os.environ, LLM_PROVIDER="fake", LLM_CACHE="off", FAKE_LLM_TTFT="0", FAKE_LLM_TPS="0")
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code + check], cwd=ROOT, env=env,
+                             capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"{code!r} failed:\n{process.stderr[-2000:]}")
+    modules = {}
+    for line in process.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            modules[match.group(2)] = int(match.group(1)) / 1000
+    marker = [line for line in process.stdout.splitlines() if line.startswith("LOADED:")][-1]
+    loaded = [m for m in marker[len("LOADED:"):].split(",") if m]
+    return sum(modules.values()), modules, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", "250")),
+                        help="Median import time allowed per scenario (env IMPORT_BUDGET_MS)")
+    parser.add_argument("--top", type=int, default=10, help="Modules with the largest self time to list per scenario")
+    args = parser.parse_args()
+
+    failures = 0
+    for name, (code, forbidden) in SCENARIOS.items():
+        # One untimed run first so bytecode compilation does not count
+        run(code, forbidden)
+        totals = []
+        modules = {}
+        loaded = []
+        for _ in range(args.runs):
+            total, modules, loaded = run(code, forbidden)
+            totals.append(total)
+        median = statistics.median(totals)
+        status = "ok" if median <= args.budget_ms else "OVER BUDGET"
+        print(f"{name}: median {median:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms) {status}")
+        for module, ms in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {ms:8.1f} ms  {module}")
+        if loaded:
+            print(f"[!] {name} loaded heavy modules it never uses: {', '.join(loaded)}")
+        if median > args.budget_ms or loaded:
+            failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
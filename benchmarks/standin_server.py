@@ -0,0 +1,179 @@
+"""Local stand-in for an OpenAI-compatible chat completions server.
+
+Serves POST /v1/chat/completions (plain and streamed) and GET /v1/models/<id>
+with per-model latency and failure rate, so model routing (utils/router.py)
+can be exercised without a real provider. Run from the repository root:
+
+    python benchmarks/standin_server.py --port 8089 --model slow:2.0:0 --model flaky:0.05:0.5
+
+and point a routing profile at it with
+``"base_url": "http://127.0.0.1:8089/v1"``. Each ``--model`` is
+``name:latency_seconds:error_rate``; models not listed answer at once.
+
+    python benchmarks/standin_server.py --check
+
+starts the server on a free port and routes calls through it: a failing
+profile must fail over and degrade, and a slow one must be downshifted.
+Exits 1 if either does not happen. The check needs the openai package.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, models):
+        super().__init__(address, Handler)
+        self.models = models  # name -> (latency, error_rate)
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if not self.path.startswith("/v1/models/"):
+            return self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+        model = self.path[len("/v1/models/"):]
+        self._json(200, {"id": model, "object": "model", "created": 0, "owned_by": "stand-in"})
+
+    def do_POST(self):
+        if self.path != "/v1/chat/completions":
+            return self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = request.get("model", "")
+        latency, error_rate = self.server.models.get(model, (0.0, 0.0))
+        with self.server.lock:
+            self.server.requests[model] += 1
+        time.sleep(latency)
+        if random.random() < error_rate:
+            return self._json(503, {"error": {"message": f"{model} is overloaded", "type": "server_error"}})
+
+        prompt = next((m.get("content") or "" for m in reversed(request.get("messages", []))
+                       if m.get("role") == "user"), "")
+        answer = f"[{model}] {prompt[:200]}"
+        if not request.get("stream"):
+            return self._json(200, {
+                "id": "chatcmpl-standin", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            chunk = {"id": "chatcmpl-standin", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                                                  "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+def parse_model(value):
+    name, latency, error_rate = (value.split(":") + ["0", "0"])[:3]
+    return name, (float(latency), float(error_rate))
+
+
+def start(models, port=0):
+    server = StandInServer(("127.0.0.1", port), models)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check():
+    server = start({"flaky": (0.0, 1.0), "slow": (0.3, 0.0), "steady": (0.0, 0.0)})
+    limits = {"base_url": server.base_url, "api_key": "stand-in"}
+    os.environ["LLM_ROUTES"] = json.dumps({
+        "min_samples": 3, "cooldown": 60,
+        "profiles": {
+            "flaky": {"provider": "openai", "model": "flaky", **limits},
+            "slow": {"provider": "openai", "model": "slow", "max_p95": 0.1, **limits},
+            "steady": {"provider": "openai", "model": "steady", **limits},
+        },
+        "routes": {"refactor": ["flaky", "steady"], "qa": ["slow", "steady"]},
+    })
+    os.environ["LLM_CACHE"] = "off"
+    os.environ.setdefault("LLM_RETRIES", "0")
+    os.environ.setdefault("OPENAI_API_KEY", "stand-in")
+
+    from utils.llm import LLMFactory
+    refactor, qa = LLMFactory.create_llm(route="refactor"), LLMFactory.create_llm(route="qa")
+    messages = [{"role": "user", "content": "ping"}]
+    failures = []
+
+    answers = [refactor.get_completion(messages) for _ in range(10)]
+    answers.append("".join(refactor.get_streaming_completion(messages)))
+    if any(not answer.startswith("[steady]") for answer in answers):
+        failures.append(f"refactor route answered from the wrong model: {sorted(set(answers))}")
+    if server.requests["flaky"] > 3:
+        failures.append(f"degraded flaky profile still got {server.requests['flaky']} requests")
+
+    answers = [qa.get_completion(messages) for _ in range(10)]
+    if server.requests["slow"] > 3:
+        failures.append(f"slow profile was not downshifted ({server.requests['slow']} requests)")
+    if any(not answer.startswith(("[slow]", "[steady]")) for answer in answers):
+        failures.append(f"qa route answered from the wrong model: {sorted(set(answers))}")
+
+    stats = LLMFactory.get_router().stats()
+    for name in ("flaky", "slow"):
+        if not stats[name]["degraded"]:
+            failures.append(f"{name} profile is not marked degraded")
+    server.shutdown()
+
+    print(f"requests per model: {dict(server.requests)}")
+    print(json.dumps(stats, indent=2))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--model", action="append", default=[], type=parse_model,
+                        help="name:latency_seconds:error_rate (repeatable)")
+    parser.add_argument("--check", action="store_true", help="run the routing check and exit")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(check())
+
+    server = StandInServer(("127.0.0.1", args.port), dict(args.model))
+    print(f"[*] Stand-in LLM server on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Concurrency stress test for the shared Coordinator.
+
+Runs many concurrent streaming requests against one Coordinator, using the
+local fake LLM provider (no network, no API key). Every request has its own
+language and a unique marker in its code. The fake refactor response echoes
+both back, so any cross-talk between requests shows up as a wrong fence
+language or a foreign marker. Run from the repository root:
+
+    python benchmarks/stress_concurrency.py [--requests 200] [--workers 32]
+
+Exits 1 if any request saw another request's prompt or code.
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("LLM_CACHE", "off")
+os.environ.setdefault("FAKE_LLM_TTFT", "0.02")
+os.environ.setdefault("FAKE_LLM_TPS", "2000")
+
+from coordinator import Coordinator  # noqa: E402
+from utils.aio import iterate_sync  # noqa: E402
+
+LANGUAGES = {
+    "python": (".py", "def handler_{n}():\n    return '{marker}'\n"),
+    "javascript": (".js", "function handler{n}() {{\n  return '{marker}';\n}}\n"),
+    "go": (".go", "func Handler{n}() string {{\n\treturn \"{marker}\"\n}}\n"),
+    "rust": (".rs", "fn handler_{n}() -> &'static str {{\n    \"{marker}\"\n}}\n"),
+    "java": (".java", "class Handler{n} {{\n    String run() {{ return \"{marker}\"; }}\n}}\n"),
+}
+MARKER = re.compile(r"REQ-\d+-[0-9a-f]{6}")
+
+
+def make_requests(count, directory):
+    requests = []
+    names = sorted(LANGUAGES)
+    for n in range(count):
+        language = names[n % len(names)]
+        extension, template = LANGUAGES[language]
+        marker = f"REQ-{n}-{os.urandom(3).hex()}"
+        path = os.path.join(directory, f"req_{n}{extension}")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(template.format(n=n, marker=marker))
+        mode = ("sync", "async", "chat")[n % 3]
+        requests.append({"n": n, "language": language, "marker": marker, "path": path, "mode": mode})
+    return requests
+
+
+def run_one(coordinator, request):
+    instruction = f"refactor this file for readability and keep {request['marker']} intact please"
+    started = time.perf_counter()
+    if request["mode"] == "chat":
+        stream = coordinator.execute_request_stream("", f"{request['marker']} hello")
+    elif request["mode"] == "async":
+        stream = iterate_sync(coordinator.aexecute_request_stream(request["path"], instruction))
+    else:
+        stream = coordinator.execute_request_stream(request["path"], instruction)
+    output = "".join(stream)
+    return output, time.perf_counter() - started
+
+
+def check(request, output):
+    problems = []
+    foreign = set(MARKER.findall(output)) - {request["marker"]}
+    if foreign:
+        problems.append(f"foreign markers {sorted(foreign)}")
+    if request["marker"] not in output:
+        problems.append("own marker missing")
+    if request["mode"] != "chat":
+        languages = re.findall(r"\[CODE_START\](\w*)", output)
+        if languages != [request["language"]]:
+            problems.append(f"expected one {request['language']} block, got {languages}")
+        with open(request["path"], encoding="utf-8") as f:
+            original = f.read().rstrip("\n")
+        if not output.endswith(f"[FINAL_CODE]\n{original}"):
+            problems.append("final code does not match the request's own file")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="stress_")
+    try:
+        coordinator = Coordinator(backup_enabled=False)
+        requests = make_requests(args.requests, directory)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(lambda r: run_one(coordinator, r), requests))
+        elapsed = time.perf_counter() - started
+
+        failures = 0
+        for request, (output, _) in zip(requests, results):
+            problems = check(request, output)
+            if problems:
+                failures += 1
+                print(f"[!] request {request['n']} ({request['mode']}, {request['language']}): {'; '.join(problems)}")
+
+        latencies = sorted(latency for _, latency in results)
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{len(requests)} streams, {args.workers} workers: {elapsed:.2f}s total, "
+              f"{len(requests) / elapsed:.1f} req/s, p50 {p50 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms")
+        print(f"cross-talk failures: {failures}")
+        return 1 if failures else 0
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
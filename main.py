@@ -1,7 +1,8 @@
 import argparse
 import sys
 import os
-from coordinator import Coordinator
+import json
+from utils.telemetry import trace_request
 
 def main():
     parser = argparse.ArgumentParser(
@@ -12,12 +13,17 @@ Examples:
   python main.py src/ "generate documentation"
   python main.py app.py "add type hints and improve error handling"
   python main.py --no-backup code.py "optimize performance"
+  python main.py --batch nightly.jsonl --concurrency 8
         """
     )
-    parser.add_argument("path", help="Path to a file or folder")
-    parser.add_argument("instruction", help="Instruction for the assistant (e.g., 'refactor this file', 'generate tests')")
+    parser.add_argument("path", nargs="?", help="Path to a file or folder")
+    parser.add_argument("instruction", nargs="?", help="Instruction for the assistant (e.g., 'refactor this file', 'generate tests')")
     parser.add_argument("--no-backup", action="store_true", help="Disable automatic backup of modified files")
     parser.add_argument("--dry-run", action="store_true", help="Preview changes without applying them (coming soon)")
+    parser.add_argument("--trace", metavar="FILE", help="Write a JSON timing trace of the run to FILE")
+    parser.add_argument("--batch", metavar="MANIFEST", help="Run every entry of a JSONL manifest of {path, instruction} objects")
+    parser.add_argument("--results", metavar="FILE", help="Batch results file; completed entries in it are skipped (default: MANIFEST.results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("BATCH_CONCURRENCY", "4")), help="Batch entries run at once (default 4)")
     
     try:
         args = parser.parse_args()
@@ -27,29 +33,74 @@ Examples:
         print("\nFor more options, use: python main.py --help")
         sys.exit(1)
     
-    if not os.path.exists(args.path):
+    if args.batch:
+        if not os.path.isfile(args.batch):
+            print(f"Error: Manifest {args.batch} does not exist.")
+            sys.exit(1)
+    elif not args.path or not args.instruction:
+        print("[!] Usage Tip: python main.py <file_path> \"<instruction>\"")
+        print("Or run a manifest: python main.py --batch manifest.jsonl")
+        sys.exit(1)
+    elif not os.path.exists(args.path):
         print(f"Error: Path {args.path} does not exist.")
         sys.exit(1)
 
-    if not os.environ.get("OPENAI_API_KEY"):
+    offline = os.environ.get("LLM_PROVIDER", "openai").lower() in ("fake", "replay")
+    if not offline and not os.environ.get("OPENAI_API_KEY"):
         print("Error: OPENAI_API_KEY environment variable not set.")
         print("Please add it to your .env file or export it in your shell.")
         sys.exit(1)
 
+    # Imported after argument checks so usage errors and --help return instantly
+    from coordinator import Coordinator
+
     # Create coordinator with backup setting
     backup_enabled = not args.no_backup
     coordinator = Coordinator(backup_enabled=backup_enabled)
+
+    if args.batch:
+        sys.exit(run_batch(args, coordinator))
     
     if args.dry_run:
         print("[*] DRY RUN MODE: Changes will be previewed but not applied")
         # TODO: Implement dry-run mode
     
-    report = coordinator.execute_request(args.path, args.instruction)
+    with trace_request("cli", path=args.path) as trace:
+        report = coordinator.execute_request(args.path, args.instruction)
+
+    if args.trace:
+        with open(args.trace, "w", encoding="utf-8") as f:
+            json.dump(trace.to_dict(), f, indent=2, default=str)
+        print(f"[*] Trace written to {args.trace}")
     
     print("\n" + "="*50)
     print("FINAL REPORT")
     print("="*50)
     print(report)
 
+def run_batch(args, coordinator):
+    from utils.batch import BatchRunner, load_manifest
+
+    try:
+        entries = load_manifest(args.batch)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    results_path = args.results or os.path.splitext(args.batch)[0] + ".results.jsonl"
+
+    def report_progress(result):
+        tokens = result["tokens"]
+        detail = f"{result['duration_s']:.1f}s, {tokens.get('in', 0)}+{tokens.get('out', 0)} tokens"
+        if result["status"] == "ok":
+            print(f"[*] Done {result['id']} ({detail})")
+        else:
+            print(f"[!] Failed {result['id']} ({detail}): {result['error']}")
+
+    print(f"[*] Batch: {len(entries)} entries from {args.batch}, concurrency {args.concurrency}, results in {results_path}")
+    runner = BatchRunner(coordinator, results_path, concurrency=args.concurrency, on_result=report_progress)
+    summary = runner.run(entries)
+    print(f"[*] Batch finished: {summary['ok']} ok, {summary['error']} failed, {summary['skipped']} already done")
+    return 1 if summary["error"] else 0
+
 if __name__ == "__main__":
     main()
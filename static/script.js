@@ -69,6 +69,15 @@ document.addEventListener('DOMContentLoaded', () => {
         }, 10);
     }
 
+    function openCodePanel() {
+        codeDisplay.textContent = '';
+        codeSection.style.display = 'flex';
+        setTimeout(() => {
+            codeSection.style.opacity = '1';
+            codeSection.style.transform = 'translateX(0)';
+        }, 10);
+    }
+
     async function processRequest() {
         const instruction = userInput.value.trim();
         if (!instruction && !selectedFile && !pastedCode) return;
@@ -98,6 +107,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const loadingMsg = appendMessage('assistant', '<div class="typing-indicator"><span></span><span></span><span></span></div> Thinking...', true);
         let assistantBubble = null;
         let reportContent = "";
+        let liveCode = "";
 
         try {
             const response = await fetch('/api/stream', {
@@ -136,6 +146,21 @@ document.addEventListener('DOMContentLoaded', () => {
                             } else if (content.startsWith('[START_REPORT]')) {
                                 if (loadingMsg) loadingMsg.remove();
                                 assistantBubble = appendMessage('assistant', '', true);
+                            } else if (content.startsWith('[CODE_START]')) {
+                                // A fenced block opened: stream it into the editor as it arrives
+                                const lang = content.slice(12).trim();
+                                liveCode = "";
+                                openCodePanel();
+                                reportContent += '```' + lang + '\n';
+                            } else if (content.startsWith('[CODE_DELTA]')) {
+                                const delta = content.slice(12);
+                                liveCode += delta;
+                                codeDisplay.textContent = liveCode;
+                                reportContent += delta;
+                                if (assistantBubble) updateBubble(assistantBubble, reportContent);
+                            } else if (content.startsWith('[CODE_END]')) {
+                                reportContent += '\n```\n';
+                                if (assistantBubble) updateBubble(assistantBubble, reportContent);
                             } else if (content.includes('[FINAL_CODE]')) {
                                 const [reportPart, codePart] = content.split('[FINAL_CODE]');
                                 if (reportPart && assistantBubble) {
@@ -0,0 +1,70 @@
+import json
+
+from tools.file_ops import write_file
+from utils.batch import BatchRunner
+
+
+class FakeCoordinator:
+    def __init__(self, fail=False, new_code=None):
+        self.fail = fail
+        self.new_code = new_code
+        self.calls = 0
+
+    def execute_request(self, target_path, instruction, history=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("provider down")
+        if self.new_code is not None:
+            write_file(target_path, self.new_code)
+        return "done"
+
+
+def _setup(tmp_path):
+    source = tmp_path / "module.py"
+    source.write_text("x = 1\n")
+    entry = {"id": "e1", "path": str(source), "instruction": "refactor"}
+    return source, entry, str(tmp_path / "results.jsonl")
+
+
+def _statuses(results):
+    with open(results, encoding="utf-8") as f:
+        return [json.loads(line)["status"] for line in f]
+
+
+def test_failed_entry_runs_again_after_the_file_is_edited(tmp_path):
+    source, entry, results = _setup(tmp_path)
+    assert BatchRunner(FakeCoordinator(fail=True), results).run([entry]) == {"skipped": 0, "ok": 0, "error": 1}
+
+    source.write_text("x = 2\n")
+    coordinator = FakeCoordinator()
+    assert BatchRunner(coordinator, results).run([entry]) == {"skipped": 0, "ok": 1, "error": 0}
+    assert coordinator.calls == 1
+
+
+def test_entry_interrupted_after_its_write_back_is_not_run_again(tmp_path):
+    source, entry, results = _setup(tmp_path)
+    BatchRunner(FakeCoordinator(new_code="y = 1\n"), results).run([entry])
+    # Drop the result line, as if the process died right after the write-back
+    with open(results, encoding="utf-8") as f:
+        lines = f.readlines()[:-1]
+    with open(results, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    assert _statuses(results) == ["started", "written"]
+
+    coordinator = FakeCoordinator()
+    assert BatchRunner(coordinator, results).run([entry]) == {"skipped": 1, "ok": 0, "error": 0}
+    assert coordinator.calls == 0
+
+
+def test_entry_edited_after_its_write_back_runs_again(tmp_path):
+    source, entry, results = _setup(tmp_path)
+    BatchRunner(FakeCoordinator(new_code="y = 1\n"), results).run([entry])
+    with open(results, encoding="utf-8") as f:
+        lines = f.readlines()[:-1]
+    with open(results, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    source.write_text("y = 2\n")
+
+    coordinator = FakeCoordinator()
+    assert BatchRunner(coordinator, results).run([entry]) == {"skipped": 0, "ok": 1, "error": 0}
+    assert coordinator.calls == 1
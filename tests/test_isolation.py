@@ -0,0 +1,60 @@
+"""Small pytest version of benchmarks/stress_concurrency.py: concurrent requests on one Coordinator stay isolated."""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.aio import iterate_sync
+
+TEMPLATES = {
+    "python": (".py", "def handler_{n}():\n    return '{marker}'\n"),
+    "javascript": (".js", "function handler{n}() {{\n  return '{marker}';\n}}\n"),
+    "go": (".go", "func Handler{n}() string {{\n\treturn \"{marker}\"\n}}\n"),
+}
+MARKER = re.compile(r"REQ-\d+-[a-z]+")
+
+
+@pytest.fixture
+def coordinator(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "fake")
+    monkeypatch.setenv("LLM_CACHE", "off")
+    monkeypatch.setenv("FAKE_LLM_TTFT", "0.01")
+    monkeypatch.setenv("FAKE_LLM_TPS", "2000")
+    monkeypatch.delenv("LLM_ROUTES", raising=False)
+    from coordinator import Coordinator
+    return Coordinator(backup_enabled=False)
+
+
+def _requests(directory, count):
+    requests = []
+    for n in range(count):
+        language = sorted(TEMPLATES)[n % len(TEMPLATES)]
+        extension, template = TEMPLATES[language]
+        marker = f"REQ-{n}-{'abcdefghij'[n % 10] * 3}"
+        path = directory / f"req_{n}{extension}"
+        path.write_text(template.format(n=n, marker=marker), encoding="utf-8")
+        requests.append({"language": language, "marker": marker, "path": str(path), "mode": ("sync", "async", "chat")[n % 3]})
+    return requests
+
+
+def _run(coordinator, request):
+    instruction = f"refactor this file for readability and keep {request['marker']} intact please"
+    if request["mode"] == "chat":
+        stream = coordinator.execute_request_stream("", f"{request['marker']} hello")
+    elif request["mode"] == "async":
+        stream = iterate_sync(coordinator.aexecute_request_stream(request["path"], instruction))
+    else:
+        stream = coordinator.execute_request_stream(request["path"], instruction)
+    return "".join(stream)
+
+
+def test_concurrent_requests_only_see_their_own_prompt_and_code(coordinator, tmp_path):
+    requests = _requests(tmp_path, 24)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outputs = list(pool.map(lambda r: _run(coordinator, r), requests))
+    for request, output in zip(requests, outputs):
+        assert set(MARKER.findall(output)) == {request["marker"]}
+        if request["mode"] != "chat":
+            assert re.findall(r"\[CODE_START\](\w*)", output) == [request["language"]]
+            with open(request["path"], encoding="utf-8") as f:
+                assert output.endswith(f"[FINAL_CODE]\n{f.read().rstrip()}")
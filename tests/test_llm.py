@@ -0,0 +1,36 @@
+import asyncio
+
+from utils.llm import LLMFactory
+from utils.telemetry import trace_request
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+def _llm_spans(trace):
+    return [s for s in trace.spans if s.kind.startswith("llm.")]
+
+
+def test_cache_hits_are_not_traced_as_llm_calls(monkeypatch, tmp_path):
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setenv("LLM_RESILIENCE", "off")
+    llm = LLMFactory.create_llm("fake", cache=True, ttft=0.0, tokens_per_sec=0)
+    with trace_request("test") as trace:
+        first = llm.get_completion(MESSAGES)
+        assert llm.get_completion(MESSAGES) == first
+        assert "".join(llm.get_streaming_completion(MESSAGES)) == first
+    assert len(_llm_spans(trace)) == 1
+    assert trace.tokens["out"] > 0
+
+
+def test_async_cache_hits_are_not_traced_as_llm_calls(monkeypatch, tmp_path):
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setenv("LLM_RESILIENCE", "off")
+    llm = LLMFactory.create_async_llm("fake", cache=True, ttft=0.0, tokens_per_sec=0)
+
+    async def calls():
+        first = await llm.get_completion(MESSAGES)
+        assert await llm.get_completion(MESSAGES) == first
+
+    with trace_request("test") as trace:
+        asyncio.run(calls())
+    assert len(_llm_spans(trace)) == 1
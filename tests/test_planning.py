@@ -0,0 +1,36 @@
+import pytest
+
+from utils.planning import classify_request
+
+
+@pytest.mark.parametrize("instruction", [
+    "extract the list of API endpoints this module exposes",
+    "extract all the SQL queries from this file",
+    "simplify the explanation of the caching layer",
+    "clean up the README",
+    "suggest refactorings for this module",
+    "list refactoring opportunities",
+    "which functions should I refactor?",
+    "what would you rename here",
+])
+def test_read_only_requests_do_not_get_the_refactor_plan(instruction):
+    assert classify_request(instruction) != "refactor"
+
+
+@pytest.mark.parametrize("instruction", [
+    "refactor this module",
+    "extract a helper function for the retry loop",
+    "extract the validation logic into its own method",
+    "simplify the nested loops",
+    "clean up the code",
+    "rename `get_user` to `fetch_user` in api.py",
+    "reduce the complexity of parse_args",
+])
+def test_code_changes_get_the_refactor_plan(instruction):
+    assert classify_request(instruction) == "refactor"
+
+
+def test_explanations_and_documentation():
+    assert classify_request("explain how the cache works") == "explain"
+    assert classify_request("add docstrings to every function") == "document"
+    assert classify_request("explain, don't refactor") is None
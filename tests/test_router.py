@@ -0,0 +1,56 @@
+import pytest
+
+from utils.cache import ResponseCache
+from utils.llm import BaseLLM, CachedLLM
+from utils.llm_errors import LLMRequestError, LLMServerError
+from utils.router import ModelRouter, RoutedLLM
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+class StubLLM(BaseLLM):
+    def __init__(self, error=None):
+        self.error = error
+        self.model = "stub"
+        self.calls = 0
+
+    def get_completion(self, messages, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return "pong"
+
+    def get_streaming_completion(self, messages, **kwargs):
+        yield self.get_completion(messages, **kwargs)
+
+
+def _routed(client):
+    router = ModelRouter({"min_samples": 2, "profiles": {"main": {"provider": "fake"}, "backup": {"provider": "fake"}},
+                          "routes": {"default": ["main", "backup"]}})
+    router.profiles["main"]._clients[False] = client
+    router.profiles["backup"]._clients[False] = StubLLM()
+    return router, RoutedLLM(router, "default")
+
+
+def test_rejected_requests_do_not_degrade_the_profile():
+    router, llm = _routed(StubLLM(LLMRequestError("context length exceeded")))
+    for _ in range(5):
+        with pytest.raises(LLMRequestError):
+            llm.get_completion(MESSAGES)
+    assert router.stats()["main"] == {"provider": "fake", "model": "", "degraded": False, "calls": 0, "errors": 0}
+
+
+def test_server_errors_degrade_the_profile_and_fail_over():
+    router, llm = _routed(StubLLM(LLMServerError("overloaded")))
+    assert [llm.get_completion(MESSAGES) for _ in range(3)] == ["pong"] * 3
+    assert router.stats()["main"]["degraded"]
+
+
+def test_cache_hits_are_not_recorded_as_provider_calls():
+    provider = StubLLM()
+    router, llm = _routed(CachedLLM(provider, ResponseCache(":memory:")))
+    for _ in range(3):
+        assert llm.get_completion(MESSAGES) == "pong"
+    assert "".join(llm.get_streaming_completion(MESSAGES)) == "pong"
+    assert provider.calls == 1
+    assert router.stats()["main"]["calls"] == 1
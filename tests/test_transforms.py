@@ -0,0 +1,56 @@
+from tools.transforms import rename, try_local_transform
+
+METHOD_CODE = '''class Repo:
+    def get_user(self, user_id):
+        return user_id
+
+
+def main(repo):
+    return repo.get_user(1)
+'''
+
+SCOPED_CODE = '''def load(path=None):
+    return open(path).read()
+
+
+def first(path):
+    return load(path=path)
+
+
+def second():
+    path = "b.txt"
+    return path
+'''
+
+
+def test_rename_method_is_left_to_the_llm():
+    assert rename(METHOD_CODE, "get_user", "fetch_user") is None
+    assert try_local_transform(METHOD_CODE, "rename get_user to fetch_user", "python") is None
+
+
+def test_rename_parameter_and_keyword_is_left_to_the_llm():
+    assert rename(SCOPED_CODE, "path", "file_path") is None
+    assert try_local_transform(SCOPED_CODE, "rename variable path to file_path", "python") is None
+
+
+def test_rename_name_bound_in_several_scopes_is_left_to_the_llm():
+    code = "def a():\n    total = 1\n    return total\n\n\ndef b():\n    total = 2\n    return total\n"
+    assert rename(code, "total", "amount") is None
+
+
+def test_rename_single_module_binding():
+    code = "LIMIT = 3\n\n\ndef check(n):\n    return n < LIMIT\n"
+    renamed, note = rename(code, "LIMIT", "MAX_ITEMS")
+    assert renamed == "MAX_ITEMS = 3\n\n\ndef check(n):\n    return n < MAX_ITEMS\n"
+    assert "2 occurrences" in note
+
+
+def test_rename_used_inside_an_f_string_is_left_to_the_llm():
+    code = "def f():\n    return f'{x}'\n\n\nx = 1\n"
+    assert rename(code, "x", "y") is None
+
+
+def test_rename_function_definition_and_calls():
+    code = "def load():\n    return 1\n\n\nvalue = load()\n"
+    renamed, _ = rename(code, "load", "read")
+    assert renamed == "def read():\n    return 1\n\n\nvalue = read()\n"
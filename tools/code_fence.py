@@ -0,0 +1,201 @@
+"""Incremental fenced-code-block extraction for streamed LLM output."""
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from tools.language_detector import LANGUAGE_MAP
+
+FENCE_OPEN = re.compile(r'^ {0,3}(`{3,}|~{3,})\s*([^`\s]*)[^`]*$')
+# A partial line inside a block that could still turn out to be the closing fence.
+CLOSE_PREFIX = re.compile(r'^ {0,3}[`~]*\s*$')
+
+LANGUAGE_ALIASES = {ext.lstrip('.'): language for ext, language in LANGUAGE_MAP.items()}
+LANGUAGE_ALIASES.update({language: language for language in LANGUAGE_MAP.values()})
+LANGUAGE_ALIASES.update({
+    'python3': 'python', 'py3': 'python', 'node': 'javascript', 'nodejs': 'javascript',
+    'c++': 'cpp', 'cxx': 'cpp', 'c#': 'csharp', 'cs': 'csharp', 'golang': 'go',
+    'kt': 'kotlin', 'kts': 'kotlin', 'rs': 'rust', 'rb': 'ruby', 'ts': 'typescript',
+    'js': 'javascript', 'jsx': 'javascript', 'tsx': 'typescript',
+})
+
+
+def normalize_language(info: str) -> Optional[str]:
+    """Map a fence info string (``py``, ``c++``, ``typescript``...) to a LANGUAGE_MAP language."""
+    if not info:
+        return None
+    info = info.strip().lower()
+    return LANGUAGE_ALIASES.get(info, info)
+
+
+@dataclass
+class FenceEvent:
+    type: str  # "text", "code_start", "code_delta" or "code_end"
+    text: str = ""
+    language: Optional[str] = None
+    index: int = 0
+
+
+class CodeFenceParser:
+    """Consumes chunks as they arrive and reports fenced blocks as start/delta/end events.
+
+    Fence state survives chunk boundaries. Partial lines are emitted right away
+    unless they could still be a fence line, so deltas trail the model by at most
+    one short line. ``code_end`` carries the block's full code only when
+    ``keep_code`` is set.
+    """
+
+    def __init__(self, keep_code: bool = True):
+        self.keep_code = keep_code
+        self.blocks: List[dict] = []
+        self._buffer = ""
+        self._in_fence = False
+        self._fence = ""
+        self._language = None
+        self._line_open = False  # part of the current line was already emitted
+        self._first_line = True
+        self._code_parts: List[str] = []
+
+    def feed(self, chunk: str) -> List[FenceEvent]:
+        self._buffer += chunk
+        events = []
+        while self._buffer:
+            newline = self._buffer.find("\n")
+            if newline == -1:
+                self._consume_partial(events)
+                break
+            line = self._buffer[:newline]
+            self._buffer = self._buffer[newline + 1:]
+            self._consume_line(line, events)
+        return events
+
+    def close(self) -> List[FenceEvent]:
+        """Flush the tail; an unterminated block is closed with what was received."""
+        events = []
+        if self._buffer:
+            line, self._buffer = self._buffer, ""
+            self._consume_line(line, events, final=True)
+        if self._in_fence:
+            self._end_block(events)
+        return events
+
+    def _consume_partial(self, events):
+        partial = self._buffer
+        if self._in_fence:
+            if self._line_open or not CLOSE_PREFIX.match(partial):
+                self._code_text(partial, events)
+                self._buffer = ""
+        elif self._line_open or (partial.strip() and not partial.lstrip(" ").startswith(("`", "~"))):
+            self._text(partial, events)
+            self._line_open = True
+            self._buffer = ""
+
+    def _consume_line(self, line, events, final=False):
+        if self._in_fence:
+            if not self._line_open and self._is_closing_fence(line):
+                self._end_block(events)
+            else:
+                self._code_text(line, events)
+                self._line_open = False
+            return
+
+        if not self._line_open:
+            match = FENCE_OPEN.match(line)
+            if match:
+                self._start_block(match.group(1), match.group(2), events)
+                return
+        self._text(line if final else line + "\n", events)
+        self._line_open = False
+
+    def _is_closing_fence(self, line):
+        stripped = line.strip()
+        return (len(line) - len(line.lstrip(" ")) <= 3 and len(stripped) >= len(self._fence)
+                and set(stripped) == {self._fence[0]})
+
+    def _text(self, text, events):
+        if text:
+            events.append(FenceEvent("text", text))
+
+    def _code_text(self, text, events):
+        if not self._line_open:
+            # Lines are joined with a leading separator so the block never ends in a stray newline.
+            if not self._first_line:
+                self._emit_code("\n", events)
+            self._first_line = False
+            self._line_open = True
+        self._emit_code(text, events)
+
+    def _emit_code(self, text, events):
+        if not text:
+            return
+        if self.keep_code:
+            self._code_parts.append(text)
+        if events and events[-1].type == "code_delta":
+            events[-1].text += text
+        else:
+            events.append(FenceEvent("code_delta", text, self._language, len(self.blocks)))
+
+    def _start_block(self, fence, info, events):
+        self._in_fence = True
+        self._fence = fence
+        self._language = normalize_language(info)
+        self._first_line = True
+        self._code_parts = []
+        events.append(FenceEvent("code_start", "", self._language, len(self.blocks)))
+
+    def _end_block(self, events):
+        code = "".join(self._code_parts)
+        index = len(self.blocks)
+        self.blocks.append({"language": self._language, "code": code if self.keep_code else None})
+        events.append(FenceEvent("code_end", code if self.keep_code else "", self._language, index))
+        self._in_fence = False
+        self._fence = ""
+        self._language = None
+        self._line_open = False
+        self._code_parts = []
+
+
+def extract_code_blocks(text: str) -> List[dict]:
+    """All fenced blocks in a complete response, as ``{"language", "code"}`` dicts."""
+    parser = CodeFenceParser()
+    parser.feed(text)
+    parser.close()
+    return parser.blocks
+
+
+def select_code_block(blocks: List[dict], language: Optional[str] = None) -> Optional[str]:
+    """The block that best represents the result: first one in ``language``, else the first one."""
+    if not blocks:
+        return None
+    for block in blocks:
+        if language and block["language"] == language:
+            return block["code"]
+    return blocks[0]["code"]
+
+
+def fence_markers(events: List[FenceEvent]) -> List[str]:
+    """Render parser events as stream parts: prose passes through, code gets editor markers."""
+    parts = []
+    for event in events:
+        if event.type == "text":
+            parts.append(event.text)
+        elif event.type == "code_start":
+            parts.append(f"[CODE_START]{event.language or ''}\n")
+        elif event.type == "code_delta":
+            parts.append(f"[CODE_DELTA]{event.text}")
+        elif event.type == "code_end":
+            parts.append("[CODE_END]\n")
+    return parts
+
+
+MARKER = re.compile(r'\[CODE_START\]([^\n]*)\n|\[CODE_DELTA\]|\[CODE_END\]\n?')
+
+
+def render_markers(text: str) -> str:
+    """Inverse of fence_markers: turn a stored marker stream back into fenced markdown."""
+    def replace(match):
+        if match.group(0).startswith("[CODE_START]"):
+            return f"```{match.group(1)}\n"
+        if match.group(0).startswith("[CODE_END]"):
+            return "\n```\n"
+        return ""
+    return MARKER.sub(replace, text)
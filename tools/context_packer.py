@@ -0,0 +1,229 @@
+"""Token-budgeted context packing with relevance ranking."""
+import ast
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from tools.language_detector import detect_language
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # optional dependency; fall back to a character heuristic
+    _ENCODING = None
+
+# Default per-agent budgets in tokens; override with CONTEXT_BUDGET_<AGENT>.
+AGENT_TOKEN_BUDGETS = {
+    "planner": 1500,
+    "analysis": 12000,
+    "crew": 4000,
+    "crew_history": 2000,
+    "history": 2000,
+    "history_summary_input": 6000,
+}
+
+SECTION_HEADER = re.compile(r'^--- (.+?) ---$', re.MULTILINE)
+WORD = re.compile(r'[A-Za-z_][A-Za-z0-9_]{2,}')
+
+OUTLINE_PATTERNS = [
+    re.compile(r'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:function|class|interface|type|enum)\s+\w+.*$'),
+    re.compile(r'^\s*(?:pub(?:\(\w+\))?\s+)?(?:fn|struct|enum|trait|impl|mod)\b.*$'),
+    re.compile(r'^\s*func\s+.*$'),
+    re.compile(r'^\s*(?:def|class|module)\s+\w+.*$'),
+    re.compile(r'^\s*(?:public|private|protected|internal|static|final|abstract|override)\s+[\w<>\[\],\s]+\(.*$'),
+    re.compile(r'^\s*(?:import|from|#include|using|package|require)\b.*$'),
+]
+
+IMPORT_PATTERNS = [
+    re.compile(r'''(?:from|import)\s+['"]([^'"]+)['"]'''),
+    re.compile(r'''require\(\s*['"]([^'"]+)['"]\s*\)'''),
+    re.compile(r'''#include\s+["<]([^">]+)[">]'''),
+    re.compile(r'^\s*import\s+([\w.]+)', re.MULTILINE),
+    re.compile(r'^\s*from\s+([\w.]+)\s+import', re.MULTILINE),
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """Local token estimate: tiktoken when installed, otherwise ~4 characters per token."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def get_budget(agent: str) -> int:
+    value = os.environ.get(f"CONTEXT_BUDGET_{agent.upper()}")
+    return int(value) if value else AGENT_TOKEN_BUDGETS.get(agent, 4000)
+
+
+def extract_outline(content: str, language: str = "python") -> str:
+    """Imports and signatures only: a compact stand-in for a file that does not fit the budget."""
+    if language == "python":
+        try:
+            tree = ast.parse(content)
+        except SyntaxError:
+            tree = None
+        if tree is not None:
+            lines = content.splitlines()
+            outline = []
+            for node in ast.walk(tree):
+                if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    line = lines[node.lineno - 1].rstrip() if node.lineno <= len(lines) else ""
+                    outline.append((node.lineno, line))
+            return "\n".join(f"{lineno}: {line}" for lineno, line in sorted(outline))
+
+    outline = []
+    for lineno, line in enumerate(content.splitlines(), 1):
+        if any(pattern.match(line) for pattern in OUTLINE_PATTERNS):
+            outline.append(f"{lineno}: {line.rstrip()}")
+    return "\n".join(outline)
+
+
+def extract_imports(content: str) -> List[str]:
+    """Module/file names referenced by import statements, reduced to their last path component."""
+    names = set()
+    for pattern in IMPORT_PATTERNS:
+        for match in pattern.findall(content):
+            target = match.replace("\\", "/").rstrip("/")
+            last = re.split(r'[./]', os.path.splitext(target)[0] if "/" in target else target)[-1]
+            if last:
+                names.add(last.lower())
+    return sorted(names)
+
+
+@dataclass
+class Snippet:
+    name: str
+    content: str
+    language: str = "unknown"
+    mtime: float = 0.0
+    score: float = 0.0
+
+
+def rank_snippets(snippets: List[Snippet], instruction: str) -> List[Snippet]:
+    """Order snippets by relevance: name matches, instruction terms, import proximity, recency."""
+    terms = {part for word in WORD.findall(instruction) for part in word.lower().split("_") if len(part) > 2}
+    instruction_lower = instruction.lower()
+    stems = {}
+    for snippet in snippets:
+        stem = os.path.splitext(os.path.basename(snippet.name))[0].lower()
+        stems.setdefault(stem, []).append(snippet)
+
+        score = 0.0
+        if os.path.basename(snippet.name).lower() in instruction_lower:
+            score += 10
+        path_words = set(re.split(r'[^a-z0-9]+', snippet.name.lower()))
+        score += 3 * len(terms & path_words)
+        snippet.score = score
+
+    # Import proximity: files pulled in by files the instruction names are relevant too.
+    neighbours = set()
+    for snippet in snippets:
+        if snippet.score <= 0:
+            continue
+        for name in extract_imports(snippet.content):
+            neighbours.update(id(imported) for imported in stems.get(name, []) if imported is not snippet)
+
+    for snippet in snippets:
+        if id(snippet) in neighbours:
+            snippet.score += 2
+        content_lower = snippet.content.lower()
+        snippet.score += min(5, sum(1 for term in terms if term in content_lower)) * 0.5
+
+    # Recency: up to one point for the most recently modified file.
+    mtimes = [snippet.mtime for snippet in snippets if snippet.mtime]
+    if mtimes and max(mtimes) > min(mtimes):
+        oldest, newest = min(mtimes), max(mtimes)
+        for snippet in snippets:
+            if snippet.mtime:
+                snippet.score += (snippet.mtime - oldest) / (newest - oldest)
+
+    return sorted(snippets, key=lambda snippet: snippet.score, reverse=True)
+
+
+def pack_snippets(snippets: List[Snippet], instruction: str, budget_tokens: int) -> str:
+    """Fill the budget with full text for the most relevant snippets and outlines for the rest."""
+    parts = []
+    remaining = budget_tokens
+    omitted = []
+    for snippet in rank_snippets(snippets, instruction):
+        full = f"--- {snippet.name} ---\n{snippet.content}\n"
+        cost = estimate_tokens(full)
+        if cost <= remaining:
+            parts.append(full)
+            remaining -= cost
+            continue
+
+        outline = f"--- {snippet.name} (outline) ---\n{extract_outline(snippet.content, snippet.language)}\n"
+        cost = estimate_tokens(outline)
+        if cost <= remaining:
+            parts.append(outline)
+            remaining -= cost
+        elif not parts:
+            # Nothing fits yet: keep the head of the outline rather than sending nothing.
+            parts.append(outline[: max(0, remaining) * 4])
+            remaining = 0
+        else:
+            omitted.append(snippet.name)
+
+    if omitted:
+        listing = "--- omitted (over budget) ---\n"
+        for name in omitted:
+            remaining -= estimate_tokens(name) + 1
+            if remaining < 0:
+                listing += "...\n"
+                break
+            listing += name + "\n"
+        parts.append(listing)
+    return "\n".join(parts)
+
+
+def pack_files(paths: List[str], instruction: str, budget_tokens: int, read=None) -> str:
+    """Pack files from disk under a token budget."""
+    if read is None:
+        from tools.file_ops import read_file as read
+    snippets = []
+    for path in paths:
+        if not os.path.isfile(path):
+            continue
+        snippets.append(Snippet(path, read(path), detect_language(path), os.path.getmtime(path)))
+    return pack_snippets(snippets, instruction, budget_tokens)
+
+
+def pack_text(text: str, budget_tokens: int, instruction: str = "", language: str = "unknown") -> str:
+    """Pack an already assembled context string (``--- path ---`` sections are ranked separately)."""
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+
+    headers = list(SECTION_HEADER.finditer(text))
+    if not headers:
+        return pack_snippets([Snippet("context", text, language)], instruction, budget_tokens)
+
+    snippets = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        name = header.group(1)
+        body = text[header.end():end].strip("\n")
+        snippets.append(Snippet(name, body, detect_language(name)))
+    return pack_snippets(snippets, instruction, budget_tokens)
+
+
+def pack_history(history: Optional[List[Dict[str, str]]], budget_tokens: int) -> List[Dict[str, str]]:
+    """Keep the newest messages verbatim within the budget; older ones are shortened or dropped."""
+    if not history:
+        return []
+    packed = []
+    remaining = budget_tokens
+    for message in reversed(history):
+        content = message.get("content", "")
+        cost = estimate_tokens(content)
+        if cost > remaining:
+            if remaining < 16:
+                break
+            content = content[: remaining * 4 - 3] + "..."
+            cost = remaining
+        packed.append({"role": message.get("role", "user"), "content": content})
+        remaining -= cost
+    return list(reversed(packed))
@@ -1,5 +1,6 @@
 from crewai.tools import tool
 from tools.file_ops import read_file, write_file, list_files
+from tools.symbol_index import get_index
 import os
 
 @tool("read_file_tool")
@@ -17,3 +18,23 @@ def list_files_tool(directory: str) -> str:
     """Lists all files in a directory recursively."""
     files = list_files(directory)
     return "\n".join(files)
+
+@tool("find_symbol_tool")
+def find_symbol_tool(symbol: str, directory: str) -> str:
+    """Finds where a function, class or variable is defined and where it is used inside a directory, without reading whole files."""
+    index = get_index(directory)
+    definitions = index.definitions(symbol)
+    references = index.references(symbol)
+    lines = [f"Definitions of {symbol}:"]
+    lines += [f"  {d['path']}:{d['line']} ({d['kind']}) {d['signature']}" for d in definitions] or ["  none found"]
+    lines.append(f"References to {symbol}:")
+    lines += [f"  {r['path']}:{r['line']}" for r in references[:50]] or ["  none found"]
+    if len(references) > 50:
+        lines.append(f"  ... {len(references) - 50} more")
+    return "\n".join(lines)
+
+@tool("file_outline_tool")
+def file_outline_tool(file_path: str) -> str:
+    """Lists the classes, functions and methods defined in a file with their line numbers."""
+    index = get_index(os.path.dirname(os.path.abspath(file_path)))
+    return index.format_outline(file_path) or f"No symbols found in {file_path}"
@@ -0,0 +1,298 @@
+"""Single-pass line diff engine behind tools/diff_generator.
+
+Lines are interned to integers once, then matched with a patience-style
+algorithm: lines that are unique in both ranges become anchors (longest
+increasing run via patience sorting) and the gaps between anchors are
+refined recursively. Common prefixes/suffixes are trimmed at every level,
+so the frequent repeated lines (blank lines, braces) never drive a
+quadratic search; only small anchor-free gaps fall back to difflib.
+
+One DiffResult (the opcodes) is computed per (original, modified) pair and
+cached by content hash; unified diff, summary, highlights and side-by-side
+views are all derived from it.
+"""
+import bisect
+import difflib
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+Opcode = Tuple[str, int, int, int, int]
+
+# Anchor-free gaps up to this many cells (len(a) * len(b)) are refined with difflib.
+SMALL_GAP_CELLS = 40000
+CACHE_SIZE = 128
+
+
+def _intern(a_lines: List[str], b_lines: List[str]) -> Tuple[List[int], List[int]]:
+    table: Dict[str, int] = {}
+    a = [table.setdefault(line, len(table)) for line in a_lines]
+    b = [table.setdefault(line, len(table)) for line in b_lines]
+    return a, b
+
+
+def _unique_positions(seq: List[int], lo: int, hi: int) -> Dict[int, int]:
+    """Map value -> index for values occurring exactly once in seq[lo:hi]."""
+    seen: Dict[int, int] = {}
+    for i in range(lo, hi):
+        value = seq[i]
+        seen[value] = -1 if value in seen else i
+    return {value: i for value, i in seen.items() if i >= 0}
+
+
+def _patience_anchors(a: List[int], a_lo: int, a_hi: int, b: List[int], b_lo: int, b_hi: int) -> List[Tuple[int, int]]:
+    """Longest increasing sequence of lines unique in both ranges."""
+    unique_a = _unique_positions(a, a_lo, a_hi)
+    if not unique_a:
+        return []
+    unique_b = _unique_positions(b, b_lo, b_hi)
+    pairs = [(i, unique_b[a[i]]) for i in sorted(unique_a.values()) if a[i] in unique_b]
+    if not pairs:
+        return []
+
+    # Patience sorting on the b positions (pairs are already ordered by a).
+    tails: List[int] = []  # b value at the top of each pile
+    tops: List[int] = []  # index into pairs at the top of each pile
+    back: List[int] = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pile = bisect.bisect_left(tails, j)
+        if pile > 0:
+            back[k] = tops[pile - 1]
+        if pile == len(tails):
+            tails.append(j)
+            tops.append(k)
+        else:
+            tails[pile] = j
+            tops[pile] = k
+
+    anchors = []
+    k = tops[-1]
+    while k != -1:
+        anchors.append(pairs[k])
+        k = back[k]
+    anchors.reverse()
+    return anchors
+
+
+class _Matches(tuple):
+    """Stack entry holding already known matches, emitted when popped."""
+
+
+def _match_lines(a: List[int], b: List[int]) -> List[Tuple[int, int]]:
+    """All matched (i, j) line pairs, in order."""
+    matches: List[Tuple[int, int]] = []
+    # Work is processed depth-first and left to right, so matches come out sorted.
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, _Matches):
+            matches.extend(item)
+            continue
+
+        a_lo, a_hi, b_lo, b_hi = item
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            matches.append((a_lo, b_lo))
+            a_lo += 1
+            b_lo += 1
+        suffix = []
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+            suffix.append((a_hi, b_hi))
+        suffix.reverse()
+
+        if a_lo < a_hi and b_lo < b_hi:
+            anchors = _patience_anchors(a, a_lo, a_hi, b, b_lo, b_hi)
+            if anchors:
+                work = []
+                prev_i, prev_j = a_lo, b_lo
+                for i, j in anchors:
+                    work.append((prev_i, i, prev_j, j))
+                    work.append(_Matches([(i, j)]))
+                    prev_i, prev_j = i + 1, j + 1
+                work.append((prev_i, a_hi, prev_j, b_hi))
+                work.append(_Matches(suffix))
+                stack.extend(reversed(work))
+                continue
+            if (a_hi - a_lo) * (b_hi - b_lo) <= SMALL_GAP_CELLS:
+                matcher = difflib.SequenceMatcher(None, a[a_lo:a_hi], b[b_lo:b_hi], autojunk=False)
+                for i, j, size in matcher.get_matching_blocks():
+                    matches.extend((a_lo + i + k, b_lo + j + k) for k in range(size))
+        matches.extend(suffix)
+    return matches
+
+
+def _opcodes_from_matches(matches: List[Tuple[int, int]], n: int, m: int) -> List[Opcode]:
+    opcodes: List[Opcode] = []
+    i = j = 0
+    run_start = None
+    for mi, mj in matches + [(n, m)]:
+        if (mi, mj) != (i, j) or (mi, mj) == (n, m):
+            if run_start is not None and (i, j) != run_start:
+                opcodes.append(("equal", run_start[0], i, run_start[1], j))
+            run_start = None
+            if mi > i and mj > j:
+                opcodes.append(("replace", i, mi, j, mj))
+            elif mi > i:
+                opcodes.append(("delete", i, mi, j, j))
+            elif mj > j:
+                opcodes.append(("insert", i, i, j, mj))
+        if (mi, mj) == (n, m):
+            break
+        if run_start is None:
+            run_start = (mi, mj)
+        i, j = mi + 1, mj + 1
+    return opcodes
+
+
+def compute_opcodes(a_lines: List[str], b_lines: List[str]) -> List[Opcode]:
+    """difflib-compatible opcodes for two line lists."""
+    a, b = _intern(a_lines, b_lines)
+    return _opcodes_from_matches(_match_lines(a, b), len(a), len(b))
+
+
+def group_opcodes(opcodes: List[Opcode], n: int = 3) -> List[List[Opcode]]:
+    """Hunks with ``n`` lines of context (same grouping as difflib.get_grouped_opcodes)."""
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    nn = n + n
+    group: List[Opcode] = []
+    groups = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def _format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+class DiffResult:
+    """Opcodes for one (original, modified) pair plus every view derived from them."""
+
+    def __init__(self, original: str, modified: str):
+        self.original_lines = original.splitlines()
+        self.modified_lines = modified.splitlines()
+        self.opcodes = compute_opcodes(self.original_lines, self.modified_lines)
+        self._unified: Dict[Tuple[str, int], str] = {}
+        self._lock = threading.Lock()
+
+    def unified_diff(self, filename: str = "file", n: int = 3) -> str:
+        with self._lock:
+            cached = self._unified.get((filename, n))
+        if cached is not None:
+            return cached
+
+        a, b = self.original_lines, self.modified_lines
+        out = []
+        for group in group_opcodes(self.opcodes, n):
+            if not out:
+                out.append(f"--- a/{filename}\n")
+                out.append(f"+++ b/{filename}\n")
+            first, last = group[0], group[-1]
+            out.append(f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@\n")
+            for tag, i1, i2, j1, j2 in group:
+                if tag == "equal":
+                    out.extend(f" {line}\n" for line in a[i1:i2])
+                    continue
+                if tag in ("replace", "delete"):
+                    out.extend(f"-{line}\n" for line in a[i1:i2])
+                if tag in ("replace", "insert"):
+                    out.extend(f"+{line}\n" for line in b[j1:j2])
+        text = "".join(out)
+        with self._lock:
+            self._unified[(filename, n)] = text
+        return text
+
+    def summary(self) -> dict:
+        additions = deletions = 0
+        for tag, i1, i2, j1, j2 in self.opcodes:
+            if tag in ("replace", "delete"):
+                deletions += i2 - i1
+            if tag in ("replace", "insert"):
+                additions += j2 - j1
+        return {
+            'additions': additions,
+            'deletions': deletions,
+            'total_changes': additions + deletions,
+            'original_lines': len(self.original_lines),
+            'modified_lines': len(self.modified_lines),
+        }
+
+    def highlights(self) -> List[Tuple[str, str, str]]:
+        a, b = self.original_lines, self.modified_lines
+        changes = []
+        for tag, i1, i2, j1, j2 in self.opcodes:
+            if tag == 'replace':
+                changes.append(('modified', '\n'.join(a[i1:i2]), '\n'.join(b[j1:j2])))
+            elif tag == 'delete':
+                changes.append(('deleted', '\n'.join(a[i1:i2]), ''))
+            elif tag == 'insert':
+                changes.append(('added', '', '\n'.join(b[j1:j2])))
+        return changes
+
+    def side_by_side_rows(self) -> List[Tuple[str, str, str]]:
+        """(left, marker, right) rows aligned on the opcodes; markers follow sdiff (| * < >)."""
+        a, b = self.original_lines, self.modified_lines
+        rows = []
+        for tag, i1, i2, j1, j2 in self.opcodes:
+            if tag == "equal":
+                rows.extend((a[i], "|", b[j]) for i, j in zip(range(i1, i2), range(j1, j2)))
+            elif tag == "delete":
+                rows.extend((a[i], "<", "") for i in range(i1, i2))
+            elif tag == "insert":
+                rows.extend(("", ">", b[j]) for j in range(j1, j2))
+            else:
+                left, right = a[i1:i2], b[j1:j2]
+                for k in range(max(len(left), len(right))):
+                    if k < len(left) and k < len(right):
+                        rows.append((left[k], "*", right[k]))
+                    elif k < len(left):
+                        rows.append((left[k], "<", ""))
+                    else:
+                        rows.append(("", ">", right[k]))
+        return rows
+
+
+_cache: "OrderedDict[Tuple[str, str], DiffResult]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def get_diff(original: str, modified: str) -> DiffResult:
+    """Cached DiffResult for a pair of texts, keyed by content hash."""
+    key = (_digest(original), _digest(modified))
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+            return result
+    result = DiffResult(original, modified)
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
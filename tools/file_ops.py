@@ -1,7 +1,24 @@
+import contextvars
 import os
 import shutil
+from contextlib import contextmanager
 from datetime import datetime
 
+from utils.telemetry import traced
+
+# Called as listener(file_path, content) after every successful write in the current context
+_write_listener = contextvars.ContextVar("write_listener", default=None)
+
+@contextmanager
+def on_write(listener):
+    """Report the writes made inside the block (and in contexts copied from it) to ``listener``."""
+    token = _write_listener.set(listener)
+    try:
+        yield
+    finally:
+        _write_listener.reset(token)
+
+@traced("file.read")
 def read_file(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
@@ -14,9 +31,12 @@ def write_file(file_path, content):
         os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(content)
-        return f"Successfully wrote to {file_path}"
     except Exception as e:
         return f"Error writing file {file_path}: {str(e)}"
+    listener = _write_listener.get()
+    if listener is not None:
+        listener(file_path, content)
+    return f"Successfully wrote to {file_path}"
 
 def create_backup(file_path):
     """Create a backup of a file before modification."""
@@ -54,6 +74,7 @@ def restore_from_backup(backup_path, original_path):
     except Exception as e:
         return f"Error restoring from backup: {str(e)}"
 
+@traced("file.list")
 def list_files(directory, ignore_dirs=None, extensions=None):
     """List files in directory with optional filtering."""
     if ignore_dirs is None:
@@ -0,0 +1,252 @@
+"""Edit parsing and patch application behind tools/diff_generator.
+
+Models describe edits in one of two formats, and both are parsed into Edit
+objects (search lines to find, replacement lines):
+
+    <<<<<<< SEARCH
+    original lines
+    =======
+    replacement lines
+    >>>>>>> REPLACE
+
+or unified diff hunks (``@@ -12,3 +12,4 @@`` followed by `` ``/``-``/``+``
+lines).
+
+Each edit is located in the current text with increasingly tolerant
+matching:
+1. an exact line match
+2. a match that ignores whitespace differences, with the replacement
+   re-indented to the matched lines
+3. a fuzzy match (difflib ratio of at least ``fuzz``)
+
+Several equally good matches are disambiguated by a diff hunk's line
+number. An edit that matches nowhere, matches ambiguously, or would
+rewrite lines an earlier edit produced is a conflict. Conflicts are
+reported and never guessed, so the caller can fall back to asking for the
+full file.
+"""
+import difflib
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+SEARCH_MARK = re.compile(r'^\s*<{5,9}\s*SEARCH\s*$')
+DIVIDER_MARK = re.compile(r'^\s*={5,9}\s*$')
+REPLACE_MARK = re.compile(r'^\s*>{5,9}\s*REPLACE\s*$')
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+FENCE = re.compile(r'^\s*(`{3,}|~{3,})')
+
+DEFAULT_FUZZ = 0.85
+
+
+@dataclass
+class Edit:
+    search: List[str]
+    replace: List[str]
+    hint: Optional[int] = None  # 0-based line where a diff hunk says the search starts
+
+
+@dataclass
+class PatchResult:
+    text: str
+    applied: int = 0
+    fuzzy: int = 0  # edits placed by whitespace-insensitive or fuzzy matching
+    conflicts: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.applied > 0 and not self.conflicts
+
+
+def parse_edits(text: str) -> List[Edit]:
+    """SEARCH/REPLACE blocks if the response has any, otherwise unified diff hunks."""
+    lines = text.replace("\r\n", "\n").split("\n")
+    edits = _parse_search_replace(lines)
+    return edits if edits else _parse_unified(lines)
+
+
+def _parse_search_replace(lines: List[str]) -> List[Edit]:
+    edits = []
+    state, search, replace = None, [], []
+    for line in lines:
+        if state is None:
+            if SEARCH_MARK.match(line):
+                state, search, replace = "search", [], []
+        elif state == "search":
+            if DIVIDER_MARK.match(line):
+                state = "replace"
+            else:
+                search.append(line)
+        elif REPLACE_MARK.match(line):
+            edits.append(Edit(search, replace))
+            state = None
+        else:
+            replace.append(line)
+    return edits
+
+
+def _parse_unified(lines: List[str]) -> List[Edit]:
+    edits = []
+    current = None
+    for line in lines:
+        header = HUNK_HEADER.match(line)
+        if header:
+            old_start, old_count = int(header.group(1)), int(header.group(2) or 1)
+            # "-10,0" means "insert after line 10"; otherwise the hunk starts at line 10
+            current = Edit([], [], old_start if old_count == 0 else old_start - 1)
+            edits.append(current)
+        elif current is None:
+            continue
+        elif line.startswith(("--- ", "+++ ")) or FENCE.match(line):
+            current = None
+        elif line.startswith("-"):
+            current.search.append(line[1:])
+        elif line.startswith("+"):
+            current.replace.append(line[1:])
+        elif line.startswith(" ") or line == "":
+            current.search.append(line[1:])
+            current.replace.append(line[1:])
+        elif not line.startswith("\\"):  # "\ No newline at end of file"
+            current = None
+    for edit in edits:
+        # A blank line that ends the response is not hunk context
+        while edit.search and edit.replace and edit.search[-1] == "" and edit.replace[-1] == "":
+            edit.search.pop()
+            edit.replace.pop()
+    return edits
+
+
+def apply_edits(original: str, edits: List[Edit], fuzz: float = DEFAULT_FUZZ) -> PatchResult:
+    """Apply edits in order; conflicting edits are skipped and described in ``conflicts``."""
+    lines = original.split("\n")
+    touched: List[Tuple[int, int]] = []  # line ranges written by earlier edits
+    result = PatchResult(original)
+    offset = 0  # hunk line numbers refer to the original text; earlier hunks shift them
+    for number, edit in enumerate(edits, 1):
+        hint = None if edit.hint is None else max(0, edit.hint + offset)
+        search, replace = _trim_blank_edges(edit.search, edit.replace)
+        if not search:
+            position = len(lines) if hint is None else min(hint, len(lines))
+            if position == len(lines) and lines and lines[-1] == "":
+                position -= 1  # before the trailing newline
+            start, end, exact = position, position, True
+        else:
+            found = _locate(lines, search, hint, touched, fuzz)
+            if isinstance(found, str):
+                result.conflicts.append(f"edit {number}: {found}")
+                continue
+            start, end, exact = found
+            if not exact:
+                replace = _reindent(replace, search, lines[start:end])
+        lines[start:end] = replace
+        shift = len(replace) - (end - start)
+        if hint is not None:
+            offset += shift
+        touched = [(s + shift, e + shift) if s >= end else (s, e) for s, e in touched]
+        touched.append((start, start + len(replace)))
+        result.applied += 1
+        result.fuzzy += 0 if exact else 1
+    result.text = "\n".join(lines)
+    return result
+
+
+def _trim_blank_edges(search: List[str], replace: List[str]) -> Tuple[List[str], List[str]]:
+    """Drop blank lines that open or close both sides; they only make matching stricter."""
+    start, end = 0, 0
+    while start < min(len(search), len(replace)) and not search[start].strip() and not replace[start].strip():
+        start += 1
+    while (end < min(len(search), len(replace)) - start and not search[-1 - end].strip()
+           and not replace[-1 - end].strip()):
+        end += 1
+    return search[start:len(search) - end], replace[start:len(replace) - end]
+
+
+def _squash(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _locate(lines: List[str], search: List[str], hint: Optional[int], touched: List[Tuple[int, int]],
+            fuzz: float):
+    """``(start, end, exact)`` of the match, or a string describing the conflict."""
+    size = len(search)
+    for normalise in (None, _squash):
+        norm = normalise or (lambda line: line)
+        wanted = [norm(line) for line in search]
+        candidates = [
+            i for i in range(len(lines) - size + 1)
+            if norm(lines[i]) == wanted[0] and [norm(line) for line in lines[i:i + size]] == wanted
+        ]
+        if candidates:
+            return _choose(candidates, size, hint, touched, normalise is None)
+    return _locate_fuzzy(lines, search, hint, touched, fuzz)
+
+
+def _choose(candidates: List[int], size: int, hint: Optional[int], touched: List[Tuple[int, int]], exact: bool):
+    free = [i for i in candidates if not _overlaps(i, i + size, touched)]
+    if not free:
+        return "search text only matches lines changed by an earlier edit"
+    if len(free) > 1:
+        if hint is None:
+            return f"search text matches {len(free)} places"
+        free.sort(key=lambda i: abs(i - hint))
+        if abs(free[0] - hint) == abs(free[1] - hint):
+            return f"search text matches {len(free)} places equally far from line {hint + 1}"
+    return free[0], free[0] + size, exact
+
+
+def _overlaps(start: int, end: int, touched: List[Tuple[int, int]]) -> bool:
+    return any(start < e and s < end for s, e in touched)
+
+
+def _locate_fuzzy(lines: List[str], search: List[str], hint: Optional[int], touched: List[Tuple[int, int]],
+                  fuzz: float):
+    size = len(search)
+    target = "\n".join(_squash(line) for line in search)
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(target)
+    scored = []
+    for i in range(max(0, len(lines) - size + 1)):
+        if _overlaps(i, i + size, touched):
+            continue
+        matcher.set_seq1("\n".join(_squash(line) for line in lines[i:i + size]))
+        if matcher.real_quick_ratio() < fuzz or matcher.quick_ratio() < fuzz:
+            continue
+        ratio = matcher.ratio()
+        if ratio >= fuzz:
+            scored.append((ratio, i))
+    if not scored:
+        return "search text not found"
+    best_ratio = max(ratio for ratio, _ in scored)
+    ratio_at = {i: ratio for ratio, i in scored}
+    # Neighbouring windows of one good match score alike, so only distinct regions compete
+    regions: List[List[int]] = []
+    for i in sorted(i for ratio, i in scored if ratio >= best_ratio - 0.02):
+        if regions and i - regions[-1][-1] < size:
+            regions[-1].append(i)
+        else:
+            regions.append([i])
+    starts = [max(region, key=ratio_at.get) for region in regions]
+    return _choose(starts, size, hint, touched, False)
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _reindent(replace: List[str], search: List[str], matched: List[str]) -> List[str]:
+    """Shift the replacement by the indentation difference between the search text and the file."""
+    first_search = next((line for line in search if line.strip()), "")
+    first_match = next((line for line in matched if line.strip()), "")
+    have, want = _indent(first_search), _indent(first_match)
+    if have == want:
+        return list(replace)
+    adjust: Callable[[str], str]
+    if want.startswith(have):
+        extra = want[len(have):]
+        adjust = lambda line: extra + line if line.strip() else line
+    elif have.startswith(want):
+        drop = len(have) - len(want)
+        adjust = lambda line: line[drop:] if line[:drop].strip() == "" else line.lstrip()
+    else:
+        return list(replace)
+    return [adjust(line) for line in replace]
@@ -0,0 +1,376 @@
+"""Incremental, persistent symbol index for uploaded repositories.
+
+Python files are parsed with ``ast``; the other languages in LANGUAGE_MAP go
+through a lightweight tokenizer. Results live in SQLite and are refreshed
+per file by (mtime, size) and then content hash, so re-indexing after a
+one-file change only stats the tree and reparses that file.
+
+Every index on the same database file shares one SQLite connection. The
+process keeps at most ``SYMBOL_INDEX_MAX_ROOTS`` indexes, least recently
+used first out. Rows of roots that no longer exist are deleted when their
+index is evicted or dropped, and when a database is first opened.
+``drop_indexes`` releases the indexes under a directory that is about to be
+removed, such as a request's temporary upload directory.
+"""
+import ast
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from tools.language_detector import detect_language, LANGUAGE_MAP
+from tools.context_packer import extract_imports
+
+DEFAULT_INDEX_PATH = os.path.join(".cache", "symbol_index.sqlite")
+IGNORE_DIRS = {'.git', '__pycache__', 'node_modules', '.gemini', '.venv', 'venv', '.cache'}
+
+TOKEN = re.compile(
+    r'(?P<comment>//[^\n]*|/\*.*?\*/|#[^\n]*)'
+    r'|(?P<string>"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`)'
+    r'|(?P<ident>[A-Za-z_$][A-Za-z0-9_$]*)'
+    r'|(?P<newline>\n)'
+    r'|(?P<punct>[(){}\[\];:<>,.=])',
+    re.DOTALL,
+)
+
+# Keyword that introduces a definition -> symbol kind.
+DEFINITION_KEYWORDS = {
+    'class': 'class', 'struct': 'class', 'interface': 'class', 'trait': 'class',
+    'enum': 'class', 'record': 'class', 'object': 'class', 'protocol': 'class', 'module': 'class',
+    'function': 'function', 'func': 'function', 'fn': 'function', 'def': 'function', 'fun': 'function',
+    'type': 'type', 'typedef': 'type',
+}
+CALL_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'return', 'sizeof', 'new', 'typeof', 'super', 'this'}
+# C-family and JVM languages declare functions as "<type> name(" without a keyword.
+TYPED_DECL_LANGUAGES = {'c', 'cpp', 'java', 'csharp', 'kotlin', 'swift'}
+
+
+def parse_python(content: str) -> Tuple[List[dict], List[dict], List[str]]:
+    """Return (symbols, references, imports) for Python source."""
+    tree = ast.parse(content)
+    lines = content.splitlines()
+    symbols, references, imports = [], [], set()
+
+    def visit(node, parent):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                if isinstance(child, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if parent and parent[1] == "class" else "function"
+                qualname = f"{parent[0]}.{child.name}" if parent else child.name
+                signature = lines[child.lineno - 1].strip() if child.lineno <= len(lines) else child.name
+                symbols.append({"name": child.name, "qualname": qualname, "kind": kind,
+                                "line": child.lineno, "signature": signature})
+                visit(child, (qualname, kind))
+            elif isinstance(child, ast.Assign) and parent is None:
+                for target in child.targets:
+                    if isinstance(target, ast.Name):
+                        symbols.append({"name": target.id, "qualname": target.id, "kind": "variable",
+                                        "line": child.lineno, "signature": lines[child.lineno - 1].strip()})
+                visit(child, parent)
+            else:
+                visit(child, parent)
+
+    visit(tree, None)
+
+    seen = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+            continue
+        if isinstance(node, ast.ImportFrom):
+            if node.module:
+                imports.add(node.module)
+            continue
+
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            key = (node.id, node.lineno)
+        elif isinstance(node, ast.Attribute):
+            key = (node.attr, node.lineno)
+        else:
+            continue
+        if key not in seen:
+            seen.add(key)
+            references.append({"name": key[0], "line": key[1]})
+    return symbols, references, sorted(imports)
+
+
+def parse_generic(content: str, language: str) -> Tuple[List[dict], List[dict], List[str]]:
+    """Tokenizer-based symbols for non-Python languages: definitions by keyword, references by call sites."""
+    lines = content.splitlines()
+    symbols, references = [], []
+    line = 1
+    tokens = []  # (kind, value, line); comments, strings and '#' directives are dropped
+    for match in TOKEN.finditer(content):
+        group = match.lastgroup
+        text = match.group(0)
+        if group == "newline":
+            line += 1
+            continue
+        if group in ("comment", "string"):
+            line += text.count("\n")
+            continue
+        tokens.append((group, text, line))
+
+    seen = set()
+    for i, (group, text, lineno) in enumerate(tokens):
+        if group != "ident":
+            continue
+        previous = tokens[i - 1] if i > 0 else None
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+
+        if previous and previous[0] == "ident" and previous[1] in DEFINITION_KEYWORDS:
+            symbols.append({"name": text, "qualname": text, "kind": DEFINITION_KEYWORDS[previous[1]],
+                            "line": lineno, "signature": _line(lines, lineno)})
+        elif (following and following[1] == "(" and language in TYPED_DECL_LANGUAGES
+              and previous and previous[0] == "ident" and previous[1] not in CALL_KEYWORDS
+              and previous[1] not in ("return", "new", "else") and _is_declaration_line(_line(lines, lineno))):
+            symbols.append({"name": text, "qualname": text, "kind": "function",
+                            "line": lineno, "signature": _line(lines, lineno)})
+        elif following and following[1] == "(" and text not in CALL_KEYWORDS and text not in DEFINITION_KEYWORDS:
+            if (text, lineno) not in seen:
+                seen.add((text, lineno))
+                references.append({"name": text, "line": lineno})
+    return symbols, references, extract_imports(content)
+
+
+def _line(lines: List[str], lineno: int) -> str:
+    return lines[lineno - 1].strip() if 0 < lineno <= len(lines) else ""
+
+
+def _is_declaration_line(line: str) -> bool:
+    stripped = line.strip()
+    return not stripped.endswith(";") and "=" not in stripped.split("(")[0]
+
+
+def parse_symbols(content: str, language: str) -> Tuple[List[dict], List[dict], List[str]]:
+    if language == "python":
+        try:
+            return parse_python(content)
+        except SyntaxError:
+            pass
+    return parse_generic(content, language)
+
+
+SCHEMA = """
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS files (
+    root TEXT NOT NULL, path TEXT NOT NULL, mtime_ns INTEGER, size INTEGER,
+    hash TEXT, language TEXT, imports TEXT, PRIMARY KEY (root, path)
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    root TEXT, path TEXT, name TEXT, qualname TEXT, kind TEXT, line INTEGER, signature TEXT
+);
+CREATE TABLE IF NOT EXISTS refs (root TEXT, path TEXT, name TEXT, line INTEGER);
+CREATE INDEX IF NOT EXISTS idx_symbols_name ON symbols(root, name);
+CREATE INDEX IF NOT EXISTS idx_symbols_path ON symbols(root, path);
+CREATE INDEX IF NOT EXISTS idx_refs_name ON refs(root, name);
+CREATE INDEX IF NOT EXISTS idx_refs_path ON refs(root, path);
+"""
+
+# db path -> (connection, lock serialising its use), shared by every index on that file
+_connections: Dict[str, Tuple[sqlite3.Connection, threading.Lock]] = {}
+_connections_lock = threading.Lock()
+
+
+def _delete_root(conn: sqlite3.Connection, root: str):
+    for table in ("files", "symbols", "refs"):
+        conn.execute(f"DELETE FROM {table} WHERE root = ?", (root,))
+
+
+def _connection(db_path: str) -> Tuple[sqlite3.Connection, threading.Lock]:
+    with _connections_lock:
+        if db_path not in _connections:
+            if db_path != ":memory:":
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn.executescript(SCHEMA)
+            # Leftovers from earlier processes, e.g. request temp dirs that are gone now
+            for (root,) in conn.execute("SELECT DISTINCT root FROM files").fetchall():
+                if not os.path.exists(root):
+                    _delete_root(conn, root)
+            conn.commit()
+            _connections[db_path] = (conn, threading.Lock())
+        return _connections[db_path]
+
+
+class SymbolIndex:
+    """Persistent index of definitions, references and imports under ``root``."""
+
+    def __init__(self, root: str, db_path: str = DEFAULT_INDEX_PATH):
+        self.root = os.path.abspath(root)
+        self.db_path = db_path
+        self._conn, self._lock = _connection(db_path)
+
+    def close(self, forget: bool = False):
+        """Called when the index leaves the process cache; ``forget`` also deletes this root's rows.
+
+        The connection is shared and stays open, so a caller still holding this index can finish.
+        """
+        if forget:
+            with self._lock:
+                _delete_root(self._conn, self.root)
+                self._conn.commit()
+
+    def _walk(self):
+        if os.path.isfile(self.root):
+            yield self.root
+            return
+        for dirpath, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if d not in IGNORE_DIRS]
+            for name in files:
+                if os.path.splitext(name)[1].lower() in LANGUAGE_MAP:
+                    yield os.path.join(dirpath, name)
+
+    def update(self) -> Dict[str, float]:
+        """Bring the index in line with the tree; only changed files are read and parsed."""
+        started = time.perf_counter()
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        with self._lock:
+            known = {
+                path: (mtime_ns, size, digest)
+                for path, mtime_ns, size, digest in self._conn.execute(
+                    "SELECT path, mtime_ns, size, hash FROM files WHERE root = ?", (self.root,)
+                )
+            }
+            seen = set()
+            for path in self._walk():
+                seen.add(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                previous = known.get(path)
+                if previous and previous[0] == stat.st_mtime_ns and previous[1] == stat.st_size:
+                    stats["unchanged"] += 1
+                    continue
+
+                try:
+                    with open(path, "rb") as f:
+                        raw = f.read()
+                except OSError:
+                    continue
+                digest = hashlib.sha1(raw).hexdigest()
+                if previous and previous[2] == digest:
+                    self._conn.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE root = ? AND path = ?",
+                                       (stat.st_mtime_ns, stat.st_size, self.root, path))
+                    stats["unchanged"] += 1
+                    continue
+
+                self._index_file(path, raw.decode("utf-8", errors="replace"), stat, digest)
+                stats["updated" if previous else "added"] += 1
+
+            for path in set(known) - seen:
+                self._forget(path)
+                stats["removed"] += 1
+            self._conn.commit()
+        stats["seconds"] = round(time.perf_counter() - started, 4)
+        return stats
+
+    def _forget(self, path: str):
+        for table in ("files", "symbols", "refs"):
+            self._conn.execute(f"DELETE FROM {table} WHERE root = ? AND path = ?", (self.root, path))
+
+    def _index_file(self, path: str, content: str, stat, digest: str):
+        language = detect_language(path)
+        symbols, references, imports = parse_symbols(content, language)
+        self._forget(path)
+        self._conn.execute(
+            "INSERT INTO files (root, path, mtime_ns, size, hash, language, imports) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.root, path, stat.st_mtime_ns, stat.st_size, digest, language, "\n".join(imports)),
+        )
+        self._conn.executemany(
+            "INSERT INTO symbols (root, path, name, qualname, kind, line, signature) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(self.root, path, s["name"], s["qualname"], s["kind"], s["line"], s["signature"]) for s in symbols],
+        )
+        self._conn.executemany(
+            "INSERT INTO refs (root, path, name, line) VALUES (?, ?, ?, ?)",
+            [(self.root, path, r["name"], r["line"]) for r in references],
+        )
+
+    def _query(self, sql: str, params: tuple) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def definitions(self, name: str) -> List[dict]:
+        """Where ``name`` (plain or qualified) is defined."""
+        rows = self._query(
+            "SELECT path, qualname, kind, line, signature FROM symbols "
+            "WHERE root = ? AND (name = ? OR qualname = ?) ORDER BY path, line",
+            (self.root, name, name),
+        )
+        return [{"path": p, "qualname": q, "kind": k, "line": l, "signature": sig} for p, q, k, l, sig in rows]
+
+    def references(self, name: str) -> List[dict]:
+        """Call sites / uses of ``name``."""
+        rows = self._query(
+            "SELECT path, line FROM refs WHERE root = ? AND name = ? ORDER BY path, line",
+            (self.root, name),
+        )
+        return [{"path": p, "line": l} for p, l in rows]
+
+    def outline(self, path: str) -> List[dict]:
+        """Symbols defined in one file, in source order."""
+        rows = self._query(
+            "SELECT qualname, kind, line, signature FROM symbols WHERE root = ? AND path = ? ORDER BY line",
+            (self.root, os.path.abspath(path)),
+        )
+        return [{"qualname": q, "kind": k, "line": l, "signature": sig} for q, k, l, sig in rows]
+
+    def imports(self, path: str) -> List[str]:
+        row = self._query("SELECT imports FROM files WHERE root = ? AND path = ?", (self.root, os.path.abspath(path)))
+        return row[0][0].split("\n") if row and row[0][0] else []
+
+    def format_outline(self, path: str) -> str:
+        """Compact text outline for prompts and tools."""
+        return "\n".join(f"{item['line']}: {item['signature']}" for item in self.outline(path)
+                         if item["kind"] != "variable")
+
+
+_indexes: "OrderedDict[Tuple[str, str], SymbolIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(root: str, db_path: Optional[str] = None) -> SymbolIndex:
+    """Shared, freshly updated index for ``root`` (one instance per root and database per process)."""
+    root = os.path.abspath(root)
+    db_path = db_path or os.environ.get("SYMBOL_INDEX_PATH", DEFAULT_INDEX_PATH)
+    evicted = []
+    with _indexes_lock:
+        index = _indexes.get((root, db_path))
+        if index is None:
+            index = SymbolIndex(root, db_path)
+            _indexes[(root, db_path)] = index
+        _indexes.move_to_end((root, db_path))
+        limit = max(1, int(os.environ.get("SYMBOL_INDEX_MAX_ROOTS", "32")))
+        while len(_indexes) > limit:
+            evicted.append(_indexes.popitem(last=False)[1])
+    for old in evicted:
+        old.close(forget=not os.path.exists(old.root))
+    index.update()
+    return index
+
+
+def drop_indexes(path: str):
+    """Close the indexes of ``path`` and of every directory under it, and delete their rows."""
+    path = os.path.abspath(path)
+    with _indexes_lock:
+        dropped = [key for key in _indexes if key[0] == path or key[0].startswith(path + os.sep)]
+        indexes = [_indexes.pop(key) for key in dropped]
+    for index in indexes:
+        index.close()
+    # Also covers roots under ``path`` that were already evicted from the process cache
+    prefix = path + os.sep
+    with _connections_lock:
+        connections = list(_connections.values())
+    for conn, lock in connections:
+        with lock:
+            for table in ("files", "symbols", "refs"):
+                conn.execute(f"DELETE FROM {table} WHERE root = ? OR substr(root, 1, ?) = ?",
+                             (path, len(prefix), prefix))
+            conn.commit()
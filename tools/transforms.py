@@ -0,0 +1,353 @@
+"""Local, deterministic transforms for mechanical instructions.
+
+``classify`` maps an instruction to a list of intents, such as "remove
+unused imports and sort imports". It returns None as soon as any clause is
+not recognised, so only instructions that are fully covered skip the LLM.
+
+``apply_transforms`` then runs each intent on the code in order:
+- import cleanup and renames work on the Python AST and token stream
+- whitespace fixes work for any language
+- "reformat" needs ``black`` installed
+
+Every Python result is re-parsed before it is accepted. Any transform that
+cannot handle its input returns None, and the caller falls back to the LLM
+pipeline.
+"""
+import ast
+import io
+import keyword
+import os
+import re
+import symtable
+import sys
+import tokenize
+from collections import namedtuple
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from utils.telemetry import REGISTRY
+
+try:
+    import black
+except Exception:  # optional dependency; "reformat" falls back to the LLM without it
+    black = None
+
+LOCAL_TRANSFORMS = REGISTRY.counter("local_transforms_total", "Instructions handled locally without an LLM call.")
+
+Intent = namedtuple("Intent", ["name", "args"])
+
+FILLER = re.compile(
+    r"\b(?:please|pls|kindly|can you|could you|would you|for me|in (?:this|the) (?:file|code|module)|"
+    r"(?:of|from|to) (?:this|the) (?:file|code|module))\b",
+    re.IGNORECASE,
+)
+CLAUSE_SPLIT = re.compile(r"\s*(?:,|;|\band then\b|\bthen\b|\band\b|&)\s*")
+IDENTIFIER = r"[`'\"]?([A-Za-z_][A-Za-z0-9_]*)[`'\"]?"
+
+INTENT_PATTERNS = [
+    ("remove_unused_imports", re.compile(r"^(?:remove|delete|drop|clean ?up|strip|get rid of) (?:all |any |the )*unused imports?$")),
+    ("sort_imports", re.compile(r"^(?:sort|order|organi[sz]e|reorder) (?:all |the )*imports?$")),
+    ("reformat", re.compile(r"^(?:re)?format(?: (?:the |this )?(?:code|file|module))?$|^(?:run|apply) black$")),
+    ("strip_trailing_whitespace", re.compile(r"^(?:remove|strip|trim|delete) (?:all |the )*trailing (?:whitespace|spaces)$|^(?:normali[sz]e|fix|clean ?up) (?:the )?whitespace$")),
+    ("trailing_newline", re.compile(r"^(?:add|ensure|insert|append) (?:a |an |the )?(?:trailing|final|ending) newline(?: at (?:the )?end(?: of (?:the )?file)?)?$|^end (?:the |this )?file with a newline$")),
+    ("rename", re.compile(rf"^rename (?:the )?(?:variable|var|function|func|class|method|identifier|symbol|name|parameter|param)? ?{IDENTIFIER} (?:to|as|into|->|=>) {IDENTIFIER}$", re.IGNORECASE)),
+]
+
+# Intents that need the Python AST; other languages fall back to the LLM for them
+PYTHON_ONLY = {"remove_unused_imports", "sort_imports", "reformat", "rename"}
+
+
+@dataclass
+class TransformResult:
+    code: str
+    intents: List[Intent]
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return any(not note.startswith("No ") for note in self.notes)
+
+
+def classify(instruction: str) -> Optional[List[Intent]]:
+    """Intents for an instruction made only of recognised mechanical clauses, else None."""
+    # Identifiers keep their case; only the verbs are matched case-insensitively
+    text = FILLER.sub(" ", instruction.strip().rstrip(".!")).strip()
+    text = re.sub(r"\s+", " ", text)
+    if not text:
+        return None
+    intents = []
+    for clause in CLAUSE_SPLIT.split(text):
+        clause = clause.strip()
+        if not clause:
+            continue
+        for name, pattern in INTENT_PATTERNS:
+            match = pattern.match(clause if name == "rename" else clause.lower())
+            if match:
+                intents.append(Intent(name, match.groups()))
+                break
+        else:
+            return None
+    return intents or None
+
+
+def apply_transforms(code: str, intents: List[Intent], language: str, path: str = "") -> Optional[TransformResult]:
+    """Run every intent in order, or return None if any of them cannot be done locally."""
+    result = TransformResult(code, intents)
+    for intent in intents:
+        if intent.name in PYTHON_ONLY and language != "python":
+            return None
+        outcome = TRANSFORMS[intent.name](result.code, *intent.args, path=path)
+        if outcome is None:
+            return None
+        result.code, note = outcome
+        result.notes.append(note)
+    if language == "python" and result.code != code:
+        try:
+            ast.parse(result.code)
+        except SyntaxError:
+            return None
+    for intent in intents:
+        LOCAL_TRANSFORMS.inc(intent=intent.name)
+    return result
+
+
+def try_local_transform(code: str, instruction: str, language: str, path: str = "") -> Optional[TransformResult]:
+    intents = classify(instruction)
+    if intents is None:
+        return None
+    return apply_transforms(code, intents, language, path)
+
+
+# -- transforms: (code, *args, path) -> (new code, note) or None --------------
+
+def _module_imports(tree: ast.Module) -> List[ast.stmt]:
+    return [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def _bound_name(alias: ast.alias) -> str:
+    return alias.asname or alias.name.split(".")[0]
+
+
+def _used_names(tree: ast.Module) -> set:
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            used.add(node.id)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str) and len(node.value) < 200:
+            # __all__ entries and string annotations such as "Optional[Path]"
+            used.update(re.findall(r"[A-Za-z_][A-Za-z0-9_]*", node.value))
+    return used
+
+
+def _render_import(node: ast.stmt, aliases: List[ast.alias], indent: str = "") -> str:
+    names = ", ".join(f"{a.name} as {a.asname}" if a.asname else a.name for a in aliases)
+    if isinstance(node, ast.Import):
+        return f"{indent}import {names}"
+    return f"{indent}from {'.' * node.level}{node.module or ''} import {names}"
+
+
+def _replace_statements(code: str, replacements) -> str:
+    """replacements: [(node, text or None)]; whole statement lines are swapped or removed."""
+    lines = code.split("\n")
+    for node, text in sorted(replacements, key=lambda item: -item[0].lineno):
+        lines[node.lineno - 1:node.end_lineno] = [] if text is None else [text]
+    return "\n".join(lines)
+
+
+def _statement_has_neighbours(code: str, node: ast.stmt) -> bool:
+    """True when another statement shares the import's lines (``import os; x = 1``)."""
+    lines = code.split("\n")
+    first, last = lines[node.lineno - 1], lines[node.end_lineno - 1]
+    return bool(first[:node.col_offset].strip()) or bool(last[node.end_col_offset:].split("#")[0].strip())
+
+
+def remove_unused_imports(code: str, path: str = ""):
+    tree = ast.parse(code)
+    if path.endswith("__init__.py"):
+        return code, "No imports removed: imports in __init__.py are treated as re-exports"
+    used = _used_names(tree)
+    removed = []
+    replacements = []
+    for node in _module_imports(tree):
+        if isinstance(node, ast.ImportFrom) and (node.module == "__future__" or any(a.name == "*" for a in node.names)):
+            continue
+        keep = [alias for alias in node.names if _bound_name(alias) in used]
+        if len(keep) == len(node.names):
+            continue
+        if _statement_has_neighbours(code, node):
+            return None
+        removed.extend(_bound_name(alias) for alias in node.names if alias not in keep)
+        replacements.append((node, _render_import(node, keep) if keep else None))
+    if not removed:
+        return code, "No unused imports found"
+    return _replace_statements(code, replacements), f"Removed unused imports: {', '.join(removed)}"
+
+
+def _import_section(module: str, path: str) -> int:
+    top = module.split(".")[0]
+    if not top:
+        return 3  # relative imports last
+    if top in sys.stdlib_module_names:
+        return 1
+    # A module or package (namespace packages included) next to the file or in the working directory
+    root = os.path.dirname(path) or "."
+    for base in (root, "."):
+        if os.path.isfile(os.path.join(base, f"{top}.py")) or os.path.isdir(os.path.join(base, top)):
+            return 3
+    return 2
+
+
+def sort_imports(code: str, path: str = ""):
+    tree = ast.parse(code)
+    body = list(tree.body)
+    start = 1 if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant) else 0
+    block = []
+    for node in body[start:]:
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            break
+        block.append(node)
+    if isinstance(block[0] if block else None, ast.ImportFrom) and block[0].module == "__future__":
+        block = block[1:]
+    if len(block) < 2:
+        return code, "No imports to sort"
+    lines = code.split("\n")
+    first, last = block[0].lineno, block[-1].end_lineno
+    region = lines[first - 1:last]
+    # Comments or several statements on one line would be lost by re-rendering; leave those to the LLM
+    if any(line.strip().startswith("#") for line in region) or any(_statement_has_neighbours(code, n) for n in block):
+        return None
+    if any("#" in lines[n.end_lineno - 1][n.end_col_offset:] for n in block):
+        return None
+
+    def key(node):
+        module = node.names[0].name if isinstance(node, ast.Import) else "." * node.level + (node.module or "")
+        return (_import_section(module.lstrip("."), path) if node.__class__ is ast.Import or node.level == 0 else 3,
+                isinstance(node, ast.ImportFrom), module.lower())
+
+    ordered = sorted(block, key=key)
+    rendered, section = [], None
+    for node in ordered:
+        node_section = key(node)[0]
+        if section is not None and node_section != section:
+            rendered.append("")
+        section = node_section
+        aliases = node.names if isinstance(node, ast.Import) else sorted(node.names, key=lambda a: a.name.lower())
+        rendered.append(_render_import(node, aliases))
+    if rendered == region:
+        return code, "No changes: imports already sorted"
+    lines[first - 1:last] = rendered
+    return "\n".join(lines), "Sorted imports into standard library, third-party and local groups"
+
+
+def reformat(code: str, path: str = ""):
+    if black is None:
+        return None
+    try:
+        formatted = black.format_str(code, mode=black.Mode())
+    except Exception:
+        return None
+    return formatted, "Reformatted with black" if formatted != code else "No changes: already formatted"
+
+
+def strip_trailing_whitespace(code: str, path: str = ""):
+    stripped = "\n".join(line.rstrip() for line in code.split("\n"))
+    if stripped == code:
+        return code, "No trailing whitespace found"
+    return stripped, "Removed trailing whitespace"
+
+
+def trailing_newline(code: str, path: str = ""):
+    fixed = code.rstrip("\n") + "\n" if code.strip() else code
+    if fixed == code:
+        return code, "No changes: file already ends with a single newline"
+    return fixed, "File now ends with a single newline"
+
+
+def _rename_is_local_safe(code: str, old: str) -> bool:
+    """True when every NAME token ``old`` is one binding that a token rename can follow.
+
+    Attributes, class members, parameters and keyword arguments reach past
+    this file or need scope resolution, and so does a name bound in more
+    than one scope; those renames are left to the LLM.
+    """
+    try:
+        tree = ast.parse(code)
+        table = symtable.symtable(code, "<rename>", "exec")
+    except (SyntaxError, ValueError):
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and node.attr == old:
+            return False
+        if isinstance(node, (ast.arg, ast.keyword)) and node.arg == old:
+            return False
+        if isinstance(node, (ast.Import, ast.ImportFrom)) and any(old in alias.name.split(".") for alias in node.names):
+            return False
+    # Before Python 3.12 tokenize keeps an f-string whole, so a token rename would miss its fields
+    for node in ast.walk(tree):
+        if isinstance(node, ast.JoinedStr) and any(isinstance(inner, ast.Name) and inner.id == old
+                                                   for inner in ast.walk(node)):
+            return False
+    scopes, binding_scopes = [table], 0
+    while scopes:
+        scope = scopes.pop()
+        scopes.extend(scope.get_children())
+        try:
+            symbol = scope.lookup(old)
+        except KeyError:
+            continue
+        if scope.get_type() == "class" and (symbol.is_assigned() or symbol.is_imported() or symbol.is_namespace()):
+            return False
+        if symbol.is_local() and (symbol.is_assigned() or symbol.is_imported() or symbol.is_namespace()):
+            binding_scopes += 1
+    return binding_scopes <= 1
+
+
+def _name_count(code: str, old: str) -> int:
+    """Occurrences of ``old`` as a name in the AST: uses, bindings and definitions."""
+    count = 0
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, ast.Name):
+            count += node.id == old
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.ExceptHandler)):
+            count += node.name == old
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            count += node.names.count(old)
+        elif isinstance(node, ast.alias):
+            count += node.asname == old
+    return count
+
+
+def rename(code: str, old: str, new: str, path: str = ""):
+    if keyword.iskeyword(old) or keyword.iskeyword(new) or not new.isidentifier() or old == new:
+        return None
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(code).readline))
+    except (tokenize.TokenError, SyntaxError):
+        return None
+    names = {tok.string for tok in tokens if tok.type == tokenize.NAME}
+    if old not in names or new in names:
+        return None  # nothing to rename, or the new name would collide
+    if not _rename_is_local_safe(code, old):
+        return None
+    lines = code.split("\n")
+    count = 0
+    for tok in reversed(tokens):
+        if tok.type != tokenize.NAME or tok.string != old:
+            continue
+        row, col = tok.start
+        line = lines[row - 1]
+        lines[row - 1] = line[:col] + new + line[col + len(old):]
+        count += 1
+    if count != _name_count(code, old):
+        return None  # a token the AST does not see as this name (or the other way round)
+    return "\n".join(lines), f"Renamed {old} to {new} ({count} occurrences)"
+
+
+TRANSFORMS = {
+    "remove_unused_imports": remove_unused_imports,
+    "sort_imports": sort_imports,
+    "reformat": reformat,
+    "strip_trailing_whitespace": strip_trailing_whitespace,
+    "trailing_newline": trailing_newline,
+    "rename": rename,
+}
@@ -0,0 +1,301 @@
+"""Local validation of refactored code before it reaches the QA agent.
+
+``validate(code, language, path, original)`` runs the cheapest checks that
+can prove a refactor broken:
+- Python: ``ast.parse`` and ``compile``, resolution of imports the refactor
+  added, definitions it dropped, and undefined names when ``pyflakes`` is
+  installed
+- JSON: ``json.loads``
+- brace languages: a string- and comment-aware delimiter balance check
+
+Checks compare against the code the refactor started from. A problem the
+original already had is a warning, never an error, so the gate only rejects
+what the refactor introduced. The result converts into compact facts that
+the QA prompt takes as already verified.
+"""
+import ast
+import importlib.util
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from utils.telemetry import REGISTRY
+
+try:
+    from pyflakes import api as _pyflakes_api, messages as _pyflakes_messages
+except Exception:  # optional dependency; undefined-name checks are skipped without it
+    _pyflakes_api = None
+
+VALIDATIONS = REGISTRY.counter("pre_qa_validations_total", "Local validations of refactored code by outcome.")
+
+# "--- path ---" headers the coordinator puts around file contents
+CONTEXT_HEADER = re.compile(r"^--- .+ ---$", re.MULTILINE)
+
+# Comment syntax for the delimiter check; block comments are /* */ for all but ruby
+LINE_COMMENTS = {
+    "javascript": ("//",), "typescript": ("//",), "java": ("//",), "c": ("//",), "cpp": ("//",),
+    "go": ("//",), "rust": ("//",), "swift": ("//",), "kotlin": ("//",), "csharp": ("//",),
+    "php": ("//", "#"), "ruby": ("#",),
+}
+PAIRS = {")": "(", "]": "[", "}": "{"}
+# What each part of a checker name verified, in the words the QA prompt uses
+CHECK_NAMES = {
+    "ast": "parsing", "compile": "compilation and import resolution", "pyflakes": "undefined names",
+    "json": "JSON parsing", "delimiters": "bracket balance",
+}
+
+
+@dataclass
+class ValidationResult:
+    language: str
+    checker: str
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    stats: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    @property
+    def checks(self) -> List[str]:
+        """The checks that actually ran; empty when the language has no local checker."""
+        return [CHECK_NAMES[part] for part in self.checker.split("+") if part in CHECK_NAMES]
+
+    def to_facts(self) -> str:
+        """One compact block for the QA prompt."""
+        lines = [f"status: {'passed' if self.ok else 'failed'} ({self.checker})"]
+        if self.stats:
+            lines.append("stats: " + ", ".join(f"{key}={value}" for key, value in self.stats.items()))
+        lines.extend(f"error: {error}" for error in self.errors)
+        lines.extend(f"warning: {warning}" for warning in self.warnings)
+        return "\n".join(lines)
+
+
+def strip_context_headers(text: str) -> str:
+    """File contents without the coordinator's "--- path ---" header lines."""
+    if not CONTEXT_HEADER.search(text):
+        return text
+    return CONTEXT_HEADER.sub("", text).strip("\n") + "\n"
+
+
+def validate(code: str, language: str, path: str = "", original: Optional[str] = None) -> ValidationResult:
+    if original is not None:
+        original = strip_context_headers(original)
+    if not code or not code.strip():
+        result = ValidationResult(language, "empty", errors=["refactored code is empty"])
+    elif language == "python":
+        result = _validate_python(code, path, original)
+    elif language == "json" or path.endswith(".json"):
+        result = _validate_json(code)
+    elif language in LINE_COMMENTS:
+        result = _validate_delimiters(code, language, original)
+    else:
+        result = ValidationResult(language, "none", warnings=[f"no local checker for {language}"])
+    if original is not None and code.strip() == original.strip():
+        result.warnings.append("refactored code is identical to the original")
+    VALIDATIONS.inc(language=language, result="passed" if result.ok else "failed")
+    return result
+
+
+# -- python --------------------------------------------------------------------
+
+def _validate_python(code: str, path: str, original: Optional[str]) -> ValidationResult:
+    result = ValidationResult("python", "ast+compile")
+    try:
+        tree = ast.parse(code, filename=path or "<refactor>")
+        compile(tree, path or "<refactor>", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        result.errors.append(f"SyntaxError at line {e.lineno}: {e.msg}")
+        return result
+    except ValueError as e:  # e.g. null bytes
+        result.errors.append(f"does not compile: {e}")
+        return result
+    original_tree = _parse_or_none(original)
+
+    defs = _top_level_definitions(tree)
+    result.stats = {
+        "lines": code.count("\n") + 1,
+        "functions": sum(isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) for n in ast.walk(tree)),
+        "classes": sum(isinstance(n, ast.ClassDef) for n in ast.walk(tree)),
+    }
+
+    imports = _imports(tree)
+    unresolved = sorted(name for name in imports if not _resolves(name, path))
+    if original_tree is not None:
+        original_imports = _imports(original_tree)
+        original_unresolved = {name for name in original_imports if not _resolves(name, path)}
+        added = [name for name in unresolved if name not in original_imports]
+        # If the original's own imports do not resolve here, the environment lacks dependencies
+        # and resolution says nothing about the refactor
+        target = result.warnings if original_unresolved else result.errors
+        target.extend(f"import '{name}' cannot be resolved" for name in added)
+        result.warnings.extend(f"import '{name}' cannot be resolved (already in original)"
+                               for name in unresolved if name in original_imports)
+
+        dropped = sorted(name for name in _top_level_definitions(original_tree) - defs if not name.startswith("_"))
+        if dropped:
+            result.warnings.append(f"top-level definitions removed: {', '.join(dropped)}")
+    else:
+        result.warnings.extend(f"import '{name}' cannot be resolved" for name in unresolved)
+
+    if _pyflakes_api is not None:
+        result.checker += "+pyflakes"
+        undefined = _undefined_names(code, path) - (_undefined_names(original, path) if original_tree else set())
+        result.errors.extend(f"undefined name '{name}'" for name in sorted(undefined))
+    return result
+
+
+def _parse_or_none(code: Optional[str]) -> Optional[ast.Module]:
+    if code is None:
+        return None
+    try:
+        return ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+
+def _top_level_definitions(tree: ast.Module) -> Set[str]:
+    return {node.name for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))}
+
+
+def _imports(tree: ast.Module) -> Set[str]:
+    """Absolute module names, plus relative ones written as ".name"."""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            names.add("." * node.level + (node.module or ""))
+    return names
+
+
+def _resolves(module: str, path: str) -> bool:
+    base = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+    if module.startswith("."):
+        level = len(module) - len(module.lstrip("."))
+        for _ in range(level - 1):
+            base = os.path.dirname(base)
+        rest = module.lstrip(".")
+        if not rest:
+            return True
+        return _local_module(base, rest)
+    top = module.split(".")[0]
+    for root in (base, os.getcwd()):
+        if _local_module(root, top):
+            # A local package decides on its own submodules
+            return _local_module(root, module)
+    try:
+        # Only the top-level package is looked up; submodules would import their parents
+        return importlib.util.find_spec(module.split(".")[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _local_module(base: str, module: str) -> bool:
+    parts = module.split(".")
+    candidate = os.path.join(base, *parts)
+    return os.path.isfile(candidate + ".py") or os.path.isdir(candidate)
+
+
+def _undefined_names(code: Optional[str], path: str) -> Set[str]:
+    if code is None:
+        return set()
+
+    class Collector:
+        def __init__(self):
+            self.names = set()
+
+        def flake(self, message):
+            if isinstance(message, _pyflakes_messages.UndefinedName):
+                self.names.add(message.message_args[0])
+
+        def unexpectedError(self, *args):
+            pass
+
+        def syntaxError(self, *args):
+            pass
+
+    collector = Collector()
+    _pyflakes_api.check(code, path or "<refactor>", collector)
+    return collector.names
+
+
+# -- other languages -------------------------------------------------------------
+
+def _validate_json(code: str) -> ValidationResult:
+    result = ValidationResult("json", "json")
+    try:
+        json.loads(code)
+    except json.JSONDecodeError as e:
+        result.errors.append(f"invalid JSON at line {e.lineno}: {e.msg}")
+    return result
+
+
+def _validate_delimiters(code: str, language: str, original: Optional[str]) -> ValidationResult:
+    result = ValidationResult(language, "delimiters", stats={"lines": code.count("\n") + 1})
+    problem = _delimiter_problem(code, language)
+    if problem is None:
+        return result
+    # The scanner does not know every literal syntax (regex literals, lifetimes, heredocs);
+    # if the original trips it too, the finding is not evidence against the refactor
+    if original is not None and _delimiter_problem(original, language) is None:
+        result.errors.append(problem)
+    else:
+        result.warnings.append(problem)
+    return result
+
+
+def _delimiter_problem(code: str, language: str) -> Optional[str]:
+    """First unbalanced bracket or unterminated string/comment, or None."""
+    line_comments = LINE_COMMENTS.get(language, ("//",))
+    block_comments = language != "ruby"
+    quotes = "\"'`" if language in ("javascript", "typescript", "go") else "\"'"
+    stack = []
+    i, line, length = 0, 1, len(code)
+    while i < length:
+        char = code[i]
+        if char == "\n":
+            line += 1
+        elif any(code.startswith(marker, i) for marker in line_comments):
+            end = code.find("\n", i)
+            i = length if end == -1 else end
+            continue
+        elif block_comments and code.startswith("/*", i):
+            end = code.find("*/", i + 2)
+            if end == -1:
+                return f"unterminated block comment starting at line {line}"
+            line += code.count("\n", i, end)
+            i = end + 2
+            continue
+        elif char in quotes:
+            if char == "'" and language == "rust" and not re.match(r"'(\\.[^']*|[^'\\])'", code[i:i + 12]):
+                i += 1  # a lifetime such as 'a, not a char literal
+                continue
+            start_line = line
+            i += 1
+            while i < length and code[i] != char:
+                if code[i] == "\\":
+                    i += 1
+                elif code[i] == "\n":
+                    if char != "`":
+                        return f"unterminated string starting at line {start_line}"
+                    line += 1
+                i += 1
+            if i >= length:
+                return f"unterminated string starting at line {start_line}"
+        elif char in "([{":
+            stack.append((char, line))
+        elif char in PAIRS:
+            if not stack:
+                return f"unmatched '{char}' at line {line}"
+            opener, opened_at = stack.pop()
+            if opener != PAIRS[char]:
+                return f"'{char}' at line {line} does not close '{opener}' from line {opened_at}"
+        i += 1
+    if stack:
+        opener, opened_at = stack[-1]
+        return f"'{opener}' opened at line {opened_at} is never closed"
+    return None
@@ -0,0 +1,206 @@
+"""Admission control for the web API: a bounded number of concurrent runs, a waiting queue, fairness and load shedding.
+
+Requests run in one of two lanes:
+- "fast" is the cheap chat path.
+- "heavy" covers Crew and legacy runs on files or directories.
+
+Heavy runs may never take the last ``fast_reserved`` slots, and a freed
+slot goes to a waiting fast request first, so chat is never stuck behind
+Crew jobs. Within a lane, waiting clients are served round-robin, so one
+client with many queued requests cannot starve the others.
+
+When the queue (or one client's share of it) is full, ``acquire`` raises
+AdmissionRejected carrying a Retry-After estimate. The estimate comes from
+the queue depth and recent run times, so the API can answer 429 right away
+instead of tying up a server thread.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+from utils.telemetry import REGISTRY
+
+LANES = ("fast", "heavy")
+
+QUEUE_WAIT = REGISTRY.histogram("admission_queue_wait_seconds", "Time requests spent queued before a slot was free.")
+REJECTED = REGISTRY.counter("admission_rejected_total", "Requests refused by admission control.")
+IN_FLIGHT = REGISTRY.gauge("admission_in_flight", "Requests currently holding an execution slot.")
+QUEUE_DEPTH = REGISTRY.gauge("admission_queue_depth", "Requests waiting for an execution slot.")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be queued; ``retry_after`` is in whole seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("client", "lane", "granted", "enqueued")
+
+    def __init__(self, client: str, lane: str):
+        self.client = client
+        self.lane = lane
+        self.granted = False
+        self.enqueued = time.perf_counter()
+
+
+class Ticket:
+    """An execution slot; release it exactly once (also usable as a context manager)."""
+
+    def __init__(self, controller: "AdmissionController", lane: str):
+        self._controller = controller
+        self.lane = lane
+        self._started = time.perf_counter()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._controller._release(self.lane, time.perf_counter() - self._started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: Optional[int] = None, max_queue: Optional[int] = None,
+                 max_queued_per_client: Optional[int] = None, fast_reserved: Optional[int] = None,
+                 queue_timeout: Optional[float] = None):
+        env = os.environ
+        self.max_concurrent = max(1, max_concurrent or int(env.get("ADMISSION_MAX_CONCURRENT", "8")))
+        self.max_queue = max_queue if max_queue is not None else int(env.get("ADMISSION_MAX_QUEUE", "32"))
+        self.max_queued_per_client = max_queued_per_client or int(env.get("ADMISSION_MAX_QUEUED_PER_CLIENT", "4"))
+        reserved = fast_reserved if fast_reserved is not None else int(env.get("ADMISSION_FAST_RESERVED", "2"))
+        self.fast_reserved = min(max(0, reserved), self.max_concurrent - 1)
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(env.get("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+        self._lock = threading.Condition()
+        self._running = {lane: 0 for lane in LANES}
+        # lane -> client -> waiters, in client round-robin order
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {lane: OrderedDict() for lane in LANES}
+        self._queued_by_client: Dict[str, int] = {}
+        self._avg_run = {"fast": 2.0, "heavy": 30.0}  # seconds, EWMA seeds
+
+    # -- public API -------------------------------------------------------
+
+    def acquire(self, client: str, lane: str = "heavy", timeout: Optional[float] = None) -> Ticket:
+        """Block until a slot is free; raise AdmissionRejected if the request cannot be queued or times out."""
+        if lane not in LANES:
+            raise ValueError(f"Unknown admission lane: {lane}")
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._lock:
+            if not self._queues[lane] and self._can_run(lane):
+                self._start(lane)
+                QUEUE_WAIT.observe(0.0, lane=lane)
+                return Ticket(self, lane)
+
+            if self._queued_total() >= self.max_queue:
+                self._reject(lane, "queue_full")
+            if self._queued_by_client.get(client, 0) >= self.max_queued_per_client:
+                self._reject(lane, "client_queue_full")
+
+            waiter = _Waiter(client, lane)
+            self._enqueue(waiter)
+            deadline = time.monotonic() + timeout
+            while not waiter.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._dequeue(waiter)
+                    self._reject(lane, "queue_timeout")
+                self._lock.wait(remaining)
+
+        QUEUE_WAIT.observe(time.perf_counter() - waiter.enqueued, lane=lane)
+        return Ticket(self, lane)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "running": dict(self._running),
+                "queued": {lane: sum(len(q) for q in self._queues[lane].values()) for lane in LANES},
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "avg_run_seconds": {lane: round(value, 3) for lane, value in self._avg_run.items()},
+            }
+
+    # -- internals (callers hold self._lock) -------------------------------
+
+    def _queued_total(self) -> int:
+        return sum(self._queued_by_client.values())
+
+    def _can_run(self, lane: str) -> bool:
+        total = self._running["fast"] + self._running["heavy"]
+        if lane == "fast":
+            return total < self.max_concurrent
+        return total < self.max_concurrent and self._running["heavy"] < self.max_concurrent - self.fast_reserved
+
+    def _start(self, lane: str):
+        self._running[lane] += 1
+        IN_FLIGHT.set(self._running[lane], lane=lane)
+
+    def _enqueue(self, waiter: _Waiter):
+        self._queues[waiter.lane].setdefault(waiter.client, deque()).append(waiter)
+        self._queued_by_client[waiter.client] = self._queued_by_client.get(waiter.client, 0) + 1
+        QUEUE_DEPTH.inc(lane=waiter.lane)
+
+    def _dequeue(self, waiter: _Waiter):
+        queue = self._queues[waiter.lane].get(waiter.client)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.lane][waiter.client]
+        self._forget(waiter)
+
+    def _forget(self, waiter: _Waiter):
+        count = self._queued_by_client.get(waiter.client, 0) - 1
+        if count > 0:
+            self._queued_by_client[waiter.client] = count
+        else:
+            self._queued_by_client.pop(waiter.client, None)
+        QUEUE_DEPTH.dec(lane=waiter.lane)
+
+    def _reject(self, lane: str, reason: str):
+        REJECTED.inc(lane=lane, reason=reason)
+        raise AdmissionRejected(reason, self._retry_after(lane))
+
+    def _retry_after(self, lane: str) -> int:
+        queued = sum(len(q) for q in self._queues[lane].values())
+        slots = self.max_concurrent if lane == "fast" else max(1, self.max_concurrent - self.fast_reserved)
+        estimate = self._avg_run[lane] * (queued + 1) / slots
+        return int(min(max(math.ceil(estimate), 1), 120))
+
+    def _release(self, lane: str, duration: float):
+        with self._lock:
+            self._running[lane] -= 1
+            IN_FLIGHT.set(self._running[lane], lane=lane)
+            self._avg_run[lane] = 0.8 * self._avg_run[lane] + 0.2 * duration
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grant freed slots: fast lane first, clients round-robin within a lane."""
+        granted = False
+        for lane in LANES:
+            clients = self._queues[lane]
+            while clients and self._can_run(lane):
+                client, queue = next(iter(clients.items()))
+                waiter = queue.popleft()
+                del clients[client]
+                if queue:
+                    clients[client] = queue  # back of the rotation
+                self._forget(waiter)
+                waiter.granted = True
+                self._start(lane)
+                granted = True
+        if granted:
+            self._lock.notify_all()
@@ -0,0 +1,91 @@
+"""Bridge between the synchronous Flask/WSGI world and a shared asyncio event loop."""
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+from typing import Optional
+
+# Seconds between cancellation checks while iterate_sync waits for the next item
+CANCEL_POLL = 0.2
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop():
+    """Return the process-wide background event loop, starting it on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="asyncio-loop", daemon=True)
+            thread.start()
+        return _loop
+
+
+def submit(coro, context=None):
+    """Schedule a coroutine on the shared loop; return a concurrent.futures.Future.
+
+    Unlike asyncio.run_coroutine_threadsafe, the task starts from ``context``
+    (default: the caller's), so contextvars such as the active trace carry over
+    from the calling thread instead of coming from the loop thread.
+    """
+    loop = get_event_loop()
+    context = context if context is not None else contextvars.copy_context()
+    result = concurrent.futures.Future()
+
+    def start():
+        if result.cancelled():
+            coro.close()
+            return
+        task = loop.create_task(coro)
+        # Cancelling the returned future cancels the task, e.g. to abort an awaited LLM call
+        result.add_done_callback(lambda future: future.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+        def done(task):
+            if result.done():
+                return
+            if task.cancelled():
+                result.cancel()
+            elif task.exception() is not None:
+                result.set_exception(task.exception())
+            else:
+                result.set_result(task.result())
+
+        task.add_done_callback(done)
+
+    loop.call_soon_threadsafe(start, context=context)
+    return result
+
+
+def run_sync(coro):
+    """Run a coroutine on the shared loop and block until it finishes."""
+    return submit(coro).result()
+
+
+def iterate_sync(agen, cancel: Optional[threading.Event] = None):
+    """Consume an async generator from synchronous code, one item at a time.
+
+    All awaiting happens on the shared loop, so many concurrent requests share
+    one event loop for their LLM I/O instead of each driving its own. Setting
+    ``cancel`` ends the iteration promptly: the pending step is cancelled,
+    which aborts whatever it is awaiting, and the generator is closed.
+    """
+    context = contextvars.copy_context()
+    try:
+        while True:
+            future = submit(agen.__anext__(), context)
+            while cancel is not None and not cancel.is_set() and not future.done():
+                concurrent.futures.wait([future], timeout=CANCEL_POLL)
+            if cancel is not None and cancel.is_set():
+                future.cancel()
+            try:
+                yield future.result()
+            except StopAsyncIteration:
+                break
+            except concurrent.futures.CancelledError:
+                if cancel is not None and cancel.is_set():
+                    break
+                raise
+    finally:
+        submit(agen.aclose(), context).result()
@@ -0,0 +1,172 @@
+"""Batch execution of a JSONL manifest against one shared Coordinator.
+
+Each manifest line is an object with ``path`` and ``instruction``, plus
+optional ``id`` and ``history`` fields. Entries run concurrently, and one
+JSONL result line is appended per entry as soon as it finishes. The line
+is flushed and fsynced, so after a crash the results file says exactly
+which entries are done. Re-running with the same results file skips those
+entries.
+
+An entry logs a ``started`` line before it runs and a ``written`` line,
+holding a hash of the file, right after each write-back to its file. On
+resume, an entry whose last line is ``written`` and whose file still has
+that hash is not run again: the crash came between the write-back and the
+result line, and running it again would refactor the refactored file. Every
+other unfinished entry runs again (including failed ones and files edited
+since), and its finished LLM calls are answered from the response cache.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from tools.file_ops import on_write
+from utils.singleflight import request_fingerprint
+from utils.telemetry import trace_request
+
+
+def entry_id(entry: Dict[str, Any]) -> str:
+    """The entry's own ``id``, else a stable hash of what it asks for."""
+    if entry.get("id") is not None:
+        return str(entry["id"])
+    return request_fingerprint(entry["path"], entry["instruction"], entry.get("history") or [])[:16]
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{number}: invalid JSON ({e.msg})")
+            if not isinstance(entry, dict) or not entry.get("path") or not entry.get("instruction"):
+                raise ValueError(f"{path}:{number}: each entry needs 'path' and 'instruction'")
+            entry["id"] = entry_id(entry)
+            # Relative paths are relative to the manifest, not to wherever the job was launched from
+            entry["path"] = os.path.join(os.path.dirname(os.path.abspath(path)), entry["path"])
+            if entry["id"] in seen:
+                raise ValueError(f"{path}:{number}: duplicate entry id {entry['id']!r}")
+            seen.add(entry["id"])
+            entries.append(entry)
+    return entries
+
+
+def file_digest(path: str) -> Optional[str]:
+    """SHA-256 of a file's bytes; None for directories and missing files."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _read_results(results_path: str) -> List[Dict[str, Any]]:
+    """Every parseable line. A line torn by a crash is ignored."""
+    if not os.path.exists(results_path):
+        return []
+    lines = []
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                lines.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return lines
+
+
+def completed_ids(results_path: str) -> Set[str]:
+    """Ids with an ``ok`` result."""
+    return {result.get("id") for result in _read_results(results_path) if result.get("status") == "ok"}
+
+
+def written_digests(results_path: str) -> Dict[str, str]:
+    """File hash after the last write-back, by id, for entries whose last line is ``written``."""
+    last = {}
+    for line in _read_results(results_path):
+        if line.get("id") is not None:
+            last[line["id"]] = line
+    return {entry_id: line["digest"] for entry_id, line in last.items()
+            if line.get("status") == "written" and line.get("digest")}
+
+
+class BatchRunner:
+    def __init__(self, coordinator, results_path: str, concurrency: int = 4,
+                 on_result: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.coordinator = coordinator
+        self.results_path = results_path
+        self.concurrency = max(1, concurrency)
+        self.on_result = on_result
+        self._out = None
+        self._lock = threading.Lock()
+
+    def run(self, entries: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Run every entry without an ``ok`` result yet; return counts by outcome."""
+        done = completed_ids(self.results_path)
+        written = written_digests(self.results_path)
+        pending = [entry for entry in entries if entry["id"] not in done]
+        summary = {"skipped": len(entries) - len(pending), "ok": 0, "error": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(self.results_path)), exist_ok=True)
+        with open(self.results_path, "a", encoding="utf-8") as self._out:
+            to_run = []
+            for entry in pending:
+                if entry["id"] in written and written[entry["id"]] == file_digest(entry["path"]):
+                    # Interrupted after its write-back: running it again would refactor the refactored file
+                    self._write(self._finished_before(entry))
+                    summary["skipped"] += 1
+                else:
+                    to_run.append(entry)
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as pool:
+                # Written in completion order, so a slow entry never holds back finished ones
+                for future in as_completed([pool.submit(self._run_entry, entry) for entry in to_run]):
+                    result = future.result()
+                    summary[result["status"]] += 1
+                    self._write(result)
+        self._out = None
+        return summary
+
+    def _finished_before(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": entry["id"], "path": entry["path"], "instruction": entry["instruction"], "status": "ok",
+                "report": "Not run again: the file was already rewritten before the previous run was interrupted.",
+                "resumed": True, "started": time.time(), "duration_s": 0.0, "tokens": {}, "llm_calls": 0}
+
+    def _run_entry(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.time()
+        self._write({"id": entry["id"], "status": "started"}, notify=False)
+        result = {"id": entry["id"], "path": entry["path"], "instruction": entry["instruction"]}
+
+        def written(path, content):
+            if os.path.abspath(path) == os.path.abspath(entry["path"]):
+                self._write({"id": entry["id"], "status": "written", "digest": file_digest(path)}, notify=False)
+
+        with trace_request("batch", id=entry["id"], path=entry["path"]) as trace, on_write(written):
+            try:
+                if not os.path.exists(entry["path"]):
+                    raise FileNotFoundError(f"Path {entry['path']} does not exist.")
+                report = self.coordinator.execute_request(entry["path"], entry["instruction"],
+                                                          history=entry.get("history"))
+                result.update(status="ok", report=report)
+            except Exception as e:
+                result.update(status="error", error=f"{type(e).__name__}: {e}")
+        result.update(
+            started=started,
+            duration_s=round(time.time() - started, 3),
+            tokens=dict(trace.tokens),
+            llm_calls=sum(1 for s in trace.spans if s.kind.startswith("llm.")),
+            trace_id=trace.trace_id,
+        )
+        return result
+
+    def _write(self, result: Dict[str, Any], notify: bool = True):
+        with self._lock:
+            self._out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            self._out.flush()
+            os.fsync(self._out.fileno())
+        if notify and self.on_result:
+            self.on_result(result)
@@ -0,0 +1,193 @@
+"""Content-addressed, on-disk response cache for LLM calls."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "llm_responses.sqlite")
+
+
+def request_key(messages: List[Dict[str, str]], model: str, **params) -> str:
+    """Canonical hash of a chat request (messages, model and sampling params)."""
+    payload = {"model": model, "messages": messages, "params": params}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response store with an in-memory LRU in front of it.
+
+    Entries are lists of text chunks so that streamed responses can be
+    replayed chunk by chunk. The disk store is bounded by ``max_bytes``
+    (least recently used entries are evicted first) and entries older than
+    ``ttl`` seconds are treated as misses and removed.
+
+    Memory hits do not write to SQLite one by one. Their access times are
+    collected and written in one batch every ``touch_batch`` hits, when a
+    touched entry leaves the memory LRU, and before the disk store evicts,
+    so disk eviction still sees recently used entries as recent.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = 256 * 1024 * 1024,
+                 ttl: Optional[float] = 7 * 24 * 3600, memory_entries: int = 256,
+                 touch_batch: int = 64):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.touch_batch = touch_batch
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._touched: Dict[str, float] = {}  # memory hits whose ``accessed`` is not written yet
+        self._touch_hits = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "bytes_served": 0,
+            "bytes_stored": 0,
+        }
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                chunks TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+        self._conn.commit()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return the cached chunk list for ``key`` or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                chunks, size, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    self.stats["bytes_served"] += size
+                    self._touched[key] = now
+                    self._touch_hits += 1
+                    if self._touch_hits >= self.touch_batch:
+                        self._flush_touches()
+                        self._conn.commit()
+                    return chunks
+                del self._memory[key]
+                self._touched.pop(key, None)
+
+            row = self._conn.execute(
+                "SELECT chunks, size, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            raw, size, created = row
+            if self._expired(created, now):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats["evictions"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            chunks = json.loads(raw)
+            self._remember(key, chunks, size, created)
+            self._conn.commit()
+            self.stats["hits"] += 1
+            self.stats["bytes_served"] += size
+            return chunks
+
+    def put(self, key: str, chunks: List[str]):
+        """Store a chunk list under ``key`` and enforce the size bound."""
+        raw = json.dumps(chunks, ensure_ascii=False)
+        size = len(raw.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, chunks, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, raw, size, now, now),
+            )
+            self._remember(key, list(chunks), size, now)
+            self.stats["stores"] += 1
+            self.stats["bytes_stored"] += size
+            self._evict(now)
+            self._conn.commit()
+
+    def _remember(self, key: str, chunks: List[str], size: int, created: float):
+        self._memory[key] = (chunks, size, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            evicted, _ = self._memory.popitem(last=False)
+            if evicted in self._touched:
+                self._flush_touches()
+
+    def _flush_touches(self):
+        """Write pending memory-hit access times; the caller commits."""
+        if self._touched:
+            self._conn.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+        self._touch_hits = 0
+
+    def _evict(self, now: float):
+        if self.ttl is not None:
+            cur = self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self.stats["evictions"] += max(cur.rowcount, 0)
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        self._flush_touches()
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            self._touched.pop(key, None)
+            total -= size
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._memory.clear()
+            self._touched.clear()
+            self._touch_hits = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus current store size, suitable for JSON export."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["entries"] = entries
+        stats["size_bytes"] = size
+        return stats
@@ -0,0 +1,44 @@
+"""CrewAI LLM that runs on this project's BaseLLM client stack.
+
+CrewAI uses an agent's ``llm`` as-is only when it is a ``crewai.BaseLLM``;
+any other object is rebuilt as a LiteLLM model from its model name. CrewLLM
+is such a subclass, so the crew's calls go through the same cached, traced,
+resilient (and, with LLM_ROUTES, routed) client as the native agents.
+"""
+from typing import Any, Dict, List, Union
+
+from crewai import BaseLLM as CrewBaseLLM
+
+from utils.llm import BaseLLM
+
+
+def to_chat_messages(messages: Union[str, List[Dict[str, Any]]]) -> List[Dict[str, str]]:
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    chat = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            # Multimodal parts; only their text is forwarded
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        chat.append({"role": message.get("role", "user"), "content": str(content)})
+    return chat
+
+
+class CrewLLM(CrewBaseLLM):
+    """Answers CrewAI agents with a BaseLLM (OpenAI, fake, replay...) and its wrappers."""
+
+    llm_type: str = "project"
+    client: Any = None
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None,
+             from_agent=None, response_model=None) -> str:
+        # Tools are used through CrewAI's text (ReAct) format, so the stop words end each step
+        return self._apply_stop_words(self.client.get_completion(to_chat_messages(messages)))
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+
+def create_crew_llm(client: BaseLLM) -> CrewLLM:
+    return CrewLLM(model=str(getattr(client, "model", "") or "project"), client=client)
@@ -0,0 +1,318 @@
+"""Offline LLM providers for load testing: a deterministic fake and a cassette replayer.
+
+Select them with ``LLM_PROVIDER=fake`` or ``LLM_PROVIDER=replay``. Set
+``LLM_RECORD_PATH`` while using a real provider to record a cassette that
+the replay provider can serve later.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from utils.cache import request_key
+from utils.llm import BaseLLM, AsyncBaseLLM
+from utils.llm_errors import LLMRequestError, LLMServerError
+
+TOKEN_PATTERN = re.compile(r'\s*\S+\s*|\s+')
+ORIGINAL_CODE = re.compile(r'Original Code:\n\n(.*?)\n\nInstruction:', re.DOTALL)
+LANGUAGE_LINE = re.compile(r'^Language: (\w+)', re.MULTILINE)
+AGENT_NAME = re.compile(r'You are the ([\w ]+?) Agent')
+PLACEHOLDER = re.compile(r'\{(agent|language|code|code_head|user|user_head|hash)\}')
+
+DEFAULT_PLAN = json.dumps([
+    {"agent": "Analysis", "description": "Analyze code structure", "priority": 1},
+    {"agent": "Refactor", "description": "Improve naming and reduce complexity", "priority": 2},
+    {"agent": "QA", "description": "Validate refactored code", "priority": 3},
+    {"agent": "TestGen", "description": "Generate unit tests", "priority": 4},
+    {"agent": "Doc", "description": "Generate docstrings", "priority": 4},
+    {"agent": "Reporting", "description": "Summarize changes", "priority": 5},
+])
+
+# Built-in responses, matched against the system prompt in order.
+DEFAULT_TEMPLATES = [
+    {"match": r"You are the Planner Agent", "response": DEFAULT_PLAN},
+    {"match": r"SEARCH/REPLACE block", "response": "Keep the first line.\n<<<<<<< SEARCH\n{code_head}\n=======\n{code_head}\n>>>>>>> REPLACE\n"},
+    {"match": r"You are the Refactor Agent", "response": "Refactored code:\n```{language}\n{code}\n```\n"},
+    {"match": r"You are the Test Generation Agent", "response": "```{language}\ndef test_placeholder():\n    assert True\n```\n"},
+    {"match": r"QA Agent", "response": "1. VERDICT: PASS\n2. Functionality Preservation: unchanged ({hash})\n"},
+    {"match": r".*", "response": "[fake {agent}] {user_head} ({hash})"},
+]
+
+
+def _template_fields(messages: List[Dict[str, str]]) -> Dict[str, str]:
+    system = messages[0]["content"] if messages and messages[0].get("role") == "system" else ""
+    user = messages[-1]["content"] if messages else ""
+    code_match = ORIGINAL_CODE.search(user)
+    language_match = LANGUAGE_LINE.search(system)
+    agent_match = AGENT_NAME.search(system)
+    digest = hashlib.sha1(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    code = code_match.group(1).rstrip("\n") if code_match else ""
+    return {
+        "system": system,
+        "user": user,
+        "user_head": user[:200],
+        "code": code,
+        "code_head": next((line for line in code.split("\n") if line.strip()), ""),
+        "language": language_match.group(1) if language_match else "",
+        "agent": agent_match.group(1) if agent_match else "assistant",
+        "hash": digest,
+    }
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into word-sized stream chunks that join back to the original."""
+    return TOKEN_PATTERN.findall(text) or ([text] if text else [])
+
+
+class FakeResponder:
+    """Deterministic response generation plus latency and error-injection settings."""
+
+    def __init__(self, ttft: Optional[float] = None, tokens_per_sec: Optional[float] = None,
+                 templates: Optional[List[Dict[str, str]]] = None, error_rate: Optional[float] = None,
+                 seed: Optional[int] = None):
+        env = os.environ
+        self.ttft = float(env.get("FAKE_LLM_TTFT", "0.2")) if ttft is None else ttft
+        self.tokens_per_sec = float(env.get("FAKE_LLM_TPS", "200")) if tokens_per_sec is None else tokens_per_sec
+        self.error_rate = float(env.get("FAKE_LLM_ERROR_RATE", "0")) if error_rate is None else error_rate
+        if templates is None and env.get("FAKE_LLM_TEMPLATES"):
+            with open(env["FAKE_LLM_TEMPLATES"], "r", encoding="utf-8") as f:
+                templates = json.load(f)
+        self.templates = [(re.compile(t["match"], re.DOTALL), t["response"]) for t in (templates or []) + DEFAULT_TEMPLATES]
+        self._random = random.Random(int(env.get("FAKE_LLM_SEED", "0")) if seed is None else seed)
+        self._lock = threading.Lock()
+
+    def respond(self, messages: List[Dict[str, str]]) -> str:
+        fields = _template_fields(messages)
+        for pattern, response in self.templates:
+            if pattern.search(fields["system"]) or pattern.search(fields["user"]):
+                # Only known placeholders are substituted, so JSON braces in templates stay literal.
+                return PLACEHOLDER.sub(lambda m: fields[m.group(1)], response)
+        return ""
+
+    def should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+
+class FakeLLM(BaseLLM):
+    """Local stand-in LLM with configurable time-to-first-token, throughput and failures."""
+
+    def __init__(self, model: str = "fake", **kwargs):
+        self.model = model
+        self.responder = FakeResponder(**kwargs)
+
+    def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        response = self.responder.respond(messages)
+        time.sleep(self.responder.ttft + len(tokenize(response)) * self.responder.token_delay())
+        if self.responder.should_fail():
+            raise LLMServerError("injected fake LLM failure", self.model)
+        return response
+
+    def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs):
+        response = self.responder.respond(messages)
+        time.sleep(self.responder.ttft)
+        if self.responder.should_fail():
+            raise LLMServerError("injected fake LLM failure", self.model)
+        delay = self.responder.token_delay()
+        for token in tokenize(response):
+            if delay:
+                time.sleep(delay)
+            yield token
+
+
+class AsyncFakeLLM(AsyncBaseLLM):
+    """Async counterpart of FakeLLM; waits with asyncio.sleep so thousands can share one loop."""
+
+    def __init__(self, model: str = "fake", **kwargs):
+        self.model = model
+        self.responder = FakeResponder(**kwargs)
+
+    async def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        response = self.responder.respond(messages)
+        await asyncio.sleep(self.responder.ttft + len(tokenize(response)) * self.responder.token_delay())
+        if self.responder.should_fail():
+            raise LLMServerError("injected fake LLM failure", self.model)
+        return response
+
+    async def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        response = self.responder.respond(messages)
+        await asyncio.sleep(self.responder.ttft)
+        if self.responder.should_fail():
+            raise LLMServerError("injected fake LLM failure", self.model)
+        delay = self.responder.token_delay()
+        for token in tokenize(response):
+            if delay:
+                await asyncio.sleep(delay)
+            yield token
+
+
+def cassette_key(messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> str:
+    """Model-independent request key so a cassette recorded on one model replays on any."""
+    return request_key(messages, "*", temperature=kwargs.get("temperature", 0.2),
+                       max_tokens=kwargs.get("max_tokens", 4000))
+
+
+class CassetteStore:
+    """Append-only JSONL file of recorded interactions: key, messages, chunks and timings."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    def record(self, key: str, messages: List[Dict[str, str]], chunks: List[str], ttft: float, duration: float):
+        entry = {"key": key, "messages": messages, "chunks": chunks,
+                 "ttft": round(ttft, 4), "duration": round(duration, 4)}
+        with self._lock:
+            self._entries[key] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ReplayLLM(BaseLLM):
+    """Serves responses from a cassette; with ``realtime`` the recorded timings are reproduced."""
+
+    def __init__(self, path: Optional[str] = None, realtime: Optional[bool] = None, model: str = "replay"):
+        path = path or os.environ.get("LLM_CASSETTE_PATH", os.path.join(".cache", "cassette.jsonl"))
+        self.store = CassetteStore(path)
+        if realtime is None:
+            realtime = os.environ.get("LLM_REPLAY_REALTIME", "0").lower() in ("1", "true", "yes", "on")
+        self.realtime = realtime
+        self.model = model
+
+    def _lookup(self, messages, kwargs):
+        return self.store.get(cassette_key(messages, kwargs))
+
+    def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        entry = self._lookup(messages, kwargs)
+        if entry is None:
+            raise LLMRequestError("no cassette entry for this request", self.model)
+        if self.realtime:
+            time.sleep(entry["duration"])
+        return "".join(entry["chunks"])
+
+    def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs):
+        entry = self._lookup(messages, kwargs)
+        if entry is None:
+            raise LLMRequestError("no cassette entry for this request", self.model)
+        chunks = entry["chunks"]
+        if self.realtime:
+            time.sleep(entry["ttft"])
+        gap = max(entry["duration"] - entry["ttft"], 0) / max(len(chunks), 1) if self.realtime else 0
+        for chunk in chunks:
+            if gap:
+                time.sleep(gap)
+            yield chunk
+
+
+class AsyncReplayLLM(AsyncBaseLLM):
+    def __init__(self, path: Optional[str] = None, realtime: Optional[bool] = None, model: str = "replay"):
+        self.replay = ReplayLLM(path, realtime, model)
+        self.model = model
+
+    async def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        entry = self.replay._lookup(messages, kwargs)
+        if entry is None:
+            raise LLMRequestError("no cassette entry for this request", self.model)
+        if self.replay.realtime:
+            await asyncio.sleep(entry["duration"])
+        return "".join(entry["chunks"])
+
+    async def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        entry = self.replay._lookup(messages, kwargs)
+        if entry is None:
+            raise LLMRequestError("no cassette entry for this request", self.model)
+        chunks = entry["chunks"]
+        if self.replay.realtime:
+            await asyncio.sleep(entry["ttft"])
+        gap = max(entry["duration"] - entry["ttft"], 0) / max(len(chunks), 1) if self.replay.realtime else 0
+        for chunk in chunks:
+            if gap:
+                await asyncio.sleep(gap)
+            yield chunk
+
+
+class RecordingLLM(BaseLLM):
+    """Passes calls through to a real provider and appends each successful exchange to a cassette."""
+
+    def __init__(self, llm: BaseLLM, path: str):
+        self.llm = llm
+        self.store = CassetteStore(path)
+        self.model = getattr(llm, "model", llm.__class__.__name__)
+
+    def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        started = time.perf_counter()
+        result = self.llm.get_completion(messages, **kwargs)
+        duration = time.perf_counter() - started
+        if result:
+            self.store.record(cassette_key(messages, kwargs), messages, [result], duration, duration)
+        return result
+
+    def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs):
+        started = time.perf_counter()
+        ttft = None
+        chunks = []
+        for chunk in self.llm.get_streaming_completion(messages, **kwargs):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            self.store.record(cassette_key(messages, kwargs), messages, chunks, ttft or 0.0,
+                              time.perf_counter() - started)
+
+    def warm_up(self):
+        self.llm.warm_up()
+
+
+class AsyncRecordingLLM(AsyncBaseLLM):
+    """Async counterpart of RecordingLLM."""
+
+    def __init__(self, llm: AsyncBaseLLM, path: str):
+        self.llm = llm
+        self.store = CassetteStore(path)
+        self.model = getattr(llm, "model", llm.__class__.__name__)
+
+    async def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        started = time.perf_counter()
+        result = await self.llm.get_completion(messages, **kwargs)
+        duration = time.perf_counter() - started
+        if result:
+            self.store.record(cassette_key(messages, kwargs), messages, [result], duration, duration)
+        return result
+
+    async def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        ttft = None
+        chunks = []
+        async for chunk in self.llm.get_streaming_completion(messages, **kwargs):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            self.store.record(cassette_key(messages, kwargs), messages, chunks, ttft or 0.0,
+                              time.perf_counter() - started)
@@ -0,0 +1,143 @@
+"""Rolling compaction of client-supplied conversation history.
+
+Recent turns are kept verbatim within a token budget. Everything older is
+folded into one running summary that is sent as a single system message.
+Summaries are cached under a hash of the history prefix they cover. Every
+message older than the verbatim turns is summarised. The fold boundary
+moves in steps of ``fold_step`` messages where it can, and each new summary
+extends the cached summary of the longest shorter prefix. A conversation
+therefore pays for small summarisation calls instead of re-summarising its
+whole history. Histories shorter than ``fold_step`` messages are only packed.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from tools.context_packer import estimate_tokens, get_budget, pack_history
+from utils.llm_errors import LLMError
+from utils.singleflight import SingleFlight
+from utils.telemetry import REGISTRY, span
+
+SUMMARIES = REGISTRY.counter("history_summaries_total", "History summaries by outcome (hit, computed, failed).")
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and a coding assistant.
+Merge the previous summary (if any) with the new messages into one updated summary.
+Keep requirements, decisions, file names, code identifiers, constraints and open questions.
+Drop greetings and chit-chat. Reply with the summary only, in at most {words} words."""
+
+
+def prefix_hashes(history: List[Dict[str, str]], count: int) -> List[str]:
+    """``hashes[i]`` identifies ``history[:i]``; each hash chains the previous one."""
+    hashes = [hashlib.sha256(b"history").hexdigest()]
+    for message in history[:count]:
+        payload = json.dumps([message.get("role", "user"), message.get("content", "")], ensure_ascii=False)
+        hashes.append(hashlib.sha256((hashes[-1] + payload).encode("utf-8")).hexdigest())
+    return hashes
+
+
+class HistoryCompactor:
+    def __init__(self, client, cache=None, budget: Optional[int] = None, summary_tokens: Optional[int] = None,
+                 fold_step: Optional[int] = None):
+        self.client = client
+        self.cache = cache
+        self.budget = budget or get_budget("history")
+        summary_tokens = summary_tokens or int(os.environ.get("HISTORY_SUMMARY_TOKENS", "400"))
+        # The summary may take at most a third of the budget; the rest is for recent turns
+        self.summary_tokens = max(1, min(summary_tokens, self.budget // 3))
+        self.fold_step = max(1, fold_step or int(os.environ.get("HISTORY_FOLD_STEP", "6")))
+        self._flight = SingleFlight("history")
+
+    def compact(self, history: Optional[List[Dict[str, str]]]) -> Optional[List[Dict[str, str]]]:
+        """History that fits the budget: a summary message (when needed) plus the newest turns verbatim."""
+        if not history:
+            return history
+        if sum(estimate_tokens(m.get("content", "")) for m in history) <= self.budget:
+            return history
+        if len(history) < max(2, self.fold_step):
+            # Too short for the fold to settle; summarising now would mean a new call every turn
+            return pack_history(history, self.budget)
+        fold = self._fold_point(history)
+        summary = self._summary(history, fold)
+        if summary is None:
+            # Summarisation failed: fall back to keeping only what fits
+            return pack_history(history, self.budget)
+        recent = pack_history(history[fold:], self.budget - estimate_tokens(summary))
+        return [{"role": "system", "content": SUMMARY_PREFIX + summary}] + recent
+
+    async def acompact(self, history: Optional[List[Dict[str, str]]]) -> Optional[List[Dict[str, str]]]:
+        if not history or sum(estimate_tokens(m.get("content", "")) for m in history) <= self.budget:
+            return history
+        return await asyncio.to_thread(self.compact, history)
+
+    def _fold_point(self, history: List[Dict[str, str]]) -> int:
+        """Number of leading messages to summarise: everything older than the turns kept verbatim.
+
+        The boundary is rounded up to a multiple of ``fold_step`` so it, and its cached summary,
+        stays put for a few turns. When rounding up would fold the newest message, the boundary is
+        the oldest message that still fits verbatim, so nothing between the two is dropped.
+        """
+        remaining = self.budget - self.summary_tokens
+        start = len(history)
+        while start > 0:
+            cost = estimate_tokens(history[start - 1].get("content", ""))
+            if cost > remaining:
+                break
+            remaining -= cost
+            start -= 1
+        start = max(start, 1)
+        fold = -(-start // self.fold_step) * self.fold_step
+        if fold < len(history):
+            return fold
+        return min(start, len(history) - 1)
+
+    def _summary(self, history: List[Dict[str, str]], fold: int) -> Optional[str]:
+        hashes = prefix_hashes(history, fold)
+        cached = self._get(hashes[fold])
+        if cached is not None:
+            SUMMARIES.inc(result="hit")
+            return cached
+        summary, _ = self._flight.do(hashes[fold], lambda: self._extend(history, fold, hashes))
+        return summary
+
+    def _extend(self, history: List[Dict[str, str]], fold: int, hashes: List[str]) -> Optional[str]:
+        # Start from the longest shorter prefix that already has a summary
+        base, previous = 0, None
+        for boundary in range(fold - 1, 0, -1):
+            previous = self._get(hashes[boundary])
+            if previous is not None:
+                base = boundary
+                break
+        new_messages = pack_history(history[base:fold], get_budget("history_summary_input"))
+        transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in new_messages)
+        user_prompt = f"PREVIOUS SUMMARY:\n{previous or '(none)'}\n\nNEW MESSAGES:\n{transcript}"
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT.format(words=int(self.summary_tokens * 0.75))},
+            {"role": "user", "content": user_prompt},
+        ]
+        try:
+            with span("history.summarize", messages=fold - base):
+                summary = self.client.get_completion(messages, max_tokens=self.summary_tokens, temperature=0.0)
+        except LLMError as e:
+            print(f"[!] History summary failed: {e}")
+            summary = None
+        if not summary:
+            SUMMARIES.inc(result="failed")
+            return None
+        summary = summary.strip()
+        SUMMARIES.inc(result="computed")
+        if self.cache is not None:
+            self.cache.put(self._key(hashes[fold]), [summary])
+        return summary
+
+    def _key(self, prefix_hash: str) -> str:
+        return f"history-summary:{prefix_hash}"
+
+    def _get(self, prefix_hash: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        chunks = self.cache.get(self._key(prefix_hash))
+        return "".join(chunks) if chunks is not None else None
@@ -0,0 +1,50 @@
+"""Process-wide HTTP clients shared by every LLM client.
+
+The native OpenAI clients, which the CrewAI agents also use through
+utils/crew_llm, send their requests through the same keep-alive
+connection pool. Requests reuse warm TLS connections instead of each
+client building its own pool.
+"""
+import os
+import threading
+
+import httpx
+
+_lock = threading.Lock()
+_sync_client = None
+_async_client = None
+
+
+def _settings():
+    env = os.environ
+    limits = httpx.Limits(
+        max_connections=int(env.get("HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(env.get("HTTP_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(env.get("HTTP_KEEPALIVE_EXPIRY", "60")),
+    )
+    timeout = httpx.Timeout(float(env.get("HTTP_TIMEOUT", "600")), connect=float(env.get("HTTP_CONNECT_TIMEOUT", "10")))
+    return limits, timeout
+
+
+def shared_http_client() -> httpx.Client:
+    """The shared blocking client (created on first use)."""
+    global _sync_client
+    with _lock:
+        if _sync_client is None:
+            limits, timeout = _settings()
+            _sync_client = httpx.Client(limits=limits, timeout=timeout)
+        return _sync_client
+
+
+def shared_async_http_client() -> httpx.AsyncClient:
+    """The shared asyncio client (created on first use).
+
+    Its connections belong to one event loop, so only use it from the shared
+    loop in utils.aio.
+    """
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            limits, timeout = _settings()
+            _async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        return _async_client
@@ -0,0 +1,328 @@
+"""Durable background jobs for long Coordinator runs.
+
+A job is submitted once, then runs on a bounded worker pool, independent of
+any HTTP connection. Every chunk the run produces (progress steps from the
+Crew step callback, report text, code markers) is appended to a per-job
+event log in SQLite. Clients can read that log from any offset, so a
+reconnecting client resumes where it left off instead of paying for a new
+LLM run. The final report and code are stored with the job.
+
+Jobs take a heavy-lane slot from the admission controller, like interactive
+refactor requests, so background work counts against the same concurrency
+limit; a job waits in the queue (status "queued") until it gets one.
+Cancellation is checked every ``JOB_CANCEL_POLL`` seconds while a job runs,
+not only when output arrives, and stops the run by closing its stream, which
+aborts the LLM call in flight.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from tools.code_fence import render_markers
+from tools.symbol_index import drop_indexes
+from utils.admission import AdmissionRejected
+from utils.telemetry import REGISTRY, bind_context
+
+DEFAULT_JOB_DB = os.path.join(".cache", "jobs.sqlite")
+DEFAULT_JOB_DIR = os.path.join(".cache", "jobs")
+
+TERMINAL = ("succeeded", "failed", "cancelled")
+
+JOBS_FINISHED = REGISTRY.counter("jobs_finished_total", "Background jobs that reached a terminal state.")
+
+
+class JobStore:
+    """SQLite-backed jobs table plus an append-only event log per job."""
+
+    def __init__(self, path: str = DEFAULT_JOB_DB):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                key TEXT,
+                status TEXT NOT NULL,
+                instruction TEXT NOT NULL,
+                target_path TEXT NOT NULL,
+                workspace TEXT,
+                history TEXT NOT NULL,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                events INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                report TEXT,
+                final_code TEXT,
+                error TEXT
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                ts REAL NOT NULL,
+                content TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs(key, status)")
+        self._conn.commit()
+
+    def create(self, instruction: str, target_path: str, history: Optional[List[Dict[str, str]]] = None,
+               key: Optional[str] = None, workspace: Optional[str] = None, job_id: Optional[str] = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, key, status, instruction, target_path, workspace, history, created) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, key, instruction, target_path or "", workspace, json.dumps(history or []), time.time()),
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["history"] = json.loads(job["history"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def find_active(self, key: str) -> Optional[str]:
+        """Id of a queued or running job with the same request key, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status IN ('queued', 'running') ORDER BY created LIMIT 1",
+                (key,),
+            ).fetchone()
+        return row["id"] if row else None
+
+    def ids_with_status(self, *statuses: str) -> List[str]:
+        marks = ",".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id FROM jobs WHERE status IN ({marks}) ORDER BY created", statuses).fetchall()
+        return [row["id"] for row in rows]
+
+    def count_with_status(self, *statuses: str) -> int:
+        marks = ",".join("?" for _ in statuses)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM jobs WHERE status IN ({marks})", statuses).fetchone()[0]
+
+    def update(self, job_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def mark_running(self, job_id: str) -> bool:
+        """queued -> running; False if the job was cancelled (or taken) meanwhile."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', started = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """Flag a job for cancellation; queued jobs are cancelled at once. Returns the new status."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ?, cancel_requested = 1 WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+            self._conn.commit()
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def append_events(self, job_id: str, contents: List[str]):
+        if not contents:
+            return
+        now = time.time()
+        with self._lock:
+            start = self._conn.execute("SELECT events FROM jobs WHERE id = ?", (job_id,)).fetchone()["events"]
+            self._conn.executemany(
+                "INSERT INTO job_events (job_id, seq, ts, content) VALUES (?, ?, ?, ?)",
+                [(job_id, start + i, now, content) for i, content in enumerate(contents)],
+            )
+            self._conn.execute("UPDATE jobs SET events = ? WHERE id = ?", (start + len(contents), job_id))
+            self._conn.commit()
+
+    def events(self, job_id: str, offset: int = 0, limit: int = 500) -> List[Tuple[int, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, content FROM job_events WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (job_id, offset, limit),
+            ).fetchall()
+        return [(row["seq"], row["content"]) for row in rows]
+
+
+def split_output(output: str) -> Tuple[str, str]:
+    """(report, final_code) from a coordinator stream: code markers become fences again."""
+    report, _, final_code = output.partition("\n[FINAL_CODE]\n")
+    _, started, body = report.partition("[START_REPORT]\n")
+    return render_markers(body if started else report).strip(), final_code
+
+
+class JobManager:
+    """Runs stored jobs on a bounded pool and wakes event followers as logs grow.
+
+    ``run_stream(target_path, instruction, history, cancel)`` returns the
+    chunk iterable for one run (normally the Coordinator's streaming entry
+    point); it should stop soon after the ``cancel`` event is set. With an
+    ``admission`` controller, each run holds a heavy-lane slot.
+    """
+
+    def __init__(self, store: JobStore, run_stream: Callable[..., Iterable[str]],
+                 max_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 flush_interval: float = 0.25, admission=None, cancel_poll: Optional[float] = None):
+        self.store = store
+        self.run_stream = run_stream
+        self.admission = admission
+        self.max_workers = max_workers or int(os.environ.get("JOB_MAX_WORKERS", "2"))
+        self.max_pending = max_pending or int(os.environ.get("JOB_MAX_PENDING", "100"))
+        self.flush_interval = flush_interval
+        self.cancel_poll = cancel_poll or float(os.environ.get("JOB_CANCEL_POLL", "1"))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._changed = threading.Condition()
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._recover()
+
+    def _recover(self):
+        # A restart interrupts running jobs; re-running them would pay for the LLM calls twice.
+        for job_id in self.store.ids_with_status("running"):
+            self.store.update(job_id, status="failed", finished=time.time(), error="Interrupted by a server restart")
+        for job_id in self.store.ids_with_status("queued"):
+            self._pool.submit(self._run, job_id)
+
+    def pending(self) -> int:
+        return self.store.count_with_status("queued", "running")
+
+    def submit(self, instruction: str, target_path: str, history: Optional[list] = None, key: Optional[str] = None,
+               workspace: Optional[str] = None) -> Tuple[str, bool]:
+        """Queue a job; returns ``(job_id, created)``. An identical active job is reused instead."""
+        if key:
+            existing = self.store.find_active(key)
+            if existing:
+                return existing, False
+        job_id = self.store.create(instruction, target_path, history, key=key, workspace=workspace)
+        self._pool.submit(bind_context(self._run), job_id)
+        return job_id, True
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        status = self.store.request_cancel(job_id)
+        event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        self._notify()
+        return status
+
+    def follow(self, job_id: str, offset: int = 0, poll: float = 1.0) -> Iterator[Tuple[int, str]]:
+        """Yield ``(seq, content)`` from ``offset`` on, live, until the job is finished and drained."""
+        while True:
+            batch = self.store.events(job_id, offset)
+            for seq, content in batch:
+                offset = seq + 1
+                yield seq, content
+            if batch:
+                continue
+            job = self.store.get(job_id)
+            if job is None or (job["status"] in TERMINAL and offset >= job["events"]):
+                return
+            with self._changed:
+                self._changed.wait(poll)
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _admit(self, job_id: str):
+        """A heavy-lane ticket for the job, waiting as long as it takes; None if it is cancelled meanwhile."""
+        while not self.store.cancel_requested(job_id):
+            try:
+                return self.admission.acquire("jobs", "heavy")
+            except AdmissionRejected as e:
+                time.sleep(min(max(e.retry_after, 1), 5))
+        return None
+
+    def _watch(self, job_id: str, cancel: threading.Event, done: threading.Event):
+        # Also catches cancellations made through another process sharing the store
+        while not done.wait(self.cancel_poll):
+            if self.store.cancel_requested(job_id):
+                cancel.set()
+                return
+
+    def _cleanup(self, job: Optional[Dict[str, Any]]):
+        if job and job["workspace"]:
+            shutil.rmtree(job["workspace"], ignore_errors=True)
+            drop_indexes(job["workspace"])
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        ticket = self._admit(job_id) if self.admission is not None else None
+        if (self.admission is not None and ticket is None) or not self.store.mark_running(job_id):
+            # Cancelled while queued
+            if ticket is not None:
+                ticket.release()
+            self._cleanup(job)
+            return
+        cancel, done = threading.Event(), threading.Event()
+        self._cancel_events[job_id] = cancel
+        threading.Thread(target=self._watch, args=(job_id, cancel, done), name=f"job-watch-{job_id[:8]}",
+                         daemon=True).start()
+        buffer: List[str] = []
+        output: List[str] = []
+        last_flush = time.monotonic()
+        status, error = "succeeded", None
+        stream = None
+        try:
+            stream = iter(self.run_stream(job["target_path"], job["instruction"], job["history"], cancel=cancel))
+            for chunk in stream:
+                buffer.append(chunk)
+                output.append(chunk)
+                if cancel.is_set():
+                    break
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    self.store.append_events(job_id, buffer)
+                    buffer = []
+                    last_flush = time.monotonic()
+                    self._notify()
+            if cancel.is_set() or self.store.cancel_requested(job_id):
+                status = "cancelled"
+        except Exception as e:
+            status, error = "failed", str(e)
+        finally:
+            done.set()
+            self._cancel_events.pop(job_id, None)
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            if ticket is not None:
+                ticket.release()
+            self.store.append_events(job_id, buffer)
+            report, final_code = split_output("".join(output))
+            self.store.update(job_id, status=status, finished=time.time(), error=error,
+                              report=report, final_code=final_code)
+            self._cleanup(job)
+            JOBS_FINISHED.inc(status=status)
+            self._notify()
@@ -1,10 +1,22 @@
 import os
 import abc
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
-from dotenv import load_dotenv
+import time
+import asyncio
+import contextvars
+import threading
+from typing import List, Dict, Any, Optional, AsyncIterator
+from utils.cache import ResponseCache, request_key, DEFAULT_CACHE_PATH
+from utils.llm_errors import LLMError, classify_error
+from utils.telemetry import LLM_ERRORS, LLM_TTFT, approx_tokens, count_tokens, span, stream_span, astream_span
 
-load_dotenv()
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:  # optional; without it, settings come from the environment only
+    pass
+
+# Providers that never touch the network (see utils/fake_llm.py).
+OFFLINE_PROVIDERS = ("fake", "replay")
 
 class BaseLLM(abc.ABC):
     """Abstract base class for LLM providers."""
@@ -19,16 +31,35 @@ class BaseLLM(abc.ABC):
         """Get a streaming completion from the LLM provider."""
         pass
 
+    def warm_up(self):
+        """Open connections ahead of the first request. Optional; a no-op by default."""
+        pass
+
+def _request_options(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    # utils/resilience passes the time left before its deadline; the SDK would otherwise wait HTTP_TIMEOUT
+    return {"timeout": kwargs["timeout"]} if kwargs.get("timeout") else {}
+
 class OpenAILLM(BaseLLM):
     """OpenAI implementation of the LLM interface."""
     
-    def __init__(self, model: str = "gpt-4o-mini", api_key: Optional[str] = None):
+    def __init__(self, model: str = "gpt-4o-mini", api_key: Optional[str] = None, base_url: Optional[str] = None):
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY not found in environment or passed directly.")
-        self.client = OpenAI(api_key=self.api_key)
+        # The SDK is slow to import and offline providers never need it, so it loads on first use
+        from openai import OpenAI
+        from utils.http_clients import shared_http_client
+        # Retries belong to utils/resilience, which knows the deadline; the SDK's own would stack on top
+        self.client = OpenAI(api_key=self.api_key, base_url=base_url, http_client=shared_http_client(), max_retries=0)
         self.model = model
 
+    def warm_up(self):
+        # A cheap authenticated call leaves a keep-alive connection in the shared pool
+        try:
+            self.client.models.retrieve(self.model)
+        except Exception as e:
+            print(f"[!] LLM warm-up failed: {e}")
+
     def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
         temperature = kwargs.get("temperature", 0.2)
         max_tokens = kwargs.get("max_tokens", 4000)
@@ -38,11 +69,12 @@ class OpenAILLM(BaseLLM):
                 model=self.model,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                **_request_options(kwargs)
             )
             return response.choices[0].message.content
         except Exception as e:
-            return f"Error: {str(e)}"
+            raise classify_error(e, self.model) from e
 
     def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs):
         temperature = kwargs.get("temperature", 0.2)
@@ -54,22 +86,415 @@ class OpenAILLM(BaseLLM):
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
-                stream=True
+                stream=True,
+                **_request_options(kwargs)
             )
             for chunk in stream:
                 if chunk.choices[0].delta.content:
                     yield chunk.choices[0].delta.content
         except Exception as e:
-            yield f"Error: {str(e)}"
+            raise classify_error(e, self.model) from e
+
+class AsyncBaseLLM(abc.ABC):
+    """Abstract base class for asyncio-native LLM providers."""
+
+    @abc.abstractmethod
+    async def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """Get a completion from the LLM provider."""
+        pass
+
+    @abc.abstractmethod
+    def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """Return an async iterator over completion chunks."""
+        pass
+
+class AsyncOpenAILLM(AsyncBaseLLM):
+    """OpenAI implementation of the async LLM interface."""
+
+    def __init__(self, model: str = "gpt-4o-mini", api_key: Optional[str] = None, base_url: Optional[str] = None):
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment or passed directly.")
+        from openai import AsyncOpenAI
+        from utils.http_clients import shared_async_http_client
+        self.client = AsyncOpenAI(api_key=self.api_key, base_url=base_url, http_client=shared_async_http_client(), max_retries=0)
+        self.model = model
+
+    async def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        temperature = kwargs.get("temperature", 0.2)
+        max_tokens = kwargs.get("max_tokens", 4000)
+
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **_request_options(kwargs)
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            raise classify_error(e, self.model) from e
+
+    async def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        temperature = kwargs.get("temperature", 0.2)
+        max_tokens = kwargs.get("max_tokens", 4000)
+
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                **_request_options(kwargs)
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise classify_error(e, self.model) from e
+
+class ThreadedAsyncLLM(AsyncBaseLLM):
+    """Adapts a blocking BaseLLM to the async interface by running calls in worker threads."""
+
+    def __init__(self, llm: BaseLLM):
+        self.llm = llm
+        self.model = getattr(llm, "model", llm.__class__.__name__)
+
+    async def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        return await asyncio.to_thread(self.llm.get_completion, messages, **kwargs)
+
+    async def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        iterator = iter(self.llm.get_streaming_completion(messages, **kwargs))
+        sentinel = object()
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, sentinel)
+            if chunk is sentinel:
+                break
+            yield chunk
+
+class CacheMark:
+    """Whether the cache wrappers answered a call, so model routing can tell hits from provider calls.
+
+    The caller sets a fresh mark in ``cache_mark`` before the call. Context copies (worker threads,
+    stream steps run via to_thread) share the mark object, so the answer reaches the caller.
+    """
+
+    def __init__(self):
+        self.hit = False
+
+cache_mark: contextvars.ContextVar = contextvars.ContextVar("cache_mark", default=None)
+
+def _mark_cache(hit: bool):
+    mark = cache_mark.get()
+    if mark is not None:
+        mark.hit = hit
+
+class CachedLLM(BaseLLM):
+    """Wraps any BaseLLM and serves repeated requests from a ResponseCache.
+
+    Completions and streams share one key space: a cached stream can answer a
+    plain completion (chunks are joined) and is replayed chunk by chunk when
+    requested as a stream again. Error responses are never stored.
+    """
+
+    def __init__(self, llm: BaseLLM, cache: ResponseCache):
+        self.llm = llm
+        self.cache = cache
+        self.model = getattr(llm, "model", llm.__class__.__name__)
+
+    def _key(self, messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> str:
+        params = dict(kwargs)
+        params.setdefault("temperature", 0.2)
+        params.setdefault("max_tokens", 4000)
+        return request_key(messages, self.model, **params)
+
+    def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        key = self._key(messages, kwargs)
+        chunks = self.cache.get(key)
+        _mark_cache(chunks is not None)
+        if chunks is not None:
+            return "".join(chunks)
+
+        result = self.llm.get_completion(messages, **kwargs)
+        if result:
+            self.cache.put(key, [result])
+        return result
+
+    def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs):
+        key = self._key(messages, kwargs)
+        chunks = self.cache.get(key)
+        _mark_cache(chunks is not None)
+        if chunks is not None:
+            yield from chunks
+            return
+
+        received = []
+        for chunk in self.llm.get_streaming_completion(messages, **kwargs):
+            received.append(chunk)
+            yield chunk
+        # Only fully consumed, successful streams are stored.
+        if received:
+            self.cache.put(key, received)
+
+    def warm_up(self):
+        self.llm.warm_up()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.cache.get_stats()
+
+class AsyncCachedLLM(AsyncBaseLLM):
+    """Async counterpart of CachedLLM sharing the same ResponseCache."""
+
+    def __init__(self, llm: AsyncBaseLLM, cache: ResponseCache):
+        self.llm = llm
+        self.cache = cache
+        self.model = getattr(llm, "model", llm.__class__.__name__)
+
+    def _key(self, messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> str:
+        params = dict(kwargs)
+        params.setdefault("temperature", 0.2)
+        params.setdefault("max_tokens", 4000)
+        return request_key(messages, self.model, **params)
+
+    async def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        key = self._key(messages, kwargs)
+        chunks = self.cache.get(key)
+        _mark_cache(chunks is not None)
+        if chunks is not None:
+            return "".join(chunks)
+
+        result = await self.llm.get_completion(messages, **kwargs)
+        if result:
+            self.cache.put(key, [result])
+        return result
+
+    async def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        key = self._key(messages, kwargs)
+        chunks = self.cache.get(key)
+        _mark_cache(chunks is not None)
+        if chunks is not None:
+            for chunk in chunks:
+                yield chunk
+            return
+
+        received = []
+        async for chunk in self.llm.get_streaming_completion(messages, **kwargs):
+            received.append(chunk)
+            yield chunk
+        if received:
+            self.cache.put(key, received)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.cache.get_stats()
+
+def _count_prompt(model: str, messages: List[Dict[str, str]]):
+    count_tokens("in", sum(approx_tokens(m.get("content") or "") for m in messages), model)
+
+def _count_output(model: str, tokens: int, failed: bool = False):
+    if failed:
+        LLM_ERRORS.inc(model=model)
+    count_tokens("out", tokens, model)
+
+class TracedLLM(BaseLLM):
+    """One span per provider call plus time-to-first-token, token and error counters; cache hits never reach it."""
+
+    def __init__(self, llm: BaseLLM):
+        self.llm = llm
+        self.model = getattr(llm, "model", llm.__class__.__name__)
+
+    def __getattr__(self, name):
+        # Attributes of the wrapped client stay reachable
+        return getattr(self.llm, name)
+
+    def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        _count_prompt(self.model, messages)
+        try:
+            with span("llm.completion", self.model):
+                result = self.llm.get_completion(messages, **kwargs)
+        except LLMError:
+            _count_output(self.model, 0, True)
+            raise
+        _count_output(self.model, approx_tokens(result or ""))
+        return result
+
+    def warm_up(self):
+        self.llm.warm_up()
+
+    def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs):
+        _count_prompt(self.model, messages)
+        return stream_span("llm.stream", self.model, self._observe(messages, kwargs))
+
+    def _observe(self, messages, kwargs):
+        started = time.perf_counter()
+        last = None
+        tokens = 0
+        try:
+            for chunk in self.llm.get_streaming_completion(messages, **kwargs):
+                if last is None:
+                    LLM_TTFT.observe(time.perf_counter() - started, model=self.model)
+                tokens += approx_tokens(chunk)
+                last = chunk
+                yield chunk
+        except LLMError:
+            _count_output(self.model, tokens, True)
+            raise
+        _count_output(self.model, tokens)
+
+class AsyncTracedLLM(AsyncBaseLLM):
+    """Async counterpart of TracedLLM."""
+
+    def __init__(self, llm: AsyncBaseLLM):
+        self.llm = llm
+        self.model = getattr(llm, "model", llm.__class__.__name__)
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    async def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        _count_prompt(self.model, messages)
+        try:
+            with span("llm.completion", self.model):
+                result = await self.llm.get_completion(messages, **kwargs)
+        except LLMError:
+            _count_output(self.model, 0, True)
+            raise
+        _count_output(self.model, approx_tokens(result or ""))
+        return result
+
+    def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        _count_prompt(self.model, messages)
+        return astream_span("llm.stream", self.model, self._observe(messages, kwargs))
+
+    async def _observe(self, messages, kwargs):
+        started = time.perf_counter()
+        last = None
+        tokens = 0
+        try:
+            async for chunk in self.llm.get_streaming_completion(messages, **kwargs):
+                if last is None:
+                    LLM_TTFT.observe(time.perf_counter() - started, model=self.model)
+                tokens += approx_tokens(chunk)
+                last = chunk
+                yield chunk
+        except LLMError:
+            _count_output(self.model, tokens, True)
+            raise
+        _count_output(self.model, tokens)
 
 class LLMFactory:
     """Factory for creating LLM instances."""
+
+    _caches: Dict[str, ResponseCache] = {}
+    _router = None
+    _router_lock = threading.Lock()
     
     @staticmethod
-    def create_llm(provider: Optional[str] = None, **kwargs) -> BaseLLM:
+    def create_llm(provider: Optional[str] = None, cache: Optional[bool] = None, route: Optional[str] = None,
+                   **kwargs) -> BaseLLM:
+        # Agents name their route; with LLM_ROUTES set, the router picks the provider and model
+        if route and LLMFactory.routing_enabled():
+            from utils.router import RoutedLLM
+            return RoutedLLM(LLMFactory.get_router(), route)
         llm_provider = provider or os.environ.get("LLM_PROVIDER", "openai").lower()
         
         if llm_provider == "openai":
-            return OpenAILLM(**kwargs)
+            llm = OpenAILLM(**kwargs)
+        elif llm_provider == "fake":
+            from utils.fake_llm import FakeLLM
+            llm = FakeLLM(**kwargs)
+        elif llm_provider == "replay":
+            from utils.fake_llm import ReplayLLM
+            llm = ReplayLLM(**kwargs)
+        else:
+            raise ValueError(f"Unsupported LLM provider: {llm_provider}")
+
+        record_path = os.environ.get("LLM_RECORD_PATH")
+        if record_path and llm_provider not in OFFLINE_PROVIDERS:
+            from utils.fake_llm import RecordingLLM
+            llm = RecordingLLM(llm, record_path)
+
+        if LLMFactory.resilience_enabled():
+            from utils.resilience import ResilientLLM
+            llm = ResilientLLM(llm)
+
+        # Tracing sits inside the cache, so only calls that reach the provider count as LLM calls and tokens
+        llm = TracedLLM(llm)
+        if LLMFactory.cache_enabled(llm_provider, cache):
+            llm = CachedLLM(llm, LLMFactory.get_cache())
+        return llm
+
+    @staticmethod
+    def create_async_llm(provider: Optional[str] = None, cache: Optional[bool] = None, route: Optional[str] = None,
+                         **kwargs) -> AsyncBaseLLM:
+        if route and LLMFactory.routing_enabled():
+            from utils.router import AsyncRoutedLLM
+            return AsyncRoutedLLM(LLMFactory.get_router(), route)
+        llm_provider = provider or os.environ.get("LLM_PROVIDER", "openai").lower()
+
+        if llm_provider == "openai":
+            llm = AsyncOpenAILLM(**kwargs)
+        elif llm_provider == "fake":
+            from utils.fake_llm import AsyncFakeLLM
+            llm = AsyncFakeLLM(**kwargs)
+        elif llm_provider == "replay":
+            from utils.fake_llm import AsyncReplayLLM
+            llm = AsyncReplayLLM(**kwargs)
         else:
             raise ValueError(f"Unsupported LLM provider: {llm_provider}")
+
+        record_path = os.environ.get("LLM_RECORD_PATH")
+        if record_path and llm_provider not in OFFLINE_PROVIDERS:
+            from utils.fake_llm import AsyncRecordingLLM
+            llm = AsyncRecordingLLM(llm, record_path)
+
+        if LLMFactory.resilience_enabled():
+            from utils.resilience import AsyncResilientLLM
+            llm = AsyncResilientLLM(llm)
+
+        # Tracing sits inside the cache, so only calls that reach the provider count as LLM calls and tokens
+        llm = AsyncTracedLLM(llm)
+        if LLMFactory.cache_enabled(llm_provider, cache):
+            llm = AsyncCachedLLM(llm, LLMFactory.get_cache())
+        return llm
+
+    @staticmethod
+    def cache_enabled(provider: str, cache: Optional[bool] = None) -> bool:
+        """Explicit argument, then LLM_CACHE; offline providers default to uncached so latency stays simulated."""
+        if cache is not None:
+            return cache
+        default = "off" if provider in OFFLINE_PROVIDERS else "on"
+        return os.environ.get("LLM_CACHE", default).lower() not in ("0", "off", "false", "no")
+
+    @staticmethod
+    def resilience_enabled() -> bool:
+        """Deadlines, retries and the circuit breaker (utils/resilience); LLM_RESILIENCE=off disables them."""
+        return os.environ.get("LLM_RESILIENCE", "on").lower() not in ("0", "off", "false", "no")
+
+    @staticmethod
+    def routing_enabled() -> bool:
+        """Per-agent model routing (utils/router) is configured through LLM_ROUTES."""
+        return bool(os.environ.get("LLM_ROUTES", "").strip())
+
+    @staticmethod
+    def get_router():
+        """Return the process-wide model router, so every agent shares its per-profile statistics."""
+        with LLMFactory._router_lock:
+            if LLMFactory._router is None:
+                from utils.router import ModelRouter, load_config
+                LLMFactory._router = ModelRouter(load_config(os.environ["LLM_ROUTES"]))
+        return LLMFactory._router
+
+    @staticmethod
+    def get_cache() -> ResponseCache:
+        """Return the process-wide response cache configured from the environment."""
+        path = os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+        if path not in LLMFactory._caches:
+            ttl = os.environ.get("LLM_CACHE_TTL")
+            LLMFactory._caches[path] = ResponseCache(
+                path=path,
+                max_bytes=int(float(os.environ.get("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024),
+                ttl=float(ttl) if ttl else 7 * 24 * 3600,
+            )
+        return LLMFactory._caches[path]
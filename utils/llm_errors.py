@@ -0,0 +1,97 @@
+"""Typed errors for LLM calls.
+
+Providers raise these instead of returning error text, so a failure can
+never be mistaken for a plan or for code. ``retryable`` says whether
+another attempt could succeed: timeouts, rate limits, connection problems
+and server errors are retryable, while rejected requests are not.
+"""
+from typing import Optional
+
+
+class LLMError(Exception):
+    retryable = False
+
+    def __init__(self, message: str, model: Optional[str] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.model = model
+        self.retry_after = retry_after  # seconds the provider asked us to wait, if it said
+
+
+class LLMTimeoutError(LLMError):
+    """No answer (or no next chunk) before the deadline."""
+    retryable = True
+
+
+class LLMRateLimitError(LLMError):
+    retryable = True
+
+
+class LLMConnectionError(LLMError):
+    retryable = True
+
+
+class LLMServerError(LLMError):
+    """5xx responses and overloaded providers."""
+    retryable = True
+
+
+class LLMRequestError(LLMError):
+    """The request itself was rejected (bad parameters, authentication, unknown model)."""
+
+
+class CircuitOpenError(LLMError):
+    """Calls are failing fast because the provider kept failing; nothing was sent."""
+
+
+# OpenAI SDK and httpx exception names, matched by name so neither has to be imported here
+_BY_NAME = {
+    "APITimeoutError": LLMTimeoutError,
+    "TimeoutException": LLMTimeoutError,
+    "ReadTimeout": LLMTimeoutError,
+    "ConnectTimeout": LLMTimeoutError,
+    "RateLimitError": LLMRateLimitError,
+    "APIConnectionError": LLMConnectionError,
+    "ConnectError": LLMConnectionError,
+    "RemoteProtocolError": LLMConnectionError,
+    "InternalServerError": LLMServerError,
+    "ServiceUnavailableError": LLMServerError,
+    "BadRequestError": LLMRequestError,
+    "AuthenticationError": LLMRequestError,
+    "PermissionDeniedError": LLMRequestError,
+    "NotFoundError": LLMRequestError,
+    "UnprocessableEntityError": LLMRequestError,
+    "ConflictError": LLMServerError,
+}
+
+
+def classify_error(error: BaseException, model: Optional[str] = None) -> LLMError:
+    """The typed LLMError for any exception raised by a provider client."""
+    if isinstance(error, LLMError):
+        return error
+    message = f"{type(error).__name__}: {error}"
+    for cls in type(error).__mro__:
+        if cls.__name__ in _BY_NAME:
+            return _BY_NAME[cls.__name__](message, model, _retry_after(error))
+    if isinstance(error, TimeoutError):
+        return LLMTimeoutError(message, model)
+    if isinstance(error, ConnectionError):
+        return LLMConnectionError(message, model)
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        if status == 429:
+            return LLMRateLimitError(message, model, _retry_after(error))
+        if status >= 500:
+            return LLMServerError(message, model)
+        return LLMRequestError(message, model)
+    return LLMError(message, model)
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,276 @@
+"""Planning without a planner call where possible.
+
+``plan_for`` resolves a plan in three steps:
+1. ``classify_request`` recognises the request types whose plan the planner
+   prompt already fixes (greetings, refactoring, documentation and
+   explanations) and returns their canonical plan.
+2. ``PlanCache`` returns a plan the LLM planner made earlier for the same
+   instruction template.
+3. Only novel instructions reach the planner. Its answer is parsed with
+   ``parse_plan`` and, once validated, stored in the cache.
+
+Templates come from ``instruction_template``: the instruction is lowercased,
+and quoted text, paths, code identifiers and numbers become numbered slots.
+"rename `get_user` to `fetch_user` in api.py" and "rename `load_cfg` to
+`read_cfg` in cli.py" therefore share one template. Cached task
+descriptions store slot references, so a cached plan reads in terms of the
+new request's names.
+"""
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.scheduler import resolve_agent_kind
+from utils.telemetry import REGISTRY
+
+PLANS = REGISTRY.counter("plans_total", "Plans by source: rule, cache, llm or default.")
+
+# Bump when the planner prompt or the plan format changes, so stale cached plans stop matching
+PLAN_VERSION = 1
+MAX_STEPS = 12
+
+DEFAULT_PLAN = [
+    {"agent": "Analysis", "description": "Analyze provided code."},
+    {"agent": "Refactor", "description": "Apply refactorings."},
+    {"agent": "QA", "description": "Review changes."},
+    {"agent": "Doc", "description": "Generate documentation."},
+    {"agent": "Reporting", "description": "Provide summary."},
+]
+
+FILLER = re.compile(r"\b(?:please|pls|kindly|can you|could you|would you|for me)\b", re.IGNORECASE)
+SLOT = re.compile(
+    r"`[^`\n]+`"
+    r"|(?<!\w)\"[^\"\n]+\"(?!\w)"
+    r"|(?<!\w)'[^'\n]+'(?!\w)"
+    r"|[\w~-]*[/\\][\w./\\~-]*\w"                      # paths
+    r"|\b\w+(?:\.\w+)+\b"                             # file names, dotted names
+    r"|\b(?=\w*(?:_|\d|[a-z][A-Z]))[A-Za-z_]\w*\b"    # snake_case, camelCase, names with digits
+    r"|\b\d+(?:\.\d+)?\b"
+)
+SLOT_REF = re.compile(r"\{slot(\d+)\}")
+
+GREETING = re.compile(
+    r"^(?:hi|hello|hey|yo|howdy|greetings|good (?:morning|afternoon|evening)|thanks|thank you|thx|"
+    r"how are you(?: doing)?|what'?s up)(?: there| again| so much| a lot)?[\s!.?,:)]*$",
+    re.IGNORECASE,
+)
+# A negated or contrasted request ("explain, don't refactor") is left to the planner
+NEGATION = re.compile(r"\b(?:don'?t|do not|doesn'?t|not|never|without|instead|except|rather than)\b", re.IGNORECASE)
+# Work outside the canonical plans (fixes, ports, tests, reviews) is left to the planner too
+OTHER = re.compile(
+    r"\b(?:fix\w*|bugs?|implement\w*|convert|port|migrate|translate|rewrite|optimi[sz]\w*|speed up|faster|"
+    r"performance|tests?|security|vulnerab\w*|audit|review|feature)\b",
+    re.IGNORECASE,
+)
+# What a general verb must act on to count as a refactor: "simplify the nested loops", not "simplify the explanation"
+CODE_OBJECT = (
+    r"(?:(?:the|this|that|these|those|a|an|my|our|its|some)\s+)?(?:\w+\s+)?"
+    r"(?:code(?:base)?|modules?|files?|functions?|methods?|class(?:es)?|helpers?|logic|implementations?|"
+    r"constants?|variables?|loops?|conditionals?|conditions?|interfaces?|components?|syntax|imports?)"
+)
+# The refactor plan writes its result back, so questions about refactoring go to the planner
+READ_ONLY = re.compile(
+    r"\?|\b(?:suggest\w*|recommend\w*|opportunit\w*|ideas?|list|which|what|where|why|should|identify|find|"
+    r"show|tell me|assess\w*|evaluat\w*)\b",
+    re.IGNORECASE,
+)
+FAMILIES = {
+    "refactor": re.compile(
+        r"\b(?:refactor\w*|rename\s+\S+(?:\s+\S+)?\s+(?:to|as|into)\s+\S|"
+        r"(?:clean ?up|tidy(?: up)?|simplify|restructure|reorgani[sz]e|moderni[sz]e|extract|deduplicate)\s+"
+        + CODE_OBJECT + r"|reduce (?:the )?(?:complexity|duplication|nesting)|"
+        r"improve (?:the )?(?:readability|naming|structure|maintainability|code quality))\b",
+        re.IGNORECASE,
+    ),
+    "document": re.compile(
+        r"\b(?:document|documentation|docs|docstrings?|readme|(?:add|write) comments|annotate)\b",
+        re.IGNORECASE,
+    ),
+    "explain": re.compile(
+        r"\b(?:explain|describe|summari[sz]e|walk me through|what does|how does|how do)\b",
+        re.IGNORECASE,
+    ),
+}
+
+
+def instruction_template(instruction: str) -> Tuple[str, List[str]]:
+    """(template, slot values) for an instruction; equal values share a slot."""
+    slots: List[str] = []
+
+    def to_slot(match):
+        value = match.group(0)
+        if value[0] in "`'\"":
+            value = value[1:-1]
+        if value not in slots:
+            slots.append(value)
+        return f" {{slot{slots.index(value)}}} "
+
+    text = SLOT.sub(to_slot, FILLER.sub(" ", instruction))
+    template = re.sub(r"[^\w{}]+", " ", text.lower()).strip()
+    return template, slots
+
+
+def classify_request(instruction: str) -> Optional[str]:
+    """The request type when it has a canonical plan: chat, refactor, document or explain."""
+    text = " ".join(instruction.split())
+    if GREETING.match(text):
+        return "chat"
+    if NEGATION.search(text) or OTHER.search(text):
+        return None
+    families = {name for name, pattern in FAMILIES.items() if pattern.search(text)}
+    if "refactor" in families and READ_ONLY.search(text):
+        return None
+    if families == {"explain", "document"}:
+        return "explain"
+    if len(families) == 1:
+        return families.pop()
+    # The refactor plan documents its result anyway
+    if families == {"refactor", "document"}:
+        return "refactor"
+    return None
+
+
+def canonical_plan(kind: str, instruction: str) -> List[Dict[str, Any]]:
+    """The plan the planner prompt prescribes for a request type."""
+    if kind == "chat":
+        return [{"agent": "Chat", "description": instruction, "priority": 1}]
+    if kind == "refactor":
+        return [
+            {"agent": "Analysis", "description": "Analyze the code structure and identify refactoring opportunities", "priority": 1},
+            {"agent": "Refactor", "description": instruction, "priority": 2},
+            {"agent": "QA", "description": "Validate that the refactored code preserves functionality", "priority": 3},
+            {"agent": "TestGen", "description": "Generate unit tests for the refactored code", "priority": 4},
+            {"agent": "Doc", "description": "Document the refactored code", "priority": 5},
+            {"agent": "Reporting", "description": "Summarize the changes and their impact", "priority": 5},
+        ]
+    # Documentation and explanations; the Doc step picks its doc type from the description
+    return [
+        {"agent": "Analysis", "description": "Analyze the code structure and behaviour", "priority": 1},
+        {"agent": "Doc", "description": instruction, "priority": 2},
+        {"agent": "Reporting", "description": "Summarize the findings", "priority": 3},
+    ]
+
+
+def validate_plan(value: Any) -> Optional[List[Dict[str, Any]]]:
+    """A clean copy of a parsed plan, or None if it has no step for a known agent.
+
+    Steps that are not objects or name no known agent are dropped, and
+    descriptions and priorities are normalised.
+    """
+    if not isinstance(value, list):
+        return None
+    plan = []
+    for task in value[:MAX_STEPS]:
+        if not isinstance(task, dict):
+            continue
+        agent = task.get("agent")
+        if not isinstance(agent, str) or resolve_agent_kind(agent) == "unknown":
+            continue
+        description = task.get("description")
+        priority = task.get("priority")
+        plan.append({
+            "agent": agent.strip(),
+            "description": description.strip() if isinstance(description, str) else "",
+            "priority": priority if isinstance(priority, int) and not isinstance(priority, bool) else len(plan) + 1,
+        })
+    return plan or None
+
+
+def parse_plan(text: str) -> Optional[List[Dict[str, Any]]]:
+    """The first valid plan in a planner answer, wherever it sits in the text.
+
+    Accepts prose or code fences around the JSON, a ``{"tasks": [...]}``
+    wrapper and trailing commas.
+    """
+    if not text:
+        return None
+    decoder = json.JSONDecoder()
+    for candidate in (text, re.sub(r",\s*([\]}])", r"\1", text)):
+        for match in re.finditer(r"[\[{]", candidate):
+            try:
+                value, _ = decoder.raw_decode(candidate, match.start())
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                value = value.get("tasks") or value.get("plan") or value.get("steps")
+            plan = validate_plan(value)
+            if plan:
+                return plan
+    return None
+
+
+class PlanCache:
+    """Planner results by instruction template, stored in a ResponseCache."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def _key(self, template: str, scope: str) -> str:
+        digest = hashlib.sha256(f"{PLAN_VERSION}\0{scope}\0{template}".encode("utf-8")).hexdigest()
+        return f"plan:{digest}"
+
+    def get(self, instruction: str, scope: str) -> Optional[List[Dict[str, Any]]]:
+        template, slots = instruction_template(instruction)
+        chunks = self.cache.get(self._key(template, scope))
+        if chunks is None:
+            return None
+        try:
+            plan = validate_plan(json.loads("".join(chunks)))
+        except ValueError:
+            return None
+        if plan is None:
+            return None
+
+        def fill(match):
+            index = int(match.group(1))
+            return slots[index] if index < len(slots) else match.group(0)
+
+        for task in plan:
+            task["description"] = SLOT_REF.sub(fill, task["description"])
+        return plan
+
+    def put(self, instruction: str, scope: str, plan: List[Dict[str, Any]]):
+        template, slots = instruction_template(instruction)
+        stored = []
+        for task in plan:
+            description = task["description"]
+            # Longest first, so a slot that contains another is replaced whole
+            for index in sorted(range(len(slots)), key=lambda i: -len(slots[i])):
+                description = re.sub(rf"(?<!\w){re.escape(slots[index])}(?!\w)", f"{{slot{index}}}", description)
+            stored.append({**task, "description": description})
+        self.cache.put(self._key(template, scope), [json.dumps(stored)])
+
+
+def plan_for(instruction: str, scope: str, plan_with_llm, cache: Optional[PlanCache] = None,
+             fast_path: bool = True) -> List[Dict[str, Any]]:
+    """Resolve a plan: canonical plan, then cached plan, then ``plan_with_llm()``.
+
+    ``scope`` ("file", "directory" or "none") is part of the cache key.
+    ``plan_with_llm`` returns the planner's raw answer, or None if the call
+    failed. Anything that does not yield a valid plan falls back to
+    DEFAULT_PLAN.
+    """
+    if fast_path:
+        kind = classify_request(instruction)
+        # Without code to work on, only a greeting is unambiguous
+        if kind is not None and (kind == "chat" or scope != "none"):
+            print(f"[*] Using the canonical {kind} plan (no planner call)")
+            PLANS.inc(source="rule")
+            return canonical_plan(kind, instruction)
+        if cache is not None:
+            plan = cache.get(instruction, scope)
+            if plan is not None:
+                print("[*] Reusing a cached plan for this kind of request")
+                PLANS.inc(source="cache")
+                return plan
+
+    plan = parse_plan(plan_with_llm() or "")
+    if plan is None:
+        print("[!] Failed to parse plan. Falling back to default sequence.")
+        PLANS.inc(source="default")
+        return [dict(task) for task in DEFAULT_PLAN]
+    PLANS.inc(source="llm")
+    if fast_path and cache is not None:
+        cache.put(instruction, scope, plan)
+    return plan
@@ -0,0 +1,35 @@
+"""Per-request execution context.
+
+The Coordinator and its agents are built once and shared by every request,
+so anything that varies per request travels in a RequestContext passed down
+the call chain instead of being stored on those shared objects.
+"""
+import uuid
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class RequestContext:
+    instruction: str
+    target_path: str = ""
+    history: Tuple[Dict[str, str], ...] = ()
+    language: str = "python"
+    files: Tuple[str, ...] = ()
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+
+    @classmethod
+    def create(cls, instruction: str, target_path: str = "", history: Optional[List[Dict[str, str]]] = None,
+               **kwargs) -> "RequestContext":
+        return cls(instruction, target_path or "", tuple(history or ()), **kwargs)
+
+    def for_file(self, path: str, language: str) -> "RequestContext":
+        """Same request narrowed to one file (used by the directory map step)."""
+        return replace(self, files=(path,), language=language)
+
+    @property
+    def primary_file(self) -> Optional[str]:
+        return self.files[0] if self.files else None
+
+    def history_list(self) -> Optional[List[Dict[str, str]]]:
+        return list(self.history) or None
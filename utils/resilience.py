@@ -0,0 +1,447 @@
+"""Deadlines, retries, hedging and a circuit breaker around LLM providers.
+
+``ResilientLLM`` and ``AsyncResilientLLM`` wrap a provider inside the
+response cache, so cache hits never touch them.
+
+- Deadline: every call gets ``LLM_DEADLINE`` seconds overall, retries
+  included. Streams must also produce each chunk within
+  ``LLM_STREAM_IDLE_TIMEOUT``. A call that runs out of time raises
+  LLMTimeoutError. Each attempt passes the time left to the provider as
+  its request ``timeout``, so a blocked call on a worker thread ends by the
+  deadline instead of holding the thread until the HTTP client gives up.
+- Retries: only retryable errors are retried, up to ``LLM_RETRIES`` more
+  attempts, with full-jitter exponential backoff. A provider's Retry-After
+  is honoured. Streams are retried only before their first chunk, so no
+  output is ever duplicated.
+- Hedging (``LLM_HEDGE=on``): if a completion takes longer than the p95 of
+  recent successful calls for the model, a duplicate is sent and whichever
+  answers first wins. This trades a few percent of extra calls for a much
+  shorter tail.
+- Circuit breaker: ``LLM_BREAKER_THRESHOLD`` consecutive retryable failures
+  open the breaker for the model. While it is open, calls fail immediately
+  with CircuitOpenError. After ``LLM_BREAKER_RESET`` seconds a single
+  probe call decides whether it closes again.
+
+Breakers and latency windows are shared per model by the sync and async
+clients.
+"""
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Dict, List, Optional
+
+from utils.llm import AsyncBaseLLM, BaseLLM
+from utils.llm_errors import CircuitOpenError, LLMError, LLMTimeoutError, classify_error
+from utils.telemetry import REGISTRY, bind_context
+
+RETRIES = REGISTRY.counter("llm_retries_total", "LLM call attempts retried, by error type.")
+HEDGES = REGISTRY.counter("llm_hedges_total", "Hedged LLM requests, by which request answered first.")
+CIRCUIT_OPEN = REGISTRY.gauge("llm_circuit_open", "1 while the model's circuit breaker is open.")
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, str(default)))
+
+
+class RetryPolicy:
+    def __init__(self, retries: Optional[int] = None, base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None):
+        self.retries = int(os.environ.get("LLM_RETRIES", "2")) if retries is None else retries
+        self.base_delay = _env_float("LLM_RETRY_BASE_DELAY", 0.5) if base_delay is None else base_delay
+        self.max_delay = _env_float("LLM_RETRY_MAX_DELAY", 8.0) if max_delay is None else max_delay
+
+    def should_retry(self, error: LLMError, attempt: int) -> bool:
+        return error.retryable and attempt < self.retries
+
+    def delay(self, error: LLMError, attempt: int) -> float:
+        """Full jitter: uniform in [0, base * 2**attempt], capped; a provider's Retry-After wins."""
+        if error.retry_after is not None:
+            return min(error.retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class LatencyWindow:
+    """Durations of the most recent successful calls."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """None until there are enough samples to trust the estimate."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, threshold: Optional[int] = None, reset_after: Optional[float] = None):
+        self.name = name
+        self.threshold = int(os.environ.get("LLM_BREAKER_THRESHOLD", "5")) if threshold is None else threshold
+        self.reset_after = _env_float("LLM_BREAKER_RESET", 30.0) if reset_after is None else reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go out now."""
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if waited >= self.reset_after and not self._probing:
+                self._probing = True  # this caller is the probe
+                return
+            retry_in = max(0.0, self.reset_after - waited)
+        raise CircuitOpenError(f"circuit open for {self.name}; retry in {retry_in:.0f}s", self.name, retry_in)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+        CIRCUIT_OPEN.set(0, model=self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.threshold > 0 and self.failures >= self.threshold):
+                if self.opened_at is None or self._probing:
+                    print(f"[!] Circuit breaker opened for {self.name} after {self.failures} failures")
+                self.opened_at = time.monotonic()
+                self._probing = False
+        if self.opened_at is not None:
+            CIRCUIT_OPEN.set(1, model=self.name)
+
+    def release_probe(self):
+        """The probe ended without a verdict (e.g. a rejected request); let the next call probe."""
+        with self._lock:
+            self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_windows: Dict[str, LatencyWindow] = {}
+_shared_lock = threading.Lock()
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _shared_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(model)
+        return _breakers[model]
+
+
+def get_latency_window(model: str) -> LatencyWindow:
+    with _shared_lock:
+        if model not in _windows:
+            _windows[model] = LatencyWindow()
+        return _windows[model]
+
+
+class _Settings:
+    """Environment configuration shared by the sync and async wrappers."""
+
+    def __init__(self, llm, deadline, idle_timeout, policy, hedge, breaker):
+        self.llm = llm
+        self.model = getattr(llm, "model", llm.__class__.__name__)
+        self.deadline = _env_float("LLM_DEADLINE", 120.0) if deadline is None else deadline
+        self.idle_timeout = _env_float("LLM_STREAM_IDLE_TIMEOUT", 60.0) if idle_timeout is None else idle_timeout
+        self.policy = policy or RetryPolicy()
+        if hedge is None:
+            hedge = os.environ.get("LLM_HEDGE", "off").lower() in ("1", "on", "true", "yes")
+        self.hedge = hedge
+        self.hedge_quantile = _env_float("LLM_HEDGE_QUANTILE", 0.95)
+        self.hedge_min_delay = _env_float("LLM_HEDGE_MIN_DELAY", 1.0)
+        self.breaker = breaker or get_breaker(self.model)
+        self.latency = get_latency_window(self.model)
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge:
+            return None
+        p = self.latency.quantile(self.hedge_quantile)
+        return None if p is None else max(p, self.hedge_min_delay)
+
+    def on_error(self, error: LLMError):
+        if error.retryable:
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    def backoff(self, error: LLMError, attempt: int, deadline: float) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None if the error should be raised."""
+        if not self.policy.should_retry(error, attempt) or isinstance(error, CircuitOpenError):
+            return None
+        delay = self.policy.delay(error, attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        RETRIES.inc(model=self.model, error=type(error).__name__)
+        return delay
+
+
+class ResilientLLM(BaseLLM, _Settings):
+    """Blocking calls run on a worker pool so the caller can stop waiting at the deadline."""
+
+    def __init__(self, llm: BaseLLM, deadline: Optional[float] = None, idle_timeout: Optional[float] = None,
+                 policy: Optional[RetryPolicy] = None, hedge: Optional[bool] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        _Settings.__init__(self, llm, deadline, idle_timeout, policy, hedge, breaker)
+        self._pool = ThreadPoolExecutor(max_workers=int(os.environ.get("LLM_CALL_WORKERS", "64")),
+                                        thread_name_prefix="llm-call")
+
+    def warm_up(self):
+        self.llm.warm_up()
+
+    def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            try:
+                result = self._attempt(messages, kwargs, deadline)
+            except LLMError as e:
+                self.on_error(e)
+                delay = self.backoff(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _timed_call(self, messages, kwargs, deadline):
+        started = time.monotonic()
+        result = self.llm.get_completion(messages, **{**kwargs, "timeout": max(deadline - started, 0.1)})
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    def _attempt(self, messages, kwargs, deadline) -> str:
+        started = time.monotonic()
+        primary = self._pool.submit(bind_context(self._timed_call), messages, kwargs, deadline)
+        running = [primary]
+        hedge_delay = self.hedge_delay()
+        hedged = False
+        error: Optional[LLMError] = None
+        while running:
+            now = time.monotonic()
+            if now >= deadline:
+                raise LLMTimeoutError(f"no response within {self.deadline:g}s", self.model)
+            timeout = deadline - now
+            if hedge_delay is not None and not hedged:
+                timeout = min(timeout, max(0.0, started + hedge_delay - now))
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.remove(future)
+                if future.exception() is None:
+                    if hedged:
+                        HEDGES.inc(model=self.model, winner="primary" if future is primary else "hedge")
+                    return future.result()
+                error = classify_error(future.exception(), self.model)
+            if not done and hedge_delay is not None and not hedged and time.monotonic() >= started + hedge_delay:
+                hedged = True
+                running.append(self._pool.submit(bind_context(self._timed_call), messages, kwargs, deadline))
+        raise error
+
+    def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs):
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            # The provider's timeout applies per read, so it doubles as the idle timeout
+            timeout = max(min(self.idle_timeout, deadline - time.monotonic()), 0.1)
+            pump = _ChunkPump(self._pool, self.llm.get_streaming_completion, messages, {**kwargs, "timeout": timeout})
+            started = False
+            try:
+                for chunk in pump.chunks(deadline, self.idle_timeout, self.model):
+                    started = True
+                    yield chunk
+            except LLMError as e:
+                self.on_error(e)
+                delay = None if started else self.backoff(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except GeneratorExit:
+                # The consumer stopped reading; that says nothing about the provider
+                self.breaker.release_probe()
+                raise
+            finally:
+                pump.close()
+            self.breaker.record_success()
+            return
+
+
+_END = object()
+
+
+class _ChunkPump:
+    """Drives a blocking chunk iterator on a worker thread so reads can time out."""
+
+    def __init__(self, pool: ThreadPoolExecutor, start, messages, kwargs):
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = threading.Event()
+        pool.submit(bind_context(self._run), start, messages, kwargs)
+
+    def _run(self, start, messages, kwargs):
+        iterator = None
+        try:
+            iterator = iter(start(messages, **kwargs))
+            for chunk in iterator:
+                if self._closed.is_set():
+                    break
+                self._queue.put(chunk)
+            self._queue.put(_END)
+        except BaseException as e:
+            self._queue.put(e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def chunks(self, deadline: float, idle_timeout: float, model: str):
+        while True:
+            timeout = min(idle_timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                raise LLMTimeoutError("stream exceeded its deadline", model)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                raise LLMTimeoutError(f"no stream chunk within {timeout:.1f}s", model)
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise classify_error(item, model)
+            yield item
+
+    def close(self):
+        self._closed.set()
+
+
+class AsyncResilientLLM(AsyncBaseLLM, _Settings):
+    """Async counterpart of ResilientLLM; losing hedges and timed-out calls are cancelled."""
+
+    def __init__(self, llm: AsyncBaseLLM, deadline: Optional[float] = None, idle_timeout: Optional[float] = None,
+                 policy: Optional[RetryPolicy] = None, hedge: Optional[bool] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        _Settings.__init__(self, llm, deadline, idle_timeout, policy, hedge, breaker)
+
+    async def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            try:
+                result = await self._attempt(messages, kwargs, deadline)
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            except LLMError as e:
+                self.on_error(e)
+                delay = self.backoff(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def _timed_call(self, messages, kwargs, deadline):
+        started = time.monotonic()
+        result = await self.llm.get_completion(messages, **{**kwargs, "timeout": max(deadline - started, 0.1)})
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    async def _attempt(self, messages, kwargs, deadline) -> str:
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self._timed_call(messages, kwargs, deadline))
+        running = {primary}
+        hedge_delay = self.hedge_delay()
+        hedged = False
+        error: Optional[LLMError] = None
+        try:
+            while running:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise LLMTimeoutError(f"no response within {self.deadline:g}s", self.model)
+                timeout = deadline - now
+                if hedge_delay is not None and not hedged:
+                    timeout = min(timeout, max(0.0, started + hedge_delay - now))
+                done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            HEDGES.inc(model=self.model, winner="primary" if task is primary else "hedge")
+                        return task.result()
+                    error = classify_error(task.exception(), self.model)
+                if not done and hedge_delay is not None and not hedged and time.monotonic() >= started + hedge_delay:
+                    hedged = True
+                    running.add(asyncio.ensure_future(self._timed_call(messages, kwargs, deadline)))
+            raise error
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            stream = self.llm.get_streaming_completion(messages, **kwargs)
+            started = False
+            try:
+                while True:
+                    timeout = min(self.idle_timeout, deadline - time.monotonic())
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=max(timeout, 0))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise LLMTimeoutError(f"no stream chunk within {max(timeout, 0):.1f}s", self.model)
+                    except LLMError:
+                        raise
+                    except Exception as e:
+                        raise classify_error(e, self.model)
+                    started = True
+                    yield chunk
+            except LLMError as e:
+                self.on_error(e)
+                delay = None if started else self.backoff(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except (GeneratorExit, asyncio.CancelledError):
+                self.breaker.release_probe()
+                raise
+            finally:
+                try:
+                    await stream.aclose()
+                except Exception:
+                    pass
+            self.breaker.record_success()
+            return
@@ -0,0 +1,286 @@
+"""Per-agent model routing with failover on degraded profiles.
+
+``LLM_ROUTES`` holds a JSON object, either inline or as the path of a JSON
+file. It names profiles (a provider plus model and client options) and
+maps routes (agent names) to an ordered list of profiles:
+
+    {
+      "profiles": {
+        "strong": {"provider": "openai", "model": "gpt-4o"},
+        "fast": {"provider": "openai", "model": "gpt-4o-mini", "max_p95": 20},
+        "local": {"provider": "openai", "model": "stand-in", "base_url": "http://127.0.0.1:8089/v1"}
+      },
+      "routes": {
+        "planner": ["fast"],
+        "refactor": ["strong", "fast"],
+        "default": ["fast", "local"]
+      }
+    }
+
+A route tries its profiles in order. The first profile is the preferred
+model and later entries are cheaper or safer fallbacks. Each profile
+records the latency and outcome of its calls that reached the provider;
+cache hits and requests the provider rejected as invalid (context too
+long, bad parameters) are left out. A profile is degraded when, over its
+recent calls, either:
+- the error rate reaches ``max_error_rate``, or
+- the p95 latency exceeds ``max_p95`` seconds.
+A degraded profile is skipped for ``cooldown`` seconds, so its routes
+downshift to the next profile. A profile whose call fails with a retryable
+error or an open circuit fails over to the next one within the same call.
+Thresholds can be set at the top level of the config or per profile.
+Without ``LLM_ROUTES``, LLMFactory builds one client exactly as before.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from utils.llm import AsyncBaseLLM, BaseLLM, CacheMark, cache_mark
+from utils.llm_errors import CircuitOpenError, LLMError
+from utils.telemetry import REGISTRY
+
+ROUTED = REGISTRY.counter("llm_routed_total", "LLM calls by route, serving profile and outcome.")
+FAILOVERS = REGISTRY.counter("llm_failovers_total", "Calls that moved to the next profile of their route.")
+DEGRADED = REGISTRY.gauge("llm_profile_degraded", "1 while a routing profile is skipped as degraded.")
+
+DEFAULTS = {"max_error_rate": 0.5, "max_p95": 60.0, "window": 50, "min_samples": 5, "cooldown": 60.0}
+CLIENT_KEYS = ("provider", "max_error_rate", "max_p95", "window", "min_samples", "cooldown")
+
+
+def load_config(value: str) -> Dict[str, Any]:
+    """``LLM_ROUTES`` is inline JSON or a path to a JSON file."""
+    text = value.strip()
+    if not text.startswith("{"):
+        with open(text, "r", encoding="utf-8") as f:
+            text = f.read()
+    config = json.loads(text)
+    profiles, routes = config.get("profiles") or {}, config.get("routes") or {}
+    if not profiles:
+        raise ValueError("LLM_ROUTES needs at least one profile")
+    for route, names in routes.items():
+        unknown = [name for name in names if name not in profiles]
+        if unknown:
+            raise ValueError(f"route {route!r} uses unknown profiles: {', '.join(unknown)}")
+    return config
+
+
+class Profile:
+    """One provider+model pair with a rolling window of its recent calls."""
+
+    def __init__(self, name: str, spec: Dict[str, Any], defaults: Dict[str, Any]):
+        self.name = name
+        self.provider = spec.get("provider", os.environ.get("LLM_PROVIDER", "openai")).lower()
+        self.options = {key: value for key, value in spec.items() if key not in CLIENT_KEYS}
+        self.model = self.options.get("model", "")
+        limits = {**DEFAULTS, **defaults, **spec}
+        self.max_error_rate = float(limits["max_error_rate"])
+        self.max_p95 = float(limits["max_p95"])
+        self.min_samples = int(limits["min_samples"])
+        self.cooldown = float(limits["cooldown"])
+        self._calls = deque(maxlen=int(limits["window"]))  # (seconds, ok)
+        self._degraded_until = 0.0
+        self._lock = threading.Lock()
+        self._clients: Dict[bool, Any] = {}
+
+    def client(self, is_async: bool = False):
+        """The profile's own cached, traced and resilient client, built on first use."""
+        with self._lock:
+            if is_async not in self._clients:
+                from utils.llm import LLMFactory
+                create = LLMFactory.create_async_llm if is_async else LLMFactory.create_llm
+                self._clients[is_async] = create(self.provider, **self.options)
+            return self._clients[is_async]
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            self._calls.append((seconds, ok))
+            reason = self._degradation()
+            if reason and time.monotonic() >= self._degraded_until:
+                print(f"[!] Routing profile {self.name} degraded ({reason}); skipping it for {self.cooldown:g}s")
+                self._degraded_until = time.monotonic() + self.cooldown
+                # Start the next period with a clean slate so one bad window does not re-trip it
+                self._calls.clear()
+                DEGRADED.set(1, profile=self.name)
+
+    def _degradation(self) -> Optional[str]:
+        if len(self._calls) < self.min_samples:
+            return None
+        errors = sum(1 for _, ok in self._calls if not ok) / len(self._calls)
+        if errors >= self.max_error_rate:
+            return f"error rate {errors:.0%}"
+        latencies = sorted(seconds for seconds, ok in self._calls if ok)
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+            if p95 > self.max_p95:
+                return f"p95 {p95:.1f}s"
+        return None
+
+    @property
+    def degraded(self) -> bool:
+        if time.monotonic() < self._degraded_until:
+            return True
+        if self._degraded_until:
+            DEGRADED.set(0, profile=self.name)
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = list(self._calls)
+        return {"provider": self.provider, "model": self.model, "degraded": self.degraded, "calls": len(calls),
+                "errors": sum(1 for _, ok in calls if not ok)}
+
+
+class ModelRouter:
+    def __init__(self, config: Dict[str, Any]):
+        defaults = {key: config[key] for key in DEFAULTS if key in config}
+        self.profiles = {name: Profile(name, spec, defaults) for name, spec in config["profiles"].items()}
+        self.routes: Dict[str, List[str]] = config.get("routes") or {}
+        self.default = self.routes.get("default") or [next(iter(self.profiles))]
+
+    def candidates(self, route: str) -> List[Profile]:
+        """Healthy profiles in preference order; if every one is degraded, all of them."""
+        profiles = [self.profiles[name] for name in self.routes.get(route, self.default)]
+        healthy = [profile for profile in profiles if not profile.degraded]
+        return healthy or profiles
+
+    def primary(self, route: str) -> Profile:
+        return self.candidates(route)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: profile.stats() for name, profile in self.profiles.items()}
+
+
+def _fails_over(error: LLMError) -> bool:
+    # A rejected request would be rejected by the next profile too
+    return error.retryable or isinstance(error, CircuitOpenError)
+
+
+def _record_error(profile: Profile, started: float, error: LLMError):
+    # A rejected request (context too long, bad parameters) is not the profile's fault
+    if _fails_over(error):
+        profile.record(time.monotonic() - started, False)
+
+
+def _record_ok(profile: Profile, started: float, mark: CacheMark):
+    # A cache hit never reached the provider, so its latency says nothing about the profile
+    if not mark.hit:
+        profile.record(time.monotonic() - started, True)
+
+
+class RoutedLLM(BaseLLM):
+    """The client one agent uses: its route's profiles, tried in order."""
+
+    def __init__(self, router: ModelRouter, route: str):
+        self.router = router
+        self.route = route
+
+    @property
+    def model(self) -> str:
+        return self.router.primary(self.route).model
+
+    def warm_up(self):
+        self.router.primary(self.route).client().warm_up()
+
+    def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        profiles = self.router.candidates(self.route)
+        for index, profile in enumerate(profiles):
+            started = time.monotonic()
+            mark = CacheMark()
+            cache_mark.set(mark)
+            try:
+                result = profile.client().get_completion(messages, **kwargs)
+            except LLMError as e:
+                _record_error(profile, started, e)
+                ROUTED.inc(route=self.route, profile=profile.name, result="error")
+                if not _fails_over(e) or index == len(profiles) - 1:
+                    raise
+                FAILOVERS.inc(route=self.route, profile=profile.name)
+                continue
+            _record_ok(profile, started, mark)
+            ROUTED.inc(route=self.route, profile=profile.name, result="ok")
+            return result
+
+    def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs):
+        profiles = self.router.candidates(self.route)
+        for index, profile in enumerate(profiles):
+            started = time.monotonic()
+            mark = CacheMark()
+            cache_mark.set(mark)
+            produced = False
+            try:
+                for chunk in profile.client().get_streaming_completion(messages, **kwargs):
+                    produced = True
+                    yield chunk
+            except LLMError as e:
+                _record_error(profile, started, e)
+                ROUTED.inc(route=self.route, profile=profile.name, result="error")
+                # Once output has streamed, switching models would splice two answers together
+                if produced or not _fails_over(e) or index == len(profiles) - 1:
+                    raise
+                FAILOVERS.inc(route=self.route, profile=profile.name)
+                continue
+            _record_ok(profile, started, mark)
+            ROUTED.inc(route=self.route, profile=profile.name, result="ok")
+            return
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.router.stats()
+
+
+class AsyncRoutedLLM(AsyncBaseLLM):
+    """Async counterpart of RoutedLLM over the same profiles and statistics."""
+
+    def __init__(self, router: ModelRouter, route: str):
+        self.router = router
+        self.route = route
+
+    @property
+    def model(self) -> str:
+        return self.router.primary(self.route).model
+
+    async def get_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        profiles = self.router.candidates(self.route)
+        for index, profile in enumerate(profiles):
+            started = time.monotonic()
+            mark = CacheMark()
+            cache_mark.set(mark)
+            try:
+                result = await profile.client(is_async=True).get_completion(messages, **kwargs)
+            except LLMError as e:
+                _record_error(profile, started, e)
+                ROUTED.inc(route=self.route, profile=profile.name, result="error")
+                if not _fails_over(e) or index == len(profiles) - 1:
+                    raise
+                FAILOVERS.inc(route=self.route, profile=profile.name)
+                continue
+            _record_ok(profile, started, mark)
+            ROUTED.inc(route=self.route, profile=profile.name, result="ok")
+            return result
+
+    async def get_streaming_completion(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        profiles = self.router.candidates(self.route)
+        for index, profile in enumerate(profiles):
+            started = time.monotonic()
+            mark = CacheMark()
+            cache_mark.set(mark)
+            produced = False
+            try:
+                async for chunk in profile.client(is_async=True).get_streaming_completion(messages, **kwargs):
+                    produced = True
+                    yield chunk
+            except LLMError as e:
+                _record_error(profile, started, e)
+                ROUTED.inc(route=self.route, profile=profile.name, result="error")
+                if produced or not _fails_over(e) or index == len(profiles) - 1:
+                    raise
+                FAILOVERS.inc(route=self.route, profile=profile.name)
+                continue
+            _record_ok(profile, started, mark)
+            ROUTED.inc(route=self.route, profile=profile.name, result="ok")
+            return
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.router.stats()
@@ -0,0 +1,249 @@
+"""Run generated pytest suites against the original and refactored code.
+
+Each version of the code is copied into its own temporary directory, as a
+module the tests import by name. The suite runs there in a separate pytest
+subprocess, and both versions run concurrently on a shared worker pool.
+
+Each run has limits:
+- a wall-clock timeout for the whole run
+- a SIGALRM deadline per test, set by a generated conftest
+- an address-space limit (``RLIMIT_AS``) and a CPU limit
+- an environment stripped of API keys and credentials
+
+Outcomes are read from pytest's JUnit XML and compared test by test, so the
+report can say which tests the refactor broke or fixed.
+
+This isolates runs from each other and from the service's secrets; it is not
+a security boundary against hostile code. There is no network or filesystem
+isolation, so the coordinator only runs suites when ``SANDBOX_TESTS=on``.
+"""
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from utils.telemetry import REGISTRY, span
+
+try:
+    import resource
+except ImportError:  # not available on Windows; runs go without memory/CPU limits
+    resource = None
+
+# Applies RLIMIT_AS and RLIMIT_CPU to itself, then replaces itself with the real command
+LIMITS_WRAPPER = (
+    "import os, resource, sys\n"
+    "memory, cpu = int(sys.argv[1]), int(sys.argv[2])\n"
+    "resource.setrlimit(resource.RLIMIT_AS, (memory, memory))\n"
+    "resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))\n"
+    "os.execv(sys.executable, [sys.executable] + sys.argv[3:])\n"
+)
+
+SANDBOX_RUNS = REGISTRY.counter("sandbox_runs_total", "Generated test suite runs by outcome.")
+
+TEST_FILE = "test_generated.py"
+
+# Per-test deadline; pytest-timeout is not assumed to be installed
+CONFTEST = '''import signal
+
+import pytest
+
+_TIMEOUT = {timeout}
+
+
+def _expire(signum, frame):
+    pytest.fail(f"test exceeded {{_TIMEOUT}}s", pytrace=False)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    previous = signal.signal(signal.SIGALRM, _expire)
+    signal.setitimer(signal.ITIMER_REAL, _TIMEOUT)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+'''
+
+# Variables a test run may see; everything else (API keys included) is dropped
+PASSTHROUGH_ENV = ("PATH", "LANG", "LC_ALL", "TZ", "SYSTEMROOT")
+
+
+@dataclass
+class SuiteResult:
+    version: str
+    outcomes: Dict[str, str] = field(default_factory=dict)  # test id -> passed/failed/error/skipped
+    duration: float = 0.0
+    error: Optional[str] = None  # the run itself failed (timeout, collection error, crash)
+
+    def count(self, outcome: str) -> int:
+        return sum(1 for value in self.outcomes.values() if value == outcome)
+
+    def summary(self) -> str:
+        if self.error and not self.outcomes:
+            return f"{self.version}: not run ({self.error})"
+        counts = ", ".join(f"{self.count(o)} {o}" for o in ("passed", "failed", "error", "skipped") if self.count(o))
+        note = f"; {self.error}" if self.error else ""
+        return f"{self.version}: {counts or 'no tests'} in {self.duration:.1f}s{note}"
+
+
+@dataclass
+class SuiteDelta:
+    original: SuiteResult
+    refactored: SuiteResult
+    regressions: List[str] = field(default_factory=list)  # passed before, fail now
+    fixes: List[str] = field(default_factory=list)  # failed before, pass now
+    broken_tests: List[str] = field(default_factory=list)  # fail on both; the test is likely wrong
+
+    @property
+    def verdict(self) -> str:
+        if not self.refactored.outcomes:
+            return "NOT RUN"
+        return "REGRESSION" if self.regressions else "NO REGRESSIONS"
+
+    def report(self) -> str:
+        lines = [f"Verdict: {self.verdict}", self.original.summary(), self.refactored.summary()]
+        for title, tests in (("Regressions", self.regressions), ("Fixed", self.fixes),
+                             ("Failing on both versions", self.broken_tests)):
+            if tests:
+                lines.append(f"{title}:")
+                lines.extend(f"  - {test}" for test in tests)
+        return "\n".join(lines)
+
+
+def compare(original: SuiteResult, refactored: SuiteResult) -> SuiteDelta:
+    delta = SuiteDelta(original, refactored)
+    for test, outcome in refactored.outcomes.items():
+        before = original.outcomes.get(test)
+        failing = outcome in ("failed", "error")
+        if before == "passed" and failing:
+            delta.regressions.append(test)
+        elif before in ("failed", "error") and outcome == "passed":
+            delta.fixes.append(test)
+        elif before in ("failed", "error") and failing:
+            delta.broken_tests.append(test)
+    return delta
+
+
+def module_name_for(path: str) -> str:
+    """Import name for the code under test: the file's stem when it is a valid identifier."""
+    stem = os.path.splitext(os.path.basename(path or ""))[0]
+    return stem if stem.isidentifier() and not stem.startswith("test") else "module_under_test"
+
+
+class SandboxRunner:
+    def __init__(self, max_workers: Optional[int] = None, test_timeout: Optional[float] = None,
+                 suite_timeout: Optional[float] = None, memory_mb: Optional[int] = None):
+        self.max_workers = max_workers or int(os.environ.get("SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.test_timeout = test_timeout or float(os.environ.get("SANDBOX_TEST_TIMEOUT", "10"))
+        self.suite_timeout = suite_timeout or float(os.environ.get("SANDBOX_SUITE_TIMEOUT", "120"))
+        self.memory_mb = memory_mb or int(os.environ.get("SANDBOX_MEMORY_MB", "1024"))
+        self._pool = ThreadPoolExecutor(max_workers=max(2, self.max_workers), thread_name_prefix="sandbox")
+
+    def run_versions(self, test_code: str, module_name: str, original: str, refactored: str,
+                     search_path: Optional[str] = None) -> SuiteDelta:
+        """Run the suite against both versions at once and compare the outcomes.
+
+        ``search_path`` (usually the file's own directory) goes on PYTHONPATH after the working
+        copy, so sibling imports resolve while the module under test is always the copy.
+        """
+        with span("sandbox.run", module=module_name):
+            before = self._pool.submit(self.run_suite, test_code, module_name, original, "original", search_path)
+            after = self._pool.submit(self.run_suite, test_code, module_name, refactored, "refactored", search_path)
+            return compare(before.result(), after.result())
+
+    def run_suite(self, test_code: str, module_name: str, code: str, version: str = "code",
+                  search_path: Optional[str] = None) -> SuiteResult:
+        result = SuiteResult(version)
+        workdir = tempfile.mkdtemp(prefix=f"sandbox_{version}_")
+        started = time.monotonic()
+        try:
+            self._write(workdir, f"{module_name}.py", code)
+            self._write(workdir, TEST_FILE, test_code)
+            self._write(workdir, "conftest.py", CONFTEST.format(timeout=self.test_timeout))
+            command = self._limited(["-m", "pytest", "-q", "-p", "no:cacheprovider", "--no-header",
+                                     "--junitxml=results.xml", TEST_FILE])
+            # Its own session, so a timeout takes down anything the tests spawned as well
+            proc = subprocess.Popen(command, cwd=workdir, env=self._env(workdir, search_path), stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, text=True, start_new_session=True)
+            try:
+                output, _ = proc.communicate(timeout=self.suite_timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.communicate()
+                result.error = f"suite exceeded {self.suite_timeout:.0f}s"
+            else:
+                # Exit codes: 0 all passed, 1 some failed, 2+ interrupted, usage or collection problems
+                if proc.returncode not in (0, 1):
+                    tail = output.strip().splitlines()[-3:]
+                    result.error = f"pytest exited with {proc.returncode}: {' | '.join(tail)}"
+            result.outcomes = self._read_junit(os.path.join(workdir, "results.xml"))
+        except OSError as e:
+            result.error = f"could not start the run: {e}"
+        finally:
+            result.duration = time.monotonic() - started
+            shutil.rmtree(workdir, ignore_errors=True)
+        SANDBOX_RUNS.inc(version=version, result="error" if result.error else "completed")
+        return result
+
+    def _write(self, workdir: str, name: str, content: str):
+        with open(os.path.join(workdir, name), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def _env(self, workdir: str, search_path: Optional[str] = None) -> Dict[str, str]:
+        env = {key: os.environ[key] for key in PASSTHROUGH_ENV if key in os.environ}
+        python_path = workdir if not search_path else os.pathsep.join([workdir, os.path.abspath(search_path)])
+        env.update(HOME=workdir, TMPDIR=workdir, PYTHONPATH=python_path, PYTHONDONTWRITEBYTECODE="1",
+                   PYTHONHASHSEED="0")
+        return env
+
+    def _limited(self, args: List[str]) -> List[str]:
+        """Command line running ``python *args`` under the memory and CPU limits.
+
+        The limits are set by a small wrapper that then execs Python, rather than by
+        ``preexec_fn``, which is unsafe in a threaded process such as this server.
+        """
+        if resource is None:
+            return [sys.executable] + args
+        memory = self.memory_mb * 1024 * 1024
+        cpu = int(self.suite_timeout) + 1
+        return [sys.executable, "-c", LIMITS_WRAPPER, str(memory), str(cpu)] + args
+
+    def _read_junit(self, path: str) -> Dict[str, str]:
+        if not os.path.exists(path):
+            return {}
+        try:
+            root = ET.parse(path).getroot()
+        except ET.ParseError:
+            return {}
+        outcomes = {}
+        for case in root.iter("testcase"):
+            name = f"{case.get('classname', '')}::{case.get('name', '')}".lstrip(":")
+            outcome = "passed"
+            for child in case:
+                if child.tag in ("failure", "error", "skipped"):
+                    outcome = "failed" if child.tag == "failure" else child.tag
+                    break
+            outcomes[name] = outcome
+        return outcomes
+
+
+_runner: Optional[SandboxRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> SandboxRunner:
+    """Process-wide runner, so concurrent requests share one bounded worker pool."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = SandboxRunner()
+        return _runner
@@ -0,0 +1,139 @@
+"""Dependency-graph scheduling for planner output.
+
+Every agent kind declares which pieces of request state it reads and writes.
+A plan (the planner's ordered list of tasks) becomes a graph in which a step
+depends only on the earlier steps whose writes it reads, so independent steps
+run concurrently while each step still sees exactly the state it would have
+seen in the sequential plan order.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from utils.telemetry import bind_context
+
+# State keys: "code" is the current code state, "original" the untouched input,
+# "validation" the local check of the latest refactor (tools/validator) and
+# "results" the report sections of every earlier step.
+AGENT_IO = {
+    "analysis": {"reads": {"code"}, "writes": set()},
+    "refactor": {"reads": {"original", "code"}, "writes": {"code", "validation"}},
+    "qa": {"reads": {"original", "code", "validation"}, "writes": set()},
+    "testgen": {"reads": {"original", "code"}, "writes": set()},
+    "doc": {"reads": {"code"}, "writes": set()},
+    "reporting": {"reads": {"results"}, "writes": set()},
+    "chat": {"reads": {"code"}, "writes": set()},
+    "unknown": {"reads": set(), "writes": set()},
+}
+
+
+def resolve_agent_kind(agent_name: str) -> str:
+    """Map a planner agent name to an AGENT_IO kind (same precedence as the legacy loop)."""
+    name = agent_name.lower()
+    if "analysis" in name:
+        return "analysis"
+    if "refactor" in name:
+        return "refactor"
+    if "qa" in name:
+        return "qa"
+    if "testgen" in name or "test" in name:
+        return "testgen"
+    if "doc" in name:
+        return "doc"
+    if "reporting" in name:
+        return "reporting"
+    if "chat" in name:
+        return "chat"
+    return "unknown"
+
+
+@dataclass
+class PlanNode:
+    index: int
+    task: Dict[str, Any]
+    kind: str
+    deps: Set[int] = field(default_factory=set)
+    # For each state key read: index of the step that last wrote it, or None for the initial state.
+    sources: Dict[str, Optional[int]] = field(default_factory=dict)
+
+
+@dataclass
+class StepOutput:
+    result: str
+    writes: Dict[str, Any] = field(default_factory=dict)
+
+
+def build_plan_graph(plan: List[Dict[str, Any]]) -> List[PlanNode]:
+    """Turn an ordered plan into nodes with read-after-write dependencies."""
+    nodes = []
+    last_writer: Dict[str, int] = {}
+    for index, task in enumerate(plan):
+        kind = resolve_agent_kind(task.get("agent", ""))
+        io = AGENT_IO[kind]
+        node = PlanNode(index=index, task=task, kind=kind)
+        for key in io["reads"]:
+            if key == "results":
+                node.deps.update(range(index))
+                continue
+            writer = last_writer.get(key)
+            node.sources[key] = writer
+            if writer is not None:
+                node.deps.add(writer)
+        for key in io["writes"]:
+            last_writer[key] = index
+        nodes.append(node)
+    return nodes
+
+
+def run_plan_graph(nodes: List[PlanNode], execute: Callable[[PlanNode, Dict[str, Any]], StepOutput],
+                   initial_state: Dict[str, Any], max_workers: Optional[int] = None) -> List[StepOutput]:
+    """Run ready nodes in parallel on a bounded pool; return outputs in plan order.
+
+    ``execute(node, inputs)`` receives the state keys the node reads. If a
+    writer step chose not to write a key (e.g. no code block was found), its
+    readers see the value that writer itself read.
+    """
+    if max_workers is None:
+        max_workers = int(os.environ.get("PLAN_MAX_WORKERS", "4"))
+
+    outputs: Dict[int, StepOutput] = {}
+    inputs_by_node: Dict[int, Dict[str, Any]] = {}
+    pending = {node.index: node for node in nodes}
+    running = {}
+
+    def resolve_inputs(node: PlanNode) -> Dict[str, Any]:
+        inputs = {}
+        for key, writer in node.sources.items():
+            if writer is None:
+                inputs[key] = initial_state.get(key)
+            elif key in outputs[writer].writes:
+                inputs[key] = outputs[writer].writes[key]
+            else:
+                inputs[key] = inputs_by_node[writer].get(key, initial_state.get(key))
+        if "results" in AGENT_IO[node.kind]["reads"]:
+            inputs["results"] = [outputs[i].result for i in range(node.index)]
+        return inputs
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while pending or running:
+            for index in sorted(pending):
+                node = pending[index]
+                if node.deps.issubset(outputs):
+                    inputs_by_node[index] = resolve_inputs(node)
+                    running[pool.submit(bind_context(execute), node, inputs_by_node[index])] = index
+                    del pending[index]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                outputs[running.pop(future)] = future.result()
+
+    return [outputs[node.index] for node in nodes]
+
+
+def final_state(nodes: List[PlanNode], outputs: List[StepOutput], key: str) -> Optional[Any]:
+    """Value of ``key`` after the whole plan, or None if no step wrote it."""
+    for node, output in zip(reversed(nodes), reversed(outputs)):
+        if key in output.writes:
+            return output.writes[key]
+    return None
@@ -0,0 +1,151 @@
+"""In-flight deduplication of identical requests.
+
+``SingleFlight.do`` lets concurrent callers with the same key share one
+execution of a blocking call. ``StreamFlight.subscribe`` does the same for
+chunk streams: one producer thread drives the stream and every subscriber
+replays the chunks emitted so far, then follows live. A key is only
+coalesced while its work is in flight; once it finishes the next arrival
+starts fresh.
+"""
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from utils.telemetry import REGISTRY, bind_context
+
+COALESCED = REGISTRY.counter("singleflight_coalesced_total", "Requests that attached to an identical in-flight request.")
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """Stable hash of JSON-serialisable request parts (instruction, content hash, history...)."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent blocking calls that share a key."""
+
+    def __init__(self, name: str = "call"):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return ``(result, shared)``; ``shared`` is True for callers that waited on the leader."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            COALESCED.inc(kind=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class _Broadcast:
+    """Chunks from one producer, kept for the life of the flight so late subscribers can replay them."""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.condition = threading.Condition()
+
+    def publish(self, chunk):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self.condition:
+            self.finished = True
+            self.error = error
+            self.condition.notify_all()
+
+    def follow(self) -> Iterator:
+        position = 0
+        while True:
+            with self.condition:
+                while position >= len(self.chunks) and not self.finished:
+                    self.condition.wait()
+                pending = self.chunks[position:]
+                finished = self.finished
+                error = self.error
+            position += len(pending)
+            yield from pending
+            if finished and position >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class StreamFlight:
+    """Fan one chunk stream out to every concurrent subscriber with the same key."""
+
+    def __init__(self, name: str = "stream"):
+        self.name = name
+        self._flights: Dict[str, _Broadcast] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: str) -> Optional[Iterator]:
+        """Attach to an in-flight stream if there is one; never starts a producer."""
+        with self._lock:
+            broadcast = self._flights.get(key)
+        if broadcast is None:
+            return None
+        COALESCED.inc(kind=self.name)
+        return broadcast.follow()
+
+    def subscribe(self, key: str, producer: Callable[[], Iterable]) -> Tuple[Iterator, bool]:
+        """Return ``(chunks, leader)``.
+
+        Only the leader's ``producer`` is called, on a background thread, so a
+        subscriber disconnecting (including the leader) never cuts the stream
+        short for the others. ``producer`` is responsible for its own cleanup.
+        """
+        with self._lock:
+            broadcast = self._flights.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._flights[key] = _Broadcast()
+        if leader:
+            thread = threading.Thread(target=bind_context(self._produce), args=(key, broadcast, producer),
+                                      name=f"{self.name}-flight", daemon=True)
+            thread.start()
+        else:
+            COALESCED.inc(kind=self.name)
+        return broadcast.follow(), leader
+
+    def _produce(self, key: str, broadcast: _Broadcast, producer: Callable[[], Iterable]):
+        error = None
+        try:
+            for chunk in producer():
+                broadcast.publish(chunk)
+        except BaseException as e:
+            error = e
+        finally:
+            with self._lock:
+                del self._flights[key]
+            broadcast.finish(error)
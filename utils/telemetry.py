@@ -0,0 +1,412 @@
+"""Request tracing and Prometheus-style metrics, stdlib only.
+
+Every span feeds the ``span_duration_seconds`` histogram (labelled by span
+kind and name) whether or not a trace is active. Inside ``trace_request``
+the spans are also collected into a per-request trace with parent links,
+which can be returned to the caller or dumped as JSON to ``TRACE_DIR``.
+
+The active trace and span live in contextvars. Thread pools and the asyncio
+bridge copy the caller's context, so work they fan out stays in the
+request's trace. Streaming spans (generators) are always leaves: they never
+become the current span, because a generator suspended between yields must
+not leave its span set in the caller's context.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else f"{int(value)}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts..., sum, count
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self) -> Dict[LabelKey, Dict[str, float]]:
+        with self._lock:
+            return {key: {"sum": series[-2], "count": series[-1]} for key, series in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {_format_value(count)}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {_format_value(series[-1])}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]!r}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+SPAN_SECONDS = REGISTRY.histogram("span_duration_seconds", "Duration of instrumented operations.")
+SPAN_ERRORS = REGISTRY.counter("span_errors_total", "Instrumented operations that raised.")
+LLM_TTFT = REGISTRY.histogram("llm_time_to_first_token_seconds", "Time until the first streamed chunk.")
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Approximate prompt (in) and completion (out) tokens.")
+LLM_ERRORS = REGISTRY.counter("llm_errors_total", "LLM calls that failed or returned an error string.")
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    return REGISTRY.render()
+
+
+def approx_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token) for hot-path accounting."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "kind", "name", "attrs", "start", "end", "error")
+
+    def __init__(self, kind: str, name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.kind = kind
+        self.name = name
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        data = {
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "kind": self.kind,
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(((self.end or time.time()) - self.start) * 1000, 3),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class Trace:
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.start = time.time()
+        self.spans: List[Span] = []
+        self.tokens = {"in": 0, "out": 0}
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def add_tokens(self, direction: str, count: int):
+        with self._lock:
+            self.tokens[direction] = self.tokens.get(direction, 0) + count
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "tokens": dict(self.tokens),
+            "spans": [span.to_dict(self.start) for span in spans],
+        }
+
+
+_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_span: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def count_tokens(direction: str, count: int, model: str):
+    """Add approximate LLM tokens to the global counter and to the active trace, if any."""
+    LLM_TOKENS.inc(count, direction=direction, model=model)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_tokens(direction, count)
+
+
+def _open(kind: str, name: str, attrs: Dict[str, Any]) -> Span:
+    parent = _span.get()
+    span = Span(kind, name, parent.span_id if parent else None, attrs)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(span)
+    return span
+
+
+def _close(span: Span, error: Optional[BaseException] = None):
+    span.end = time.time()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+        SPAN_ERRORS.inc(span=span.kind, name=span.name)
+    SPAN_SECONDS.observe(span.end - span.start, span=span.kind, name=span.name)
+
+
+@contextmanager
+def span(kind: str, name: str = "", **attrs):
+    """Time a block as a child of the current span."""
+    current = _open(kind, name, attrs)
+    token = _span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        _close(current, e)
+        raise
+    else:
+        _close(current)
+    finally:
+        _span.reset(token)
+
+
+def stream_span(kind: str, name: str, chunks: Iterable, **attrs):
+    """Wrap a (sync) chunk iterable in a leaf span that also records time to first chunk."""
+    current = _open(kind, name, attrs)
+    first = None
+    count = 0
+    try:
+        for chunk in chunks:
+            if first is None:
+                first = time.time() - current.start
+                current.set(ttft_ms=round(first * 1000, 3))
+            count += 1
+            yield chunk
+    except BaseException as e:
+        current.set(chunks=count)
+        _close(current, e)
+        raise
+    current.set(chunks=count)
+    _close(current)
+
+
+async def astream_span(kind: str, name: str, chunks, **attrs):
+    """Async counterpart of stream_span."""
+    current = _open(kind, name, attrs)
+    first = None
+    count = 0
+    try:
+        async for chunk in chunks:
+            if first is None:
+                first = time.time() - current.start
+                current.set(ttft_ms=round(first * 1000, 3))
+            count += 1
+            yield chunk
+    except BaseException as e:
+        current.set(chunks=count)
+        _close(current, e)
+        raise
+    current.set(chunks=count)
+    _close(current)
+
+
+def traced(kind: str, name: Optional[Callable[..., str]] = None):
+    """Decorator: run the function inside a span.
+
+    ``name`` computes the span name from the call arguments (defaults to the
+    function name). Generator and async-generator functions, and functions
+    that return an iterator, get a stream span that lasts until exhausted.
+    """
+    def decorator(fn):
+        def span_name(args, kwargs):
+            return name(*args, **kwargs) if name else fn.__name__
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            def agen_wrapper(*args, **kwargs):
+                return astream_span(kind, span_name(args, kwargs), fn(*args, **kwargs))
+            return agen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(kind, span_name(args, kwargs)):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                return stream_span(kind, span_name(args, kwargs), fn(*args, **kwargs))
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(kind, span_name(args, kwargs)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_stream(kind: str, name: Optional[Callable[..., str]] = None):
+    """Like ``traced`` for functions that return an iterable of chunks instead of yielding."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            label = name(*args, **kwargs) if name else fn.__name__
+            return stream_span(kind, label, fn(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def agent_name(self, *args, **kwargs) -> str:
+    return self.name
+
+
+class StepTimer:
+    """Records the time between successive callbacks (e.g. Crew step/task callbacks) as spans."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def tick(self, name: str, **attrs):
+        now = time.time()
+        with self._lock:
+            started, self._last = self._last, now
+        step = _open(self.kind, name, attrs)
+        step.start = started
+        _close(step)
+
+
+def _dump(trace: Trace):
+    directory = os.environ.get("TRACE_DIR")
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{trace.trace_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(trace.to_dict(), f, indent=2, default=str)
+
+
+@contextmanager
+def trace_request(name: str, **attrs):
+    """Collect every span opened in this context (and in work it fans out) into one Trace."""
+    trace = Trace(name, attrs)
+    trace_token = _trace.set(trace)
+    try:
+        with span("request", name) as root:
+            root.set(trace_id=trace.trace_id)
+            yield trace
+    finally:
+        _trace.reset(trace_token)
+        _dump(trace)
+
+
+def bind_context(fn: Callable) -> Callable:
+    """Bind ``fn`` to a copy of the caller's context, for threads and pools that do not copy it."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)